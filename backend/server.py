@@ -1,24 +1,48 @@
 from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from fastapi.encoders import jsonable_encoder
+from fastapi.exception_handlers import http_exception_handler
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+import pymongo
+from pymongo import UpdateOne, ReplaceOne, ReturnDocument
+from pymongo.errors import PyMongoError, BulkWriteError
+from gridfs.errors import NoFile
 from dotenv import load_dotenv
 from pathlib import Path
 from pydantic import BaseModel, Field, validator
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, NamedTuple, Tuple, Iterator
+from collections import OrderedDict, deque
 import os
 import logging
 import uuid
 import pandas as pd
 import numpy as np
+import openpyxl
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 from datetime import datetime, timedelta
 import re
 import hashlib
+import math
 import asyncio
-from io import BytesIO
+import contextvars
+import time
+from bisect import bisect_left
 import jwt
 from passlib.context import CryptContext
 import secrets
+import base64
+import socket
+import ipaddress
+import pickle
+import tempfile
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 
 # Security and Configuration
 ROOT_DIR = Path(__file__).parent
@@ -44,6 +68,9 @@ try:
     mongo_url = os.environ['MONGO_URL']
     client = AsyncIOMotorClient(mongo_url)
     db = client[os.environ['DB_NAME']]
+    # pool منفصل وصغير لكتابات الاستيراد الكبيرة حتى لا تستهلك اتصالات الاستعلامات العامة
+    jobs_client = AsyncIOMotorClient(mongo_url, maxPoolSize=int(os.environ.get('JOBS_MONGO_MAX_POOL_SIZE', 4)))
+    jobs_db = jobs_client[os.environ['DB_NAME']]
     logger.info("Database connection established successfully")
 except Exception as e:
     logger.error(f"Database connection failed: {str(e)}")
@@ -56,18 +83,9 @@ app = FastAPI(
     version="3.0.0"
 )
 
-# زيادة حد رفع الملفات
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=["*"],
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
-    allow_headers=["*"],
-)
-
 # تخصيص حد حجم الـ request body (100 MB)
 from starlette.requests import Request
-from starlette.responses import Response
+from starlette.responses import Response, StreamingResponse
 import json
 
 @app.middleware("http")
@@ -91,6 +109,588 @@ async def limit_upload_size(request: Request, call_next):
     response = await call_next(request)
     return response
 
+# ميزانية زمن استعلامات قاعدة البيانات لكل طلب عام (ms): أول بادئة مطابقة للمسار
+# تُطبق عبر pymongo.timeout فتشمل انتظار اتصال من الـ pool و maxTimeMS لكل استعلام
+PUBLIC_QUERY_BUDGETS_MS = [
+    ("/api/search/suggestions", 300),
+    ("/api/search/facets", 2000),
+    ("/api/search", 1000),
+    ("/api/students/batch", 1500),
+    ("/api/student/", 1000),
+    ("/api/school/", 2000),
+    ("/api/schools-summary", 3000),
+    ("/api/stats", 3000),
+    ("/api/analytics/", 3000),
+    ("/api/stage/", 2000),
+    ("/api/seo/", 5000),
+]
+DEFAULT_PUBLIC_QUERY_BUDGET_MS = 1500
+QUERY_TIMEOUT_RETRY_AFTER_SECONDS = int(os.environ.get('QUERY_TIMEOUT_RETRY_AFTER_SECONDS', 5))
+
+def public_query_budget_ms(path: str) -> Optional[int]:
+    """ميزانية المسار، أو None لمسارات الأدمن (الاستيراد والتقارير) وما خارج الـ API"""
+    if not path.startswith("/api/") or path.startswith("/api/admin/"):
+        return None
+    for prefix, budget_ms in PUBLIC_QUERY_BUDGETS_MS:
+        if path.startswith(prefix):
+            return budget_ms
+    return DEFAULT_PUBLIC_QUERY_BUDGET_MS
+
+def is_query_timeout(exc: Optional[BaseException]) -> bool:
+    """هل سبب الاستثناء (مباشرة أو عبر سلسلة الاستثناءات) انتهاء ميزانية استعلام أو انشغال مجمع المعالجة؟"""
+    for _ in range(10):
+        if exc is None:
+            return False
+        if isinstance(exc, PyMongoError) and exc.timeout:
+            return True
+        if isinstance(exc, CpuPoolBusy):  # مجمع المعالجة الثقيلة ممتلئ أو تجاوز العمل مهلته
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+def service_busy_response(retry_after: int = QUERY_TIMEOUT_RETRY_AFTER_SECONDS) -> Response:
+    return Response(
+        content=json.dumps({"detail": "الخدمة مشغولة حالياً، حاول مرة أخرى بعد قليل"}, ensure_ascii=False),
+        status_code=503,
+        media_type="application/json",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+@app.middleware("http")
+async def public_query_budget(request: Request, call_next):
+    """تحديد زمن استعلامات الطلبات العامة حتى لا تتراكم الاتصالات وقت الضغط"""
+    budget_ms = public_query_budget_ms(request.url.path)
+    if budget_ms is None:
+        return await call_next(request)
+    with pymongo.timeout(budget_ms / 1000):
+        return await call_next(request)
+
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_or_query_timeout(request: Request, exc: StarletteHTTPException):
+    # الـ handlers تحول الاستثناءات إلى 500؛ إن كان السبب انتهاء الميزانية نرد 503 سريعة
+    if is_query_timeout(exc):
+        return service_busy_response()
+    return await http_exception_handler(request, exc)
+
+@app.exception_handler(PyMongoError)
+async def mongo_query_timeout(request: Request, exc: PyMongoError):
+    if is_query_timeout(exc):
+        return service_busy_response()
+    raise exc
+
+# ========== مجمع العمليات للمعالجة الثقيلة ==========
+
+class CpuPoolBusy(Exception):
+    """المجمع ممتلئ (انتظار أطول من queue_timeout) أو تجاوز العمل مهلته"""
+
+class CpuTaskPool:
+    """ProcessPoolExecutor مُدار لأعمال pandas/openpyxl الثقيلة حتى لا تجمّد حلقة الأحداث
+
+    - العمليات تُنشأ بـ spawn (لا fork لعملية فيها عملاء Motor وخيوط) عند أول استخدام
+    - max_pending: حد الأعمال المنفذة والمنتظرة معاً؛ الزائد ينتظر حتى queue_timeout ثم CpuPoolBusy
+    - مهلة لكل عمل: العملية العالقة لا يمكن إيقافها وحدها، فيُنهى المجمع كاملاً ويُنشأ من جديد
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, queue_timeout: float, default_timeout: float):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.default_timeout = default_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = asyncio.Semaphore(max_pending)
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def start(self):
+        """تشغيل العمليات مسبقاً حتى لا يدفع أول رفع تكلفة استيراد الوحدة"""
+        self._get_executor().submit(int)
+
+    async def run(self, timeout: Optional[float], fn, *args, wait_for_slot: bool = False):
+        """تنفيذ fn(*args) في عملية منفصلة (fn والمعاملات والنتيجة يجب أن تكون قابلة لـ pickle)
+
+        wait_for_slot: مهام الخلفية تنتظر مكاناً في المجمع بلا حد بدل CpuPoolBusy
+        """
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=None if wait_for_slot else self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise CpuPoolBusy("مجمع المعالجة مشغول")
+        self.active += 1
+        executor = self._get_executor()
+        try:
+            result = await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(executor, fn, *args),
+                timeout=timeout or self.default_timeout
+            )
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            logger.error(f"CPU task {getattr(fn, '__name__', fn)} timed out; restarting process pool")
+            self._restart(executor)
+            raise CpuPoolBusy("تجاوزت المعالجة المهلة المحددة")
+        except BrokenProcessPool:
+            self.failed += 1
+            self._restart(executor)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    def _restart(self, executor: ProcessPoolExecutor):
+        if self._executor is not executor:
+            return  # أُعيد إنشاؤه بالفعل بسبب عمل آخر
+        self._executor = None
+        self.restarts += 1
+        processes = list((executor._processes or {}).values())  # لا توجد واجهة عامة لإنهاء العمليات قبل 3.14
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "active": self.active,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "restarts": self.restarts
+        }
+
+CPU_POOL_RETRY_AFTER_SECONDS = 30
+UPLOAD_PARSE_TIMEOUT_SECONDS = float(os.environ.get('UPLOAD_PARSE_TIMEOUT_SECONDS', 600))
+VALIDATION_TIMEOUT_SECONDS = float(os.environ.get('VALIDATION_TIMEOUT_SECONDS', 120))
+
+cpu_pool = CpuTaskPool(
+    max_workers=int(os.environ.get('CPU_POOL_WORKERS', max(1, (os.cpu_count() or 2) - 1))),
+    max_pending=int(os.environ.get('CPU_POOL_MAX_PENDING', 4)),
+    queue_timeout=float(os.environ.get('CPU_POOL_QUEUE_TIMEOUT_SECONDS', 30)),
+    default_timeout=float(os.environ.get('CPU_TASK_TIMEOUT_SECONDS', 120))
+)
+
+# مجمع منفصل لدفعات مهام الاستيراد: إعادة تشغيل cpu_pool بعد تجاوز رفع أو فحص مهلته لا تقتل دفعة قيد التنفيذ
+ingestion_cpu_pool = CpuTaskPool(
+    max_workers=int(os.environ.get('INGESTION_CPU_WORKERS', 1)),
+    max_pending=int(os.environ.get('INGESTION_CPU_MAX_PENDING', 2)),
+    queue_timeout=float(os.environ.get('CPU_POOL_QUEUE_TIMEOUT_SECONDS', 30)),
+    default_timeout=float(os.environ.get('CPU_TASK_TIMEOUT_SECONDS', 120))
+)
+
+@app.exception_handler(CpuPoolBusy)
+async def cpu_pool_busy(request: Request, exc: CpuPoolBusy):
+    return service_busy_response(retry_after=CPU_POOL_RETRY_AFTER_SECONDS)
+
+def start_background_task(coro) -> asyncio.Task:
+    """مهمة خلفية بسياق جديد: لا ترث ميزانية زمن الطلب الذي أطلقها"""
+    return asyncio.get_running_loop().create_task(coro, context=contextvars.Context())
+
+# ========== التحكم في القبول ومسارات الأولوية ==========
+
+class AdmissionLane:
+    """حد تزامن وطابور انتظار لفئة من المسارات (priority 0 الأعلى)"""
+
+    def __init__(self, name: str, priority: int, limit: int, queue_limit: int, queue_timeout: float, overload_limit: int):
+        self.name = name
+        self.priority = priority
+        self.limit = limit
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.overload_limit = overload_limit  # الحد عند ارتفاع زمن الاستعلامات العامة
+        self.active = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+
+    def current_limit(self, overloaded: bool) -> int:
+        return min(self.limit, self.overload_limit) if overloaded else self.limit
+
+    async def acquire(self, overloaded: bool) -> bool:
+        """False إن رُفض الطلب (الطابور ممتلئ أو انتهت مهلة الانتظار)"""
+        if self.active < self.current_limit(overloaded) and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return True
+        # الفئات المنخفضة لا تنتظر وقت الضغط: تُرفض فوراً لتفريغ المجال للاستعلامات
+        queue_limit = 0 if overloaded and self.priority >= 2 else self.queue_limit
+        if len(self._waiters) >= queue_limit:
+            self.shed += 1
+            return False
+        
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter, overloaded)
+            self.shed += 1
+            return False
+        except asyncio.CancelledError:
+            self._abandon(waiter, overloaded)  # انقطع العميل أثناء الانتظار
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self, overloaded: bool):
+        self.active -= 1
+        # تسليم المكان مباشرة لأقدم منتظر (active لا ينقص)
+        while self._waiters and self.active < self.current_limit(overloaded):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def _abandon(self, waiter: asyncio.Future, overloaded: bool):
+        if waiter.done():
+            self.release(overloaded)  # المكان مُنح بالتزامن مع انتهاء الانتظار
+            return
+        waiter.cancel()
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "priority": self.priority,
+            "limit": self.limit,
+            "overload_limit": self.overload_limit,
+            "active": self.active,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": self.shed
+        }
+
+class AdmissionController:
+    """توزيع الطلبات على مسارات الأولوية؛ عند ارتفاع زمن استعلامات النتائج تُقلص الفئات الأدنى أولاً"""
+
+    def __init__(self, lanes: List[AdmissionLane], latency_target_ms: float, latency_window_seconds: float = 5.0):
+        self.lanes = {lane.name: lane for lane in lanes}
+        self.latency_target = latency_target_ms / 1000
+        self.latency_window_seconds = latency_window_seconds
+        self.lookup_latency: Optional[float] = None  # متوسط متحرك (EWMA) بالثواني
+        self._last_sample = 0.0
+
+    @property
+    def overloaded(self) -> bool:
+        if self.lookup_latency is None or time.monotonic() - self._last_sample > self.latency_window_seconds:
+            return False  # لا قياسات حديثة: لا ضغط
+        return self.lookup_latency > self.latency_target
+
+    def record_lookup_latency(self, seconds: float):
+        self.lookup_latency = seconds if self.lookup_latency is None else 0.9 * self.lookup_latency + 0.1 * seconds
+        self._last_sample = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "overloaded": self.overloaded,
+            "lookup_latency_ms": round(self.lookup_latency * 1000, 1) if self.lookup_latency is not None else None,
+            "latency_target_ms": round(self.latency_target * 1000),
+            "lanes": {name: lane.stats() for name, lane in self.lanes.items()}
+        }
+
+# مسارات الاستيراد الثقيلة (مهام) ثم باقي مسارات الأدمن ثم استعلامات النتائج؛ الباقي صفحات عامة
+ADMISSION_JOB_PATHS = ("/api/admin/upload-excel", "/api/admin/process-excel", "/api/admin/validate-excel-data")
+ADMISSION_LOOKUP_PATHS = ("/api/student/", "/api/students/batch", "/api/search")
+
+def admission_lane_name(method: str, path: str) -> str:
+    if path.startswith(ADMISSION_JOB_PATHS) or (method == "DELETE" and path == "/api/admin/students"):
+        return "jobs"
+    if path.startswith("/api/admin/"):
+        return "admin"
+    if path.startswith(ADMISSION_LOOKUP_PATHS):
+        return "lookup"
+    return "pages"
+
+admission_controller = AdmissionController(
+    lanes=[
+        AdmissionLane("lookup", priority=0, limit=int(os.environ.get('ADMISSION_LOOKUP_LIMIT', 200)), queue_limit=1000, queue_timeout=2.0, overload_limit=200),
+        AdmissionLane("pages", priority=1, limit=int(os.environ.get('ADMISSION_PAGES_LIMIT', 100)), queue_limit=500, queue_timeout=2.0, overload_limit=50),
+        AdmissionLane("admin", priority=2, limit=int(os.environ.get('ADMISSION_ADMIN_LIMIT', 20)), queue_limit=50, queue_timeout=10.0, overload_limit=5),
+        AdmissionLane("jobs", priority=3, limit=int(os.environ.get('ADMISSION_JOBS_LIMIT', 2)), queue_limit=4, queue_timeout=30.0, overload_limit=1),
+    ],
+    latency_target_ms=float(os.environ.get('ADMISSION_LOOKUP_LATENCY_TARGET_MS', 250))
+)
+
+class AdmissionMiddleware:
+    """ASGI middleware: حجز مكان في مسار الطلب قبل تنفيذه، أو 503 إن لم يتوفر"""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/") or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller
+        lane = controller.lanes[admission_lane_name(scope["method"], scope["path"])]
+        if not await lane.acquire(controller.overloaded):
+            await service_busy_response(retry_after=max(1, round(lane.queue_timeout)))(scope, receive, send)
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if lane.name == "lookup":
+                controller.record_lookup_latency(time.monotonic() - started)
+            lane.release(controller.overloaded)
+
+app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
+# ========== تحديد معدل الطلبات العامة ==========
+
+# فئة المسار وتكلفته بالـ tokens: أول بادئة مطابقة، وباقي مسارات /api العامة فئة default
+RATE_LIMIT_ROUTE_CLASSES = [
+    ("/api/students/batch", "lookup", 10),
+    ("/api/student/", "lookup", 1),
+    ("/api/search/suggestions", "suggest", 1),
+    ("/api/search", "search", 1),
+]
+
+# هوية العميل: خلف Cloudflare أو reverse proxy يكون عنوان الاتصال عنوان الـ proxy المشترك بين كل الزوار،
+# فلا يعمل التحديد إلا بعد ضبط ترويسة عنوان العميل مع شبكات الـ proxy الموثوقة، أو التصريح بأن الخادم مكشوف مباشرة
+RATE_LIMIT_CLIENT_IP_HEADER = os.environ.get('RATE_LIMIT_CLIENT_IP_HEADER', '').lower()  # cf-connecting-ip أو x-forwarded-for
+RATE_LIMIT_TRUSTED_PROXIES = os.environ.get('RATE_LIMIT_TRUSTED_PROXIES', '')  # شبكات CIDR مفصولة بفواصل
+RATE_LIMIT_TRUST_PEER_ADDRESS = os.environ.get('RATE_LIMIT_TRUST_PEER_ADDRESS', 'false').lower() == 'true'
+
+class ClientAddressResolver:
+    """عنوان العميل الحقيقي للطلب، أو None إن تعذر تحديده (فلا يُحدد معدل الطلب بدل معاقبة الـ proxy)
+
+    الترويسة لا تُقبل إلا من proxy موثوق. في x-forwarded-for يُؤخذ أقرب عنوان غير موثوق من اليمين:
+    الأول من اليسار يكتبه العميل نفسه ويمكن تزويره
+    """
+
+    def __init__(self, header: str = "", trusted_proxies: str = "", trust_peer_address: bool = False):
+        self.header = header.lower().encode("latin-1")
+        self.trusted_networks = [
+            ipaddress.ip_network(network.strip(), strict=False) for network in trusted_proxies.split(",") if network.strip()
+        ]
+        self.trust_peer_address = trust_peer_address
+
+    @property
+    def configured(self) -> bool:
+        return self.trust_peer_address or bool(self.header and self.trusted_networks)
+
+    def is_trusted_proxy(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_networks)
+
+    def resolve(self, scope) -> Optional[str]:
+        if not self.configured:
+            return None
+        client = scope.get("client")
+        peer = client[0] if client else None
+        if peer is None or not self.header or not self.is_trusted_proxy(peer):
+            return peer  # اتصال مباشر (أو تجاوز للـ proxy): عنوان الاتصال هو العميل
+        for name, value in scope["headers"]:
+            if name == self.header:
+                hops = [hop.strip() for hop in value.decode("latin-1").split(",") if hop.strip()]
+                for hop in reversed(hops):
+                    if not self.is_trusted_proxy(hop):
+                        return hop
+                return None
+        return None
+
+client_address_resolver = ClientAddressResolver(
+    RATE_LIMIT_CLIENT_IP_HEADER, RATE_LIMIT_TRUSTED_PROXIES, RATE_LIMIT_TRUST_PEER_ADDRESS
+)
+
+def rate_limit_route(path: str) -> Optional[Tuple[str, int]]:
+    """(الفئة، التكلفة) للمسار، أو None لمسارات الأدمن وما خارج الـ API"""
+    if not path.startswith("/api/") or path.startswith("/api/admin/"):
+        return None
+    for prefix, route_class, cost in RATE_LIMIT_ROUTE_CLASSES:
+        if path.startswith(prefix):
+            return route_class, cost
+    return "default", 1
+
+class RateLimiter:
+    """Token bucket لكل (IP، فئة مسار) في الذاكرة، مع قائمة حظر مشتركة بين العمال عبر قاعدة البيانات
+    (الطلبات لا تلمس قاعدة البيانات: الإعدادات والحظر تُزامن في الخلفية)"""
+
+    def __init__(self, max_clients: int, sync_seconds: float, block_threshold: int):
+        self.max_clients = max_clients
+        self.sync_seconds = sync_seconds
+        self.block_threshold = block_threshold  # عدد الرفض خلال دورة مزامنة واحدة قبل الحظر المشترك
+        self.enabled = True
+        self.limits: Dict[str, Tuple[float, float]] = {}  # الفئة -> (tokens في الثانية، السعة)؛ فارغ قبل التهيئة
+        self.block_minutes = 0
+        self.trusted_ips: set = set()
+        self._buckets: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._rejections: Dict[str, int] = {}
+        self._blocked: Dict[str, float] = {}  # IP -> نهاية الحظر (monotonic)
+        self._sync_task: Optional[asyncio.Task] = None
+        self.allowed = 0
+        self.throttled = 0
+        self.blocked_hits = 0
+
+    def configure(self, settings: Dict[str, Any]):
+        settings = SystemSettings(**settings)
+        burst = float(settings.rate_limit_burst)
+        per_minute = {
+            "lookup": settings.rate_limit_lookup_per_minute,
+            "search": settings.rate_limit_search_per_minute,
+            "suggest": settings.rate_limit_suggest_per_minute,
+            "default": settings.rate_limit_default_per_minute,
+        }
+        self.enabled = settings.rate_limit_enabled
+        self.limits = {route_class: (rate / 60.0, burst) for route_class, rate in per_minute.items()}
+        self.block_minutes = settings.rate_limit_block_minutes
+        self.trusted_ips = set(settings.rate_limit_trusted_ips)
+
+    def check(self, client_ip: str, route_class: str, cost: int = 1) -> Optional[float]:
+        """None إن سُمح بالطلب، وإلا عدد الثواني حتى يتوفر رصيد كافٍ"""
+        if not self.enabled or not self.limits or client_ip in self.trusted_ips:
+            return None
+        now = time.monotonic()
+        blocked_until = self._blocked.get(client_ip)
+        if blocked_until is not None:
+            if blocked_until > now:
+                self.blocked_hits += 1
+                return blocked_until - now
+            del self._blocked[client_ip]
+        
+        rate, capacity = self.limits[route_class]
+        key = (client_ip, route_class)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [capacity, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        
+        cost = min(cost, capacity)
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.allowed += 1
+            return None
+        self.throttled += 1
+        self._rejections[client_ip] = self._rejections.get(client_ip, 0) + 1
+        return (cost - bucket[0]) / rate
+
+    def start(self):
+        if not self.limits:
+            self.configure(SystemSettings().dict())  # القيم الافتراضية حتى أول مزامنة
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = start_background_task(self._sync_loop())
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing rate limiter: {str(e)}")
+            await asyncio.sleep(self.sync_seconds)
+
+    async def sync(self):
+        """تحميل الإعدادات، نشر حظر العملاء المتجاوزين بكثرة، وتحميل الحظر من العمال الآخرين"""
+        settings = await db.system_settings.find_one({})
+        if settings:
+            self.configure(settings)
+        
+        rejections, self._rejections = self._rejections, {}
+        now = datetime.utcnow()
+        if self.block_minutes:
+            offenders = [ip for ip, count in rejections.items() if count >= self.block_threshold]
+            if offenders:
+                until = now + timedelta(minutes=self.block_minutes)
+                await db.rate_limit_blocks.bulk_write([
+                    UpdateOne({"_id": ip}, {"$max": {"until": until}}, upsert=True) for ip in offenders
+                ], ordered=False)
+                logger.warning(f"Rate limiter blocked {len(offenders)} clients for {self.block_minutes} minutes")
+        
+        monotonic_now = time.monotonic()
+        self._blocked = {
+            block["_id"]: monotonic_now + (block["until"] - now).total_seconds()
+            async for block in db.rate_limit_blocks.find({"until": {"$gt": now}}).limit(self.max_clients)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limits_per_minute": {route_class: round(rate * 60) for route_class, (rate, _) in self.limits.items()},
+            "tracked_buckets": len(self._buckets),
+            "blocked_clients": len(self._blocked),
+            "allowed": self.allowed,
+            "throttled": self.throttled,
+            "blocked_hits": self.blocked_hits
+        }
+
+rate_limiter = RateLimiter(
+    max_clients=int(os.environ.get('RATE_LIMIT_MAX_CLIENTS', 200000)),
+    sync_seconds=float(os.environ.get('RATE_LIMIT_SYNC_SECONDS', 5)),
+    block_threshold=int(os.environ.get('RATE_LIMIT_BLOCK_THRESHOLD', 100))
+)
+
+class RateLimitMiddleware:
+    """ASGI middleware: رفض الطلب الزائد بـ 429 قبل الوصول إلى أي handler"""
+
+    def __init__(self, app, limiter: RateLimiter, resolver: ClientAddressResolver):
+        self.app = app
+        self.limiter = limiter
+        self.resolver = resolver
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] != "OPTIONS":
+            route = rate_limit_route(scope["path"])
+            client_ip = self.resolver.resolve(scope) if route is not None else None
+            if client_ip is not None:
+                retry_after = self.limiter.check(client_ip, *route)
+                if retry_after is not None:
+                    response = Response(
+                        content=json.dumps({"detail": "عدد كبير من الطلبات، حاول مرة أخرى بعد قليل"}, ensure_ascii=False),
+                        status_code=429,
+                        media_type="application/json",
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+app.add_middleware(RateLimitMiddleware, limiter=rate_limiter, resolver=client_address_resolver)
+
+# CORS آخر middleware يُضاف (الأبعد) حتى تحمل ردود 413/429/503 ترويساته أيضاً
+app.add_middleware(
+    CORSMiddleware,
+    allow_credentials=True,
+    allow_origins=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count", "X-Search-Mode", "Retry-After"],
+)
+
+
 api_router = APIRouter(prefix="/api")
 
 # Enhanced Pydantic Models with Educational Stages
@@ -176,6 +776,9 @@ class Student(BaseModel):
     administration: Optional[str] = Field(default=None, max_length=200)  # الإدارة التعليمية
     school_code: Optional[str] = Field(default=None, max_length=50)  # كود المدرسة
     
+    # الترتيب المحسوب مسبقاً عند الاستيراد: {"overall": {"rank": 1, "out_of": 1000}, "stage": ...}
+    ranks: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    
     additional_info: Dict[str, Any] = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -228,6 +831,16 @@ class SystemSettings(BaseModel):
     retention_days: int = Field(default=30, ge=7, le=365)
     last_backup: Optional[datetime] = Field(default=None)
     
+    # تحديد معدل الطلبات العامة لكل عنوان IP (الطلبات في الدقيقة لكل فئة مسارات)
+    rate_limit_enabled: bool = Field(default=False)  # يتطلب ضبط هوية العميل (RATE_LIMIT_CLIENT_IP_HEADER ...)
+    rate_limit_lookup_per_minute: int = Field(default=60, ge=1, le=100000)  # نتيجة الطالب برقم الجلوس
+    rate_limit_search_per_minute: int = Field(default=30, ge=1, le=100000)
+    rate_limit_suggest_per_minute: int = Field(default=120, ge=1, le=100000)  # الاقتراحات أثناء الكتابة
+    rate_limit_default_per_minute: int = Field(default=300, ge=1, le=100000)
+    rate_limit_burst: int = Field(default=20, ge=1, le=10000)  # أقصى رصيد متراكم
+    rate_limit_block_minutes: int = Field(default=0, ge=0, le=1440)  # حظر مشترك بين العمال (اختياري، 0 معطل)
+    rate_limit_trusted_ips: List[str] = Field(default_factory=list)  # مثل شبكات المدارس خلف NAT واحد
+    
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -350,6 +963,16 @@ class SystemSettingsUpdate(BaseModel):
     auto_backup: Optional[bool] = None
     backup_frequency: Optional[str] = Field(None, pattern="^(daily|weekly|monthly)$")
     retention_days: Optional[int] = Field(None, ge=7, le=365)
+    
+    # تحديد معدل الطلبات
+    rate_limit_enabled: Optional[bool] = None
+    rate_limit_lookup_per_minute: Optional[int] = Field(None, ge=1, le=100000)
+    rate_limit_search_per_minute: Optional[int] = Field(None, ge=1, le=100000)
+    rate_limit_suggest_per_minute: Optional[int] = Field(None, ge=1, le=100000)
+    rate_limit_default_per_minute: Optional[int] = Field(None, ge=1, le=100000)
+    rate_limit_burst: Optional[int] = Field(None, ge=1, le=10000)
+    rate_limit_block_minutes: Optional[int] = Field(None, ge=0, le=1440)
+    rate_limit_trusted_ips: Optional[List[str]] = None
 
 class ExcelAnalysis(BaseModel):
     filename: str
@@ -370,14 +993,63 @@ class ColumnMapping(BaseModel):
     administration_column: Optional[str] = None
     school_code_column: Optional[str] = None
 
+class IngestionJob(BaseModel):
+    """مهمة استيراد ملف مرفوع تُنفذ في الخلفية (مجموعة ingestion_jobs)"""
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    file_hash: str
+    filename: Optional[str] = None
+    mapping: ColumnMapping
+    educational_stage_id: Optional[str] = None
+    region: Optional[str] = None
+    delete_missing: bool = False  # حذف طلاب المرحلة الذين لا يظهرون في الملف بعد اكتمال الاستيراد
+    status: str = Field(default="queued", pattern="^(queued|running|completed|failed|cancelled)$")
+    cancel_requested: bool = False
+    
+    # التقدم: chunks_done هي نقطة الاستئناف بعد إعادة التشغيل
+    total_rows: int = 0
+    rows_done: int = 0
+    rows_failed: int = 0
+    processed_count: int = 0
+    chunks_done: int = 0
+    # مقارنة content_hash مع المخزن: لا يُكتب إلا الجديد والمتغير
+    added_count: int = 0
+    changed_count: int = 0
+    unchanged_count: int = 0
+    removed_count: int = 0
+    rows_per_second: Optional[float] = None
+    ranks_updated: int = 0
+    errors: List[str] = Field(default_factory=list)  # أول 10 أخطاء فقط
+    message: Optional[str] = None
+    
+    created_by: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None
+    worker_id: Optional[str] = None
+    attempts: int = 0
+
 class SearchRequest(BaseModel):
     query: str = Field(..., min_length=1, max_length=200)
-    search_type: str = Field(default="all", pattern="^(student_id|name|all)$")
+    search_type: str = Field(default="all", pattern="^(student_id|name|all|fuzzy)$")
     class_filter: Optional[str] = None
     section_filter: Optional[str] = None
     educational_stage_id: Optional[str] = None  # فلترة حسب المرحلة التعليمية
     region_filter: Optional[str] = None  # فلترة حسب المحافظة
     administration_filter: Optional[str] = None  # فلترة حسب الإدارة التعليمية
+    cursor: Optional[str] = None  # مؤشر الصفحة التالية (من X-Next-Cursor)
+
+class FacetSearchRequest(SearchRequest):
+    query: str = Field(default="", max_length=200)  # فارغ: التصفح بالفلاتر فقط (فلتر واحد على الأقل)
+    
+    @validator('cursor')
+    def reject_cursor(cls, v):
+        if v is not None:
+            raise ValueError('العدادات تُحسب لأول صفحة فقط؛ استخدم /api/search للصفحات التالية')
+        return v
+
+class StudentBatchRequest(BaseModel):
+    student_ids: List[str] = Field(..., min_items=1, max_items=500)  # أرقام الجلوس المطلوبة
 
 class StageCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=200)
@@ -736,13 +1408,142 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return AdminUser(**user)
 
 # Enhanced utility functions
+SANITIZE_RE = re.compile(r'[<>"\';=&]')
+
 def sanitize_string(text: str) -> str:
     """تنظيف وتعقيم النصوص المدخلة"""
     if not isinstance(text, str):
         return str(text)
-    cleaned = re.sub(r'[<>"\';=&]', '', text)
+    cleaned = SANITIZE_RE.sub('', text)
     return cleaned.strip()
 
+# الأرقام العربية-الهندية والفارسية إلى أرقام لاتينية
+ARABIC_DIGITS_TRANSLATION = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+def normalize_student_id(student_id: str) -> str:
+    """توحيد رقم الجلوس: تحويل الأرقام العربية إلى لاتينية وحذف المسافات"""
+    return re.sub(r'\s+', '', str(student_id).translate(ARABIC_DIGITS_TRANSLATION))
+
+def student_id_prefix_range(prefix: str) -> Dict[str, str]:
+    """نطاق مرتبط ببداية رقم الجلوس يُخدم من فهرس student_id (حساس لحالة الأحرف)"""
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return {"$gte": prefix, "$lt": upper_bound}
+
+# التشكيل والتطويل، وتوحيد صور الحروف المتشابهة في الأسماء العربية
+ARABIC_DIACRITICS_RE = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]')
+ARABIC_LETTER_VARIANTS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا", "ة": "ه", "ى": "ي"})
+NAME_PREFIX_MIN_LENGTH = 2
+NAME_PREFIX_MAX_LENGTH = 12
+# البحث التقريبي: أقل تشابه مقبول (Dice على الثلاثيات) وحدود زمن وعدد المرشحين
+FUZZY_MIN_SIMILARITY = 0.35
+FUZZY_CANDIDATE_LIMIT = 20000
+FUZZY_SEARCH_TIMEOUT_MS = 800
+
+def normalize_arabic_name(name: str) -> str:
+    """توحيد الاسم للبحث: حذف التشكيل وتوحيد (أ/إ/آ/ا) و(ة/ه) و(ى/ي) والمسافات"""
+    normalized = ARABIC_DIACRITICS_RE.sub('', str(name)).translate(ARABIC_LETTER_VARIANTS)
+    return ' '.join(normalized.lower().split())
+
+def name_token_prefixes(normalized_name: str) -> List[str]:
+    """بدايات كل كلمة في الاسم الموحد (تُخزن في فهرس متعدد القيم)"""
+    prefixes = set()
+    for token in normalized_name.split():
+        for end in range(NAME_PREFIX_MIN_LENGTH, min(len(token), NAME_PREFIX_MAX_LENGTH) + 1):
+            prefixes.add(token[:end])
+    return sorted(prefixes)
+
+def name_trigrams(normalized_name: str) -> List[str]:
+    """ثلاثيات الحروف لكل كلمة محاطة بمسافة (" احمد " -> " اح"، "احم"، "حمد"، "مد ")"""
+    trigrams = set()
+    for token in normalized_name.split():
+        padded = f" {token} "
+        for start in range(len(padded) - 2):
+            trigrams.add(padded[start:start + 3])
+    return sorted(trigrams)
+
+def build_name_search_fields(name: str) -> Dict[str, Any]:
+    """حقول البحث بالاسم التي تُحفظ مع مستند الطالب عند الاستيراد"""
+    normalized = normalize_arabic_name(name)
+    return {
+        "name_normalized": normalized,
+        "name_prefixes": name_token_prefixes(normalized),
+        "name_trigrams": name_trigrams(normalized)
+    }
+
+def name_search_clause(query: str) -> Optional[Dict[str, Any]]:
+    """شرط بحث بالاسم يُخدم من فهرس name_prefixes بنفس توحيد الاستيراد"""
+    normalized = normalize_arabic_name(query)
+    if not normalized:
+        return None
+    tokens = list(dict.fromkeys(
+        token[:NAME_PREFIX_MAX_LENGTH] for token in normalized.split() if len(token) >= NAME_PREFIX_MIN_LENGTH
+    ))
+    if not tokens:
+        # حرف واحد فقط: بحث بالبداية على الاسم الموحد (مفهرس أيضاً)
+        return {"name_normalized": {"$regex": f"^{re.escape(normalized)}"}}
+    return {"name_prefixes": {"$all": tokens}}
+
+def fuzzy_name_pipeline(query: str, filters: Dict[str, Any], limit: int = 50) -> Optional[List[Dict[str, Any]]]:
+    """pipeline بحث تقريبي بالاسم: مرشحون من فهرس name_trigrams ثم ترتيب بتشابه Dice
+
+    المرشحون يُختارون بعدد الـ trigrams المشتركة قبل حد FUZZY_CANDIDATE_LIMIT (وليس بترتيب الفهرس)،
+    والمراحل الأولى تحمل _id والعدادات فقط؛ المستندات الكاملة تُجلب للنتائج النهائية
+    """
+    query_trigrams = name_trigrams(normalize_arabic_name(query))
+    if not query_trigrams:
+        return None
+    # Dice = 2s/(n+q) و n >= s، فلا يبلغ الحد الأدنى مرشح يشارك أقل من min_shared
+    min_shared = max(1, math.ceil(FUZZY_MIN_SIMILARITY * len(query_trigrams) / (2 - FUZZY_MIN_SIMILARITY)))
+    return [
+        {"$match": {**filters, "name_trigrams": {"$in": query_trigrams}}},
+        {"$project": {
+            "student_id": 1,
+            "trigram_count": {"$size": "$name_trigrams"},
+            "shared": {"$size": {"$setIntersection": ["$name_trigrams", query_trigrams]}}
+        }},
+        {"$match": {"shared": {"$gte": min_shared}}},
+        {"$sort": {"shared": -1, "student_id": 1}},
+        {"$limit": FUZZY_CANDIDATE_LIMIT},
+        {"$addFields": {"name_similarity": {"$divide": [
+            {"$multiply": [2, "$shared"]},
+            {"$add": ["$trigram_count", len(query_trigrams)]}
+        ]}}},
+        {"$match": {"name_similarity": {"$gte": FUZZY_MIN_SIMILARITY}}},
+        {"$sort": {"name_similarity": -1, "student_id": 1}},
+        {"$limit": limit},
+        {"$lookup": {"from": "students", "localField": "_id", "foreignField": "_id", "as": "student"}},
+        {"$unwind": "$student"},
+        {"$replaceRoot": {"newRoot": "$student"}},
+        {"$project": {"name_trigrams": 0, "name_prefixes": 0}}
+    ]
+
+async def find_students_by_fuzzy_name(query: str, filters: Dict[str, Any], limit: int = 50) -> List[dict]:
+    """بحث متسامح مع الأخطاء الإملائية، زمنه محدود بـ FUZZY_SEARCH_TIMEOUT_MS"""
+    pipeline = fuzzy_name_pipeline(query, filters, limit)
+    if pipeline is None:
+        return []
+    try:
+        return await db.students.aggregate(pipeline, maxTimeMS=FUZZY_SEARCH_TIMEOUT_MS).to_list(length=limit)
+    except PyMongoError as e:
+        if not e.timeout:
+            raise
+        logger.warning(f"Fuzzy name search timed out after {FUZZY_SEARCH_TIMEOUT_MS}ms")
+        return []
+
+async def find_students_by_seat_number(seat_number: str, filters: Dict[str, Any], limit: int = 50, after: Optional[str] = None) -> List[dict]:
+    """بحث برقم الجلوس: تطابق تام أولاً ثم بحث بالبداية عبر الفهرس (after: آخر رقم في الصفحة السابقة)"""
+    if not seat_number:
+        return []
+    if after is None:
+        exact = await db.students.find_one({"student_id": seat_number, **filters})
+        if exact:
+            return [exact]
+    id_range = student_id_prefix_range(seat_number)
+    if after is not None:
+        id_range["$gt"] = after
+    cursor = db.students.find({"student_id": id_range, **filters}).sort("student_id", 1).limit(limit)
+    return await cursor.to_list(length=limit)
+
 def detect_column_type(column_data: pd.Series, column_name: str) -> str:
     """كشف نوع العمود تلقائياً باستخدام الذكاء الاصطناعي"""
     column_name_lower = column_name.lower()
@@ -782,6 +1583,147 @@ def calculate_file_hash(content: bytes) -> str:
     """حساب hash للملف للتحقق من التكرار"""
     return hashlib.sha256(content).hexdigest()
 
+# ========== قراءة ملفات الإكسيل على دفعات ==========
+
+EXCEL_STREAM_BATCH_ROWS = int(os.environ.get('EXCEL_STREAM_BATCH_ROWS', 1000))  # صفوف كل دفعة (= كل chunk محفوظ)
+EXCEL_ANALYSIS_SAMPLE_ROWS = 1000  # صفوف كشف أنواع الأعمدة
+UPLOAD_READ_BYTES = 1024 * 1024
+# رقم الصف في الملف المصدر لرسائل الأخطاء (1 = أول صف بعد العناوين؛ الصفوف الفارغة المتخطاة تُحتسب)
+SOURCE_ROW_COLUMN = "__source_row__"
+
+def excel_header_columns(header: tuple) -> List[str]:
+    """أسماء الأعمدة من صف العناوين بنفس تسمية pandas للفارغ والمكرر (Unnamed: i، الاسم.1)"""
+    columns = []
+    seen: Dict[str, int] = {}
+    for index, value in enumerate(header):
+        name = sanitize_string(str(value)) if value is not None else f"Unnamed: {index}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+def open_excel_row_stream(source, batch_rows: int = EXCEL_STREAM_BATCH_ROWS) -> Tuple[List[str], Iterator[List[Dict[str, Any]]]]:
+    """فتح أول ورقة بوضع read-only: (الأعمدة، مولد دفعات الصفوف). الذاكرة محدودة بدفعة واحدة مهما كان حجم الملف"""
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        workbook.close()
+        return [], iter(())
+    columns = excel_header_columns(header)
+    
+    def batches():
+        try:
+            batch = []
+            for row_number, values in enumerate(rows, start=1):
+                if all(value is None or (isinstance(value, str) and not value.strip()) for value in values):
+                    continue  # صف فارغ
+                row = dict(zip(columns, values))
+                row[SOURCE_ROW_COLUMN] = row_number
+                batch.append(row)
+                if len(batch) >= batch_rows:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            workbook.close()
+    
+    return columns, batches()
+
+def dataframe_row_batches(df: pd.DataFrame, batch_rows: int = EXCEL_STREAM_BATCH_ROWS) -> Iterator[List[Dict[str, Any]]]:
+    """دفعات صفوف من DataFrame بنفس شكل open_excel_row_stream (الخلايا الفارغة None وليست NaN)"""
+    df = df.astype(object).where(df.notna(), None)
+    for start in range(0, len(df), batch_rows):
+        batch = df.iloc[start:start + batch_rows].to_dict('records')
+        for row_number, row in enumerate(batch, start=start + 1):
+            row[SOURCE_ROW_COLUMN] = row_number
+        yield batch
+
+# صيغ الرفع المدعومة: لاحقة اسم الملف -> الصيغة (الأطول أولاً حتى تسبق .csv.gz لاحقة .gz)
+UPLOAD_FORMATS = {
+    '.csv.gz': 'csv',
+    '.tsv.gz': 'tsv',
+    '.parquet': 'parquet',
+    '.xlsx': 'xlsx',
+    '.xls': 'xls',
+    '.csv': 'csv',
+    '.tsv': 'tsv',
+}
+DELIMITERS = {'csv': ',', 'tsv': '\t'}
+
+def upload_file_format(filename: str) -> Optional[Tuple[str, str]]:
+    """(الصيغة، اللاحقة) لاسم الملف المرفوع أو None إن لم تكن مدعومة"""
+    lowered = filename.lower()
+    for suffix, file_format in UPLOAD_FORMATS.items():
+        if lowered.endswith(suffix):
+            return file_format, suffix
+    return None
+
+def arrow_row_batches(columns: List[str], record_batches, batch_rows: int) -> Iterator[List[Dict[str, Any]]]:
+    """دفعات Arrow -> دفعات صفوف بنفس شكل open_excel_row_stream (قيم Python، الفارغ None، تخطي الصفوف الفارغة)"""
+    batch = []
+    row_number = 0
+    for record_batch in record_batches:
+        for values in zip(*(column.to_pylist() for column in record_batch.columns)):
+            row_number += 1
+            if all(value is None or (isinstance(value, str) and not value.strip()) for value in values):
+                continue  # صف فارغ
+            row = dict(zip(columns, values))
+            row[SOURCE_ROW_COLUMN] = row_number
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def open_delimited_row_stream(source, delimiter: str, batch_rows: int = EXCEL_STREAM_BATCH_ROWS) -> Tuple[List[str], Iterator[List[Dict[str, Any]]]]:
+    """CSV/TSV (مضغوط gzip إن انتهى المسار بـ .gz) بقارئ pyarrow متعدد الخيوط
+
+    كل الأعمدة تُقرأ نصاً حتى لا تضيع الأصفار البادئة في أرقام الجلوس وأكواد المدارس (00123)؛
+    أعمدة الدرجات تُحوّل أرقاماً صراحة عند الفحص والمعالجة (pd.to_numeric)، والخلايا الفارغة None
+    """
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter)
+    with pa_csv.open_csv(source, parse_options=parse_options) as header_reader:
+        names = header_reader.schema.names
+    table = pa_csv.read_csv(
+        source,
+        parse_options=parse_options,
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in names}, strings_can_be_null=True
+        )
+    )
+    if table.num_columns == 0:
+        return [], iter(())
+    columns = excel_header_columns(tuple(name or None for name in table.column_names))
+    return columns, arrow_row_batches(columns, table.to_batches(max_chunksize=batch_rows), batch_rows)
+
+def open_parquet_row_stream(source, batch_rows: int = EXCEL_STREAM_BATCH_ROWS) -> Tuple[List[str], Iterator[List[Dict[str, Any]]]]:
+    """Parquet على دفعات: لا تُحمّل في الذاكرة أكثر من دفعة واحدة"""
+    parquet_file = pq.ParquetFile(source)
+    columns = excel_header_columns(tuple(name or None for name in parquet_file.schema_arrow.names))
+    if not columns:
+        return [], iter(())
+    return columns, arrow_row_batches(columns, parquet_file.iter_batches(batch_size=batch_rows), batch_rows)
+
+def open_upload_row_stream(source_path: str, file_format: str, batch_rows: int = EXCEL_STREAM_BATCH_ROWS) -> Tuple[List[str], Iterator[List[Dict[str, Any]]]]:
+    """(الأعمدة، دفعات الصفوف) لأي صيغة رفع مدعومة بأسرع قارئ متاح لها"""
+    if file_format == 'xlsx':
+        return open_excel_row_stream(source_path, batch_rows)
+    if file_format in DELIMITERS:
+        return open_delimited_row_stream(source_path, DELIMITERS[file_format], batch_rows)
+    if file_format == 'parquet':
+        return open_parquet_row_stream(source_path, batch_rows)
+    # .xls (حتى 65536 صفاً بحكم الصيغة) لا يدعم القراءة المتدفقة
+    df = pd.read_excel(source_path)
+    columns = [sanitize_string(str(col)) for col in df.columns]
+    df.columns = columns
+    return columns, dataframe_row_batches(df, batch_rows)
+
 def smart_data_validation(df: pd.DataFrame, stage_template: Optional[StageTemplate] = None, mapping: Optional[Dict] = None) -> DataValidationResult:
     """فحص ذكي للبيانات مع اقتراحات للإصلاح"""
     result = DataValidationResult()
@@ -800,7 +1742,7 @@ def smart_data_validation(df: pd.DataFrame, stage_template: Optional[StageTempla
             # فحص أعمدة المواد
             for subject_col in mapping.get('subject_columns', []):
                 if subject_col in df.columns:
-                    subject_data = df[subject_col].dropna()
+                    subject_data = pd.to_numeric(df[subject_col], errors='coerce').dropna()
                     if len(subject_data) > 0:
                         # البحث عن القالب المناسب للمادة
                         subject_template = None
@@ -921,34 +1863,1014 @@ def smart_data_validation(df: pd.DataFrame, stage_template: Optional[StageTempla
     
     return result
 
-async def create_indexes():
-    """إنشاء فهارس قاعدة البيانات للبحث السريع"""
+# ========== أعمال الرفع والفحص في مجمع العمليات (cpu_pool) ==========
+# دوال على مستوى الوحدة بمعاملات ونتائج قابلة لـ pickle
+
+def analyze_excel_sample(columns: List[str], sample_rows: List[Dict[str, Any]]) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """اقتراح ربط الأعمدة من العينة وأول 5 صفوف للعرض"""
+    sample_df = pd.DataFrame(sample_rows, columns=columns)
+    suggested_mappings = {}
+    
+    for col in columns:
+        suggested_type = detect_column_type(sample_df[col], col)
+        if suggested_type not in suggested_mappings.values() or suggested_type == 'subject':
+            suggested_mappings[col] = suggested_type
+    
+    sample_data = []
+    for _, row in sample_df.head(5).iterrows():
+        sample_row = {}
+        for col in columns:
+            value = row[col]
+            if pd.isna(value):
+                sample_row[col] = ""
+            else:
+                sample_row[col] = sanitize_string(str(value))
+        sample_data.append(sample_row)
+    
+    return suggested_mappings, sample_data
+
+# ========== تخزين بيانات الرفع الخام (Parquet عمودي مضغوط) ==========
+
+UPLOAD_DATA_BUCKET = "upload_data"  # GridFS: ملف Parquet واحد لكل رفع باسم file_hash
+UPLOAD_DATA_COMPRESSION = "zstd"
+
+def arrow_column_type(value_types: set) -> pa.DataType:
+    """نوع Arrow ثابت لعمود من أنواع قيم خلاياه: منطقي أو تاريخ، وغير ذلك نص
+
+    الأرقام تُخزن نصاً كما في CSV: عمود صحيح فيه خلية فارغة يصبح float64 في pandas
+    فيتغير رقم الجلوس (1001 -> 1001.0) حسب الدفعة؛ الدرجات تُحوّل أرقاماً عند الفحص والمعالجة
+    """
+    value_types = value_types - {type(None)}
+    if not value_types:
+        return pa.string()
+    if all(issubclass(value_type, (bool, np.bool_)) for value_type in value_types):
+        return pa.bool_()
+    if all(issubclass(value_type, datetime) for value_type in value_types):
+        return pa.timestamp('us')
+    return pa.string()
+
+def cell_string(value: Any) -> Optional[str]:
+    """قيمة خلية كنص: الأعداد الصحيحة (ولو خُزنت عشرية مثل 1001.0) بلا فاصلة عشرية، والفارغ None"""
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return None
+        if value.is_integer():
+            return str(int(value))
+    return str(value)
+
+def arrow_column(values: List[Any], arrow_type: pa.DataType) -> pa.Array:
+    if arrow_type == pa.string():
+        values = [cell_string(value) for value in values]
+    return pa.array(values, type=arrow_type)
+
+def stage_excel_upload(source_path: str, file_format: str, data_path: str) -> Dict[str, Any]:
+    """قراءة الملف وكتابته Parquet مضغوطاً في data_path مع تحليل العينة
+
+    القراءة والتحليل (XML أو CSV أو Parquet) هما الجزء الثقيل؛ العملية الرئيسية ترفع data_path إلى GridFS.
+    مرور أول يحفظ الدفعات مؤقتاً ويجمع أنواع القيم في كل عمود، ومرور ثانٍ يكتب كل دفعة row group مستقلاً
+    بنوع ثابت لكل عمود، فرقم الـ row group هو رقم الدفعة الذي تستأنف منه مهام الاستيراد
+    """
+    columns, batches = open_upload_row_stream(source_path, file_format)
+    batches_path = data_path + '.batches'
+    
+    sample_rows = []
+    total_rows = 0
+    chunk_count = 0
+    value_types = {column: set() for column in columns}
+    try:
+        with open(batches_path, "wb") as output:
+            for batch in batches:
+                if len(sample_rows) < EXCEL_ANALYSIS_SAMPLE_ROWS:
+                    sample_rows.extend(batch[:EXCEL_ANALYSIS_SAMPLE_ROWS - len(sample_rows)])
+                for column in columns:
+                    value_types[column].update(map(type, (row.get(column) for row in batch)))
+                pickle.dump(batch, output, protocol=pickle.HIGHEST_PROTOCOL)
+                total_rows += len(batch)
+                chunk_count += 1
+        
+        if total_rows:
+            schema = pa.schema(
+                [(column, arrow_column_type(value_types[column])) for column in columns] + [(SOURCE_ROW_COLUMN, pa.int64())]
+            )
+            with pq.ParquetWriter(data_path, schema, compression=UPLOAD_DATA_COMPRESSION) as writer:
+                for batch in iter_staged_batches(batches_path):
+                    arrays = [arrow_column([row.get(field.name) for row in batch], field.type) for field in schema]
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema), row_group_size=len(batch))
+    finally:
+        try:
+            os.unlink(batches_path)
+        except FileNotFoundError:
+            pass
+    
+    suggested_mappings, sample_data = analyze_excel_sample(columns, sample_rows) if total_rows else ({}, [])
+    return {
+        "columns": columns,
+        "total_rows": total_rows,
+        "chunk_count": chunk_count,
+        "suggested_mappings": suggested_mappings,
+        "sample_data": sample_data
+    }
+
+def open_upload_data(source: Union[bytes, str]) -> pq.ParquetFile:
+    """بيانات الرفع من ملف على القرص (مسار) أو من الذاكرة: القراءة من الملف لا تحمّل إلا ما يُطلب منه"""
+    return pq.ParquetFile(pa.BufferReader(source) if isinstance(source, bytes) else source)
+
+def read_upload_data(source: Union[bytes, str], columns: Optional[List[str]] = None, row_group: Optional[int] = None) -> pd.DataFrame:
+    """بيانات الرفع (أو row group واحد منها) مباشرة إلى DataFrame؛ columns: قراءة هذه الأعمدة فقط"""
+    parquet_file = open_upload_data(source)
+    if columns is not None:
+        available = set(parquet_file.schema_arrow.names)
+        columns = [column for column in dict.fromkeys(columns) if column in available]
+    if row_group is None:
+        table = parquet_file.read(columns=columns)
+    else:
+        table = parquet_file.read_row_group(row_group, columns=columns)
+    return table.to_pandas()
+
+def upload_data_row_groups(source: Union[bytes, str]) -> int:
+    return open_upload_data(source).num_row_groups
+
+def mapping_columns(mapping: ColumnMapping) -> List[str]:
+    """أعمدة الملف التي يستخدمها الربط فعلاً"""
+    columns = [mapping.student_id_column, mapping.name_column, *mapping.subject_columns]
+    columns += [getattr(mapping, attribute) for attribute in ("total_column", *(attribute for _, attribute, _ in OPTIONAL_TEXT_FIELDS))]
+    return [column for column in columns if column]
+
+def iter_staged_batches(batches_path: str) -> Iterator[List[Dict[str, Any]]]:
+    """دفعات الصفوف التي كتبها stage_excel_upload بالترتيب"""
+    with open(batches_path, "rb") as source:
+        while True:
+            try:
+                yield pickle.load(source)
+            except EOFError:
+                return
+
+def validate_excel_rows(rows: List[Dict[str, Any]], stage_template: Optional[StageTemplate], mapping: Optional[Dict]) -> DataValidationResult:
+    return smart_data_validation(pd.DataFrame(rows), stage_template, mapping)
+
+def validate_upload_data(source: Union[bytes, str], stage_template: Optional[StageTemplate], mapping: Optional[Dict]) -> DataValidationResult:
+    df = read_upload_data(source).drop(columns=[SOURCE_ROW_COLUMN], errors='ignore')  # وإلا لن يتكرر أي صف
+    return smart_data_validation(df, stage_template, mapping)
+
+# ========== كاش نتائج الطلاب ==========
+
+class CachedResult(NamedTuple):
+    body: bytes  # JSON جاهز للإرسال
+    etag: str
+
+class StudentResultCache:
+    """كاش داخلي (TTL + LRU) لنتائج الطلاب المسلسلة مسبقاً، محدود بعدد العناصر وبالحجم بالبايت"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        result, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._discard(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def set(self, key: str, result: CachedResult):
+        if len(result.body) > self.max_bytes:
+            return
+        self._discard(key)
+        self._entries[key] = (result, time.monotonic() + self.ttl_seconds)
+        self._bytes += len(result.body)
+        # إخراج الأقدم استخداماً حتى نعود داخل الحدود
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (old_result, _) = self._entries.popitem(last=False)
+            self._bytes -= len(old_result.body)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        if self._discard(key):
+            self.invalidations += 1
+
+    def invalidate_many(self, keys):
+        for key in keys:
+            self.invalidate(key)
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+
+    def _discard(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= len(entry[0].body)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+student_result_cache = StudentResultCache(
+    max_entries=int(os.environ.get('STUDENT_CACHE_MAX_ENTRIES', 300000)),
+    max_bytes=int(os.environ.get('STUDENT_CACHE_MAX_MB', 256)) * 1024 * 1024,
+    ttl_seconds=float(os.environ.get('STUDENT_CACHE_TTL_SECONDS', 300))
+)
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def dumps_json(data: Any) -> bytes:
+    """تحويل إلى JSON بنفس شكل استجابات FastAPI (UTF-8 بدون هروب الحروف العربية)"""
+    return json.dumps(data, ensure_ascii=False, default=json_default).encode("utf-8")
+
+def student_read_model(student_data: dict) -> Dict[str, Any]:
+    """بناء استجابة الطالب من مستند قاعدة البيانات مباشرة دون إعادة تشغيل المُدققات
+    (المجموع والمتوسط والتقدير والنسب حُسبت وتم التحقق منها عند الاستيراد)"""
+    student = {}
+    for field_name, field in Student.model_fields.items():
+        if field_name in student_data:
+            student[field_name] = student_data[field_name]
+        else:
+            student[field_name] = field.get_default(call_default_factory=True)
+    student["subjects"] = [
+        {
+            "name": subject.get("name"),
+            "score": subject.get("score"),
+            "max_score": subject.get("max_score", 100),
+            "percentage": subject.get("percentage")
+        }
+        for subject in student["subjects"] or []
+    ]
+    return student
+
+def serialize_student_document(student_data: dict) -> bytes:
+    """تحويل مستند الطالب إلى JSON جاهز للإرسال (مسار القراءة الموثوق)"""
+    return dumps_json(student_read_model(student_data))
+
+# ========== ETag والطلبات المشروطة ==========
+
+# سياسات Cache-Control للمتصفحات والـ reverse proxy
+CACHE_CONTROL_RESULTS = "public, max-age=60"
+CACHE_CONTROL_PAGES = "public, max-age=120"
+CACHE_CONTROL_SITE = "public, max-age=300"
+
+# إصدار التطبيق وشكل الاستجابات: نشر جديد يغيّر كل الـ ETags فلا تُعاد 304 لنسخة مخزنة بالشكل القديم
+ETAG_BUILD_VERSION = f"{app.version}:{os.environ.get('APP_BUILD_VERSION', '')}"
+
+def make_etag(*parts: Any) -> str:
+    """ETag قوي مشتق من إصدار البناء وطوابع التحديث (processed_at/updated_at) ومعرّفات المحتوى"""
+    digest = hashlib.sha1("|".join(str(part) for part in (ETAG_BUILD_VERSION, *parts)).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def not_modified_response(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+def student_etag(student_data: dict) -> str:
+    return make_etag(
+        "student",
+        student_data.get("student_id"),
+        student_data.get("processed_at") or student_data.get("updated_at"),
+        student_data.get("ranks_updated_at")
+    )
+
+def cache_student_result(student_data: dict) -> CachedResult:
+    """تسلسل نتيجة الطالب مع ETag الخاص بها وحفظها في الكاش"""
+    result = CachedResult(serialize_student_document(student_data), student_etag(student_data))
+    student_result_cache.set(student_data["student_id"], result)
+    return result
+
+async def bump_content_version(name: str):
+    """تسجيل وقت آخر تعديل لمحتوى عام (stages, site_settings, homepage, students)
+
+    revision يميّز تعديلين في نفس الملّي ثانية (دقة التواريخ في MongoDB) فلا يتكرر الـ ETag
+    """
+    await db.content_versions.update_one(
+        {"_id": name},
+        {"$set": {"updated_at": datetime.utcnow()}, "$inc": {"revision": 1}},
+        upsert=True
+    )
+
+def content_version_stamp(version_doc: Optional[dict]) -> Optional[str]:
+    if not version_doc:
+        return None
+    return f"{version_doc.get('updated_at')}#{version_doc.get('revision', 0)}"
+
+# مجموعات المحتوى الصغيرة التي يدخل آخر updated_at لمستنداتها في الـ ETag:
+# الإعدادات والمراحل الافتراضية تُنشأ عند التشغيل أو أول طلب دون bump_content_version
+CONTENT_VERSION_COLLECTIONS = {
+    "stages": "educational_stages",
+    "site_settings": "site_settings",
+    "homepage": "homepage",
+}
+
+async def latest_document_update(collection_name: str) -> Optional[datetime]:
+    document = await db[collection_name].find_one({}, {"_id": 0, "updated_at": 1}, sort=[("updated_at", -1)])
+    return document.get("updated_at") if document else None
+
+async def content_version_etag(*names: str) -> str:
+    """ETag من طوابع آخر تعديل للمحتويات المذكورة (استعلامات صغيرة بدلاً من تنفيذ الـ handler)"""
+    versions = {
+        version["_id"]: content_version_stamp(version)
+        for version in await db.content_versions.find({"_id": {"$in": list(names)}}).to_list(length=len(names))
+    }
+    document_names = [name for name in names if name in CONTENT_VERSION_COLLECTIONS]
+    document_updates = dict(zip(document_names, await asyncio.gather(
+        *(latest_document_update(CONTENT_VERSION_COLLECTIONS[name]) for name in document_names)
+    )))
+    return make_etag(*(f"{name}:{versions.get(name)}:{document_updates.get(name)}" for name in names))
+
+# ========== دمج الطلبات المتزامنة ==========
+
+class SingleFlight:
+    """دمج الطلبات المتزامنة لنفس المفتاح في عملية واحدة يتشارك الجميع نتيجتها"""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # shield: إلغاء أحد الطلبات (انقطاع العميل) لا يلغي الاستعلام المشترك
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # تجنب تحذير "exception was never retrieved"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "coalesced_rate": round(self.coalesced / self.calls, 4) if self.calls else 0,
+            "in_flight": len(self._inflight)
+        }
+
+student_lookup_flight = SingleFlight()
+search_facets_flight = SingleFlight()
+
+# نتائج الفلاتر المجمعة: المفتاح يتضمن إصدار بيانات الطلاب فيتجدد تلقائياً بعد كل استيراد
+search_facets_cache = StudentResultCache(
+    max_entries=int(os.environ.get('FACETS_CACHE_MAX_ENTRIES', 5000)),
+    max_bytes=int(os.environ.get('FACETS_CACHE_MAX_MB', 32)) * 1024 * 1024,
+    ttl_seconds=float(os.environ.get('FACETS_CACHE_TTL_SECONDS', 120))
+)
+
+async def fetch_student_document(student_id: str) -> Optional[dict]:
+    """جلب مستند الطالب مع دمج الطلبات المتزامنة لنفس رقم الجلوس (لا تعدّل المستند المُعاد)"""
+    return await student_lookup_flight.do(
+        student_id,
+        lambda: db.students.find_one({"student_id": student_id})
+    )
+
+# ========== محرك الاقتراحات التلقائية داخل الذاكرة ==========
+
+class SuggestionIndex:
+    """فهرس اقتراحات داخل الذاكرة (مصفوفات مرتبة + bisect) للأسماء وأرقام الجلوس والمدارس"""
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        # (أسماء موحدة مرتبة، (الاسم، رقم الجلوس)، أرقام جلوس مرتبة، أسماء أصحابها، مفاتيح المدارس، أسماء المدارس)
+        self._arrays: tuple = ([], [], [], [], [], [])
+        self.ready = False
+        self.built_at: Optional[datetime] = None
+        self.build_seconds: Optional[float] = None
+        self._built_monotonic = 0.0
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self._force = False
+        self._version: Optional[str] = None
+
+    @staticmethod
+    def _prefix_matches(keys: List[str], prefix: str, limit: int) -> List[int]:
+        positions = []
+        position = bisect_left(keys, prefix)
+        while position < len(keys) and len(positions) < limit and keys[position].startswith(prefix):
+            positions.append(position)
+            position += 1
+        return positions
+
+    def suggest(self, q: str) -> List[Dict[str, str]]:
+        names, name_entries, student_ids, id_names, school_keys, school_names = self._arrays
+        suggestions = []
+        
+        normalized = normalize_arabic_name(q)
+        if normalized:
+            for position in self._prefix_matches(names, normalized, 5):
+                name, student_id = name_entries[position]
+                suggestions.append({
+                    "type": "student",
+                    "text": name,
+                    "subtitle": f"رقم الجلوس: {student_id}",
+                    "value": name
+                })
+        
+        seat_number = normalize_student_id(q)
+        if seat_number.isdigit():
+            for position in self._prefix_matches(student_ids, seat_number, 3):
+                suggestions.append({
+                    "type": "student_id",
+                    "text": student_ids[position],
+                    "subtitle": id_names[position],
+                    "value": student_ids[position]
+                })
+        
+        if normalized:
+            schools = []
+            for position in self._prefix_matches(school_keys, normalized, 20):
+                if school_names[position] not in schools:
+                    schools.append(school_names[position])
+                if len(schools) == 3:
+                    break
+            for school in schools:
+                suggestions.append({
+                    "type": "school",
+                    "text": school,
+                    "subtitle": "مدرسة",
+                    "value": school
+                })
+        
+        return suggestions[:10]
+
+    def load(self, students: List[dict]):
+        """بناء المصفوفات المرتبة من مستندات الطلاب ثم استبدالها دفعة واحدة"""
+        started = time.monotonic()
+        names = sorted(
+            (student.get("name_normalized") or normalize_arabic_name(student.get("name") or ""),
+             student.get("name") or "", student.get("student_id") or "")
+            for student in students
+        )
+        ids = sorted((student.get("student_id") or "", student.get("name") or "") for student in students)
+        schools = {student["school_name"] for student in students if student.get("school_name")}
+        # كل مدرسة تُفهرس من بداية كل كلمة في اسمها ("مدرسة النصر" تظهر عند كتابة "النصر")
+        school_entries = sorted(
+            (" ".join(tokens[start:]), school)
+            for school in schools
+            for tokens in [normalize_arabic_name(school).split()]
+            for start in range(len(tokens))
+        )
+        self._arrays = (
+            [entry[0] for entry in names],
+            [(entry[1], entry[2]) for entry in names],
+            [entry[0] for entry in ids],
+            [entry[1] for entry in ids],
+            [entry[0] for entry in school_entries],
+            [entry[1] for entry in school_entries]
+        )
+        self.ready = True
+        self.built_at = datetime.utcnow()
+        self._built_monotonic = time.monotonic()
+        self.build_seconds = round(self._built_monotonic - started, 3)
+
+    def schedule_rebuild(self, force: bool = True):
+        """إعادة البناء في الخلفية (الطلبات أثناء التنفيذ تُدمج في دورة واحدة تالية)
+
+        force=False يتخطى القراءة من القاعدة إن لم تتغير نسخة students منذ آخر بناء
+        """
+        self._force = self._force or force
+        if self._rebuild_task and not self._rebuild_task.done():
+            self._dirty = True
+            return
+        self._rebuild_task = start_background_task(self._rebuild_loop())
+
+    def refresh_if_stale(self):
+        if not self.ready:
+            self.schedule_rebuild()
+        elif time.monotonic() - self._built_monotonic > self.refresh_seconds:
+            self.schedule_rebuild(force=False)
+
+    async def _rebuild_loop(self):
+        while True:
+            self._dirty = False
+            force, self._force = self._force, False
+            try:
+                await self.rebuild(force)
+            except Exception as e:
+                logger.error(f"Error building suggestion index: {str(e)}")
+            if not self._dirty:
+                break
+
+    async def rebuild(self, force: bool = True):
+        # النسخة تُقرأ قبل المسح حتى تُلتقط الكتابات المتزامنة معه في الدورة التالية
+        version = content_version_stamp(await db.content_versions.find_one({"_id": "students"}))
+        if not force and self.ready and version == self._version:
+            self._built_monotonic = time.monotonic()
+            return
+        # المؤشر يُقرأ دفعة دفعة بدل تحميل الإسقاط كله بـ to_list
+        students = [
+            student async for student in db.students.find(
+                {},
+                {"_id": 0, "student_id": 1, "name": 1, "name_normalized": 1, "school_name": 1}
+            ).batch_size(10000)
+        ]
+        # الترتيب لملايين العناصر يتم خارج حلقة الأحداث
+        await asyncio.to_thread(self.load, students)
+        self._version = version
+        logger.info(f"Suggestion index built: {len(students)} students in {self.build_seconds}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "students": len(self._arrays[0]),
+            "school_keys": len(self._arrays[4]),
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "build_seconds": self.build_seconds,
+            "rebuilding": bool(self._rebuild_task and not self._rebuild_task.done())
+        }
+
+suggestion_index = SuggestionIndex(refresh_seconds=float(os.environ.get('SUGGESTION_INDEX_REFRESH_SECONDS', 600)))
+
+# ========== Bloom filter لأرقام الجلوس غير الموجودة ==========
+
+class BloomFilter:
+    """Bloom filter مضغوط (bytearray) بتجزئة مزدوجة من blake2b"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.bit_count = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.bit_count / self.capacity * math.log(2))))
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.items = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.items += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def estimated_false_positive_rate(self) -> float:
+        fill_ratio = int.from_bytes(self.bits, "little").bit_count() / self.bit_count
+        return fill_ratio ** self.hash_count
+
+class SeatNumberFilter:
+    """رفض أرقام الجلوس غير الموجودة من الذاكرة: Bloom filter لكل الأرقام + كاش سلبي قصير للإيجابيات الكاذبة"""
+
+    def __init__(self, error_rate: float, negative_ttl_seconds: float, negative_max_entries: int, refresh_seconds: float):
+        self.error_rate = error_rate
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.negative_max_entries = negative_max_entries
+        self.refresh_seconds = refresh_seconds
+        self._bloom: Optional[BloomFilter] = None
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+        self._version = None  # طابع content_versions["students"] الذي بُني عليه الفلتر
+        self._seen_version = None  # آخر طابع رآه هذا العامل (لمسح كاش النتائج عند تغيره)
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.built_at: Optional[datetime] = None
+        self.build_seconds: Optional[float] = None
+        self.bloom_rejections = 0
+        self.negative_hits = 0
+        self.false_positives = 0
+
+    def definitely_absent(self, student_id: str) -> bool:
+        if self._bloom is None:
+            return False  # الفلتر غير جاهز أو قديم: لا نرفض شيئاً
+        if student_id not in self._bloom:
+            self.bloom_rejections += 1
+            return True
+        expires_at = self._negative.get(student_id)
+        if expires_at is not None:
+            if expires_at > time.monotonic():
+                self.negative_hits += 1
+                return True
+            del self._negative[student_id]
+        return False
+
+    def record_missing(self, student_id: str):
+        """رقم مرّ من الفلتر ولم يوجد في قاعدة البيانات (إيجابي كاذب)"""
+        if self._bloom is None:
+            return
+        self.false_positives += 1
+        self._negative[student_id] = time.monotonic() + self.negative_ttl_seconds
+        self._negative.move_to_end(student_id)
+        while len(self._negative) > self.negative_max_entries:
+            self._negative.popitem(last=False)
+
+    def add(self, student_ids):
+        """إضافة أرقام جديدة فوراً (قبل إعادة البناء) حتى لا تُرفض بعد الاستيراد"""
+        for student_id in student_ids:
+            if self._bloom is not None:
+                self._bloom.add(student_id)
+            self._negative.pop(student_id, None)
+
+    def start(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = start_background_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing seat number filter: {str(e)}")
+            await asyncio.sleep(self.refresh_seconds)
+
+    async def refresh(self):
+        """إعادة البناء عند تغير نسخة الطلاب؛ أثناء مهمة استيراد جارية (في أي عامل) لا نرفض شيئاً
+
+        تغيّر النسخة يمسح أيضاً كاش نتائج الطلاب في هذا العامل: الكتابة في عامل آخر
+        (استيراد، ترتيب، حذف) لا تُخلي إلا كاش ذلك العامل
+        """
+        version = content_version_stamp(await db.content_versions.find_one({"_id": "students"}))
+        if version != self._seen_version:
+            self._seen_version = version
+            student_result_cache.clear()
+        if await jobs_db.ingestion_jobs.find_one({"status": "running"}, {"_id": 1}) is not None:
+            # دفعات المهمة تُكتب تباعاً وفلتر هذا العامل لا يعرف أرقامها: نعيد البناء مرة واحدة بعد انتهائها
+            self._bloom = None
+            self._negative.clear()
+            return
+        if self._bloom is None or version != self._version:
+            # تعطيل الرفض حتى يكتمل البناء لتجنب 404 خاطئ لأرقام مستوردة في عامل آخر
+            self._bloom = None
+            self._negative.clear()
+            await self.rebuild(version)
+
+    async def rebuild(self, version):
+        started = time.monotonic()
+        student_ids = [
+            student["student_id"]
+            async for student in db.students.find({}, {"_id": 0, "student_id": 1}).batch_size(10000)
+        ]
+        
+        def build():
+            bloom = BloomFilter(capacity=int(len(student_ids) * 1.2) + 1000, error_rate=self.error_rate)
+            for student_id in student_ids:
+                bloom.add(student_id)
+            return bloom
+        
+        self._bloom = await asyncio.to_thread(build)
+        self._version = version
+        self.built_at = datetime.utcnow()
+        self.build_seconds = round(time.monotonic() - started, 3)
+        logger.info(f"Seat number filter built: {len(student_ids)} ids in {self.build_seconds}s")
+
+    def stats(self) -> Dict[str, Any]:
+        bloom = self._bloom
+        absent_lookups = self.bloom_rejections + self.false_positives
+        return {
+            "ready": bloom is not None,
+            "items": bloom.items if bloom else 0,
+            "capacity": bloom.capacity if bloom else 0,
+            "bits": bloom.bit_count if bloom else 0,
+            "hash_count": bloom.hash_count if bloom else 0,
+            "memory_bytes": len(bloom.bits) if bloom else 0,
+            "target_false_positive_rate": self.error_rate,
+            "estimated_false_positive_rate": round(bloom.estimated_false_positive_rate(), 6) if bloom else None,
+            "observed_false_positive_rate": round(self.false_positives / absent_lookups, 6) if absent_lookups else None,
+            "bloom_rejections": self.bloom_rejections,
+            "negative_cache_hits": self.negative_hits,
+            "false_positives": self.false_positives,
+            "negative_cache_entries": len(self._negative),
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "build_seconds": self.build_seconds
+        }
+
+seat_number_filter = SeatNumberFilter(
+    error_rate=float(os.environ.get('SEAT_FILTER_ERROR_RATE', 0.001)),
+    negative_ttl_seconds=float(os.environ.get('SEAT_FILTER_NEGATIVE_TTL_SECONDS', 30)),
+    negative_max_entries=int(os.environ.get('SEAT_FILTER_NEGATIVE_MAX_ENTRIES', 100000)),
+    refresh_seconds=float(os.environ.get('SEAT_FILTER_REFRESH_SECONDS', 5))
+)
+
+# ========== ترتيب الطلاب المحسوب مسبقاً ==========
+
+# نطاقات الترتيب وحقول التجميع لكل نطاق
+RANK_SCOPES = {
+    "overall": [],
+    "stage": ["educational_stage_id"],
+    "region": ["educational_stage_id", "region"],
+    "administration": ["educational_stage_id", "region", "administration"],
+    "school": ["educational_stage_id", "region", "administration", "school_name"]
+}
+RANK_FIELDS = ["student_id", "average"] + list(dict.fromkeys(key for keys in RANK_SCOPES.values() for key in keys))
+
+def compute_student_ranks(
+    students: pd.DataFrame,
+    overall_averages: Optional[np.ndarray] = None
+) -> List[Dict[str, Dict[str, int]]]:
+    """حساب ترتيب كل طالب في جميع النطاقات دفعة واحدة (المتساوون يأخذون نفس الترتيب: 1، 1، 3)
+
+    overall_averages: معدلات جميع الطلاب مرتبة تصاعدياً عند حساب جزء من المجموعة (مرحلة واحدة)
+    """
+    averages = pd.to_numeric(students["average"], errors="coerce")
+    total = len(students)
+    scope_columns = {}
+    for scope, keys in RANK_SCOPES.items():
+        mask = averages.notna()
+        for key in keys:
+            mask &= students[key].notna() & (students[key] != "")
+        ranks = np.zeros(total, dtype=np.int64)
+        sizes = np.zeros(total, dtype=np.int64)
+        if mask.any():
+            scoped = averages[mask]
+            if not keys and overall_averages is not None:
+                # الترتيب = عدد المعدلات الأعلى في المجموعة كلها + 1
+                higher = len(overall_averages) - np.searchsorted(overall_averages, scoped.to_numpy(dtype=float), side="right")
+                ranks[mask.to_numpy()] = higher + 1
+                sizes[mask.to_numpy()] = len(overall_averages)
+            elif keys:
+                grouped = scoped.groupby([students.loc[mask, key] for key in keys])
+                ranks[mask.to_numpy()] = grouped.rank(method="min", ascending=False).to_numpy()
+                sizes[mask.to_numpy()] = grouped.transform("size").to_numpy()
+            else:
+                ranks[mask.to_numpy()] = scoped.rank(method="min", ascending=False).to_numpy()
+                sizes[mask.to_numpy()] = len(scoped)
+        scope_columns[scope] = (ranks.tolist(), sizes.tolist())
+    
+    return [
+        {
+            scope: {"rank": ranks[position], "out_of": sizes[position]}
+            for scope, (ranks, sizes) in scope_columns.items()
+            if ranks[position]
+        }
+        for position in range(total)
+    ]
+
+async def update_student_ranks(batch_size: int = 1000) -> int:
+    """إعادة حساب ترتيب جميع الطلاب مرحلةً مرحلة وكتابة المتغير منه فقط
+
+    كل النطاقات عدا overall داخل مرحلة واحدة، فلا تُحمّل في الذاكرة إلا مرحلة واحدة مع مصفوفة المعدلات للترتيب العام
+    """
+    overall_averages = np.sort(np.array([
+        student["average"]
+        async for student in db.students.find({"average": {"$type": "number"}}, {"_id": 0, "average": 1}).batch_size(10000)
+    ], dtype=float))
+    overall_averages = overall_averages[~np.isnan(overall_averages)]
+    stage_ids = await db.students.distinct("educational_stage_id")
+    if None not in stage_ids:
+        stage_ids.append(None)  # {"educational_stage_id": None} يشمل الطلاب بدون مرحلة
+    
+    projection = {"_id": 0, "ranks": 1, **{field: 1 for field in RANK_FIELDS}}
+    ranked_at = datetime.utcnow()
+    changed_count = 0
+    for stage_id in stage_ids:
+        students = await db.students.find({"educational_stage_id": stage_id}, projection).to_list(length=None)
+        if not students:
+            continue
+        
+        def find_changed():
+            frame = pd.DataFrame(students, columns=RANK_FIELDS)
+            new_ranks = compute_student_ranks(frame, overall_averages)
+            return [
+                (student["student_id"], ranks)
+                for student, ranks in zip(students, new_ranks)
+                if student.get("ranks") != ranks
+            ]
+        
+        changed = await asyncio.to_thread(find_changed)
+        for i in range(0, len(changed), batch_size):
+            await jobs_db.students.bulk_write([
+                UpdateOne({"student_id": student_id}, {"$set": {"ranks": ranks, "ranks_updated_at": ranked_at}})
+                for student_id, ranks in changed[i:i + batch_size]
+            ], ordered=False)
+        student_result_cache.invalidate_many(student_id for student_id, _ in changed)
+        changed_count += len(changed)
+    if changed_count:
+        # الترتيب جزء من النتائج العامة: ETag والكاش المبنيان على النسخة السابقة لا يصلحان بعده
+        await bump_content_version("students")
+    return changed_count
+
+class StudentRankScheduler:
+    """إعادة حساب الترتيب في الخلفية بعد الحذف (الطلبات أثناء التنفيذ تُدمج في دورة واحدة تالية)"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._dirty = False
+
+    def schedule(self):
+        if self._task and not self._task.done():
+            self._dirty = True
+            return
+        self._task = start_background_task(self._update_loop())
+
+    async def _update_loop(self):
+        while True:
+            self._dirty = False
+            try:
+                await update_student_ranks()
+            except Exception as e:
+                logger.error(f"Error updating student ranks: {str(e)}")
+            if not self._dirty:
+                break
+
+student_rank_scheduler = StudentRankScheduler()
+
+# ========== ترقيم الصفحات بالمؤشر (Keyset) ==========
+
+def encode_page_cursor(*values: Any) -> str:
+    """مؤشر صفحة غير شفاف من قيم مفتاح الترتيب لآخر عنصر"""
+    payload = [{"$dt": value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, ensure_ascii=False).encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_page_cursor(cursor: str, size: int) -> List[Any]:
     try:
-        await db.students.create_index([("student_id", 1)], unique=True)
-        await db.students.create_index([("name", "text")])
-        await db.students.create_index([("class_name", 1)])
-        await db.students.create_index([("section", 1)])
-        await db.students.create_index([("educational_stage_id", 1)])  # فهرس المرحلة التعليمية
-        await db.students.create_index([("region", 1)])  # فهرس المحافظة
-        await db.excel_files.create_index([("file_hash", 1)], unique=True)
-        await db.admin_users.create_index([("username", 1)], unique=True)
-        await db.admin_users.create_index([("email", 1)], unique=True)
-        await db.educational_stages.create_index([("name", 1)])  # فهرس المراحل
-        await db.educational_stages.create_index([("display_order", 1)])
-        await db.system_settings.create_index([("id", 1)], unique=True)  # فهرس الإعدادات
-        await db.excel_data_chunks.create_index([("file_hash", 1)])  # فهرس البيانات المقسمة
-        await db.excel_data_chunks.create_index([("file_hash", 1), ("chunk_index", 1)])  # فهرس مركب
-        await db.stage_templates.create_index([("stage_id", 1)])  # فهرس قوالب المراحل
-        await db.stage_templates.create_index([("created_by", 1)])
-        await db.mapping_templates.create_index([("created_by", 1)])  # فهرس قوالب الربط
-        await db.mapping_templates.create_index([("stage_id", 1)])
-        await db.mapping_templates.create_index([("usage_count", -1)])  # للترتيب حسب الاستخدام
-        await db.page_templates.create_index([("type", 1), ("stage_id", 1)])  # فهرس قوالب الصفحات
-        await db.certificate_templates.create_index([("category", 1)])  # فهرس قوالب الشهادات
-        await db.certificate_templates.create_index([("usage_count", -1)])  # للترتيب حسب الاستخدام
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(payload, list) or len(payload) != size:
+            raise ValueError("invalid cursor size")
+        return [
+            datetime.fromisoformat(value["$dt"]) if isinstance(value, dict) and "$dt" in value else value
+            for value in payload
+        ]
+    except Exception:
+        raise HTTPException(status_code=400, detail="مؤشر الصفحة غير صالح")
+
+def keyset_after_descending(sort_field: str, last_value: Any, last_id: str) -> Dict[str, Any]:
+    """العناصر بعد آخر عنصر في ترتيب تنازلي على (sort_field, id)"""
+    return {"$or": [
+        {sort_field: {"$lt": last_value}},
+        {sort_field: last_value, "id": {"$lt": last_id}}
+    ]}
+
+_count_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+async def cached_count_with_source(collection, query: Dict[str, Any], ttl_seconds: float = 60) -> Tuple[int, bool]:
+    """(العدد، هل هو تقديري): تقديري من بيانات المجموعة بدون فلتر أو من الكاش، ودقيق عند تنفيذ count_documents"""
+    if not query:
+        return await collection.estimated_document_count(), True
+    key = f"{collection.name}:{json.dumps(query, sort_keys=True, default=json_default)}"
+    entry = _count_cache.get(key)
+    if entry and entry[1] > time.monotonic():
+        return entry[0], True
+    total = await collection.count_documents(query)
+    _count_cache[key] = (total, time.monotonic() + ttl_seconds)
+    _count_cache.move_to_end(key)
+    while len(_count_cache) > 1000:
+        _count_cache.popitem(last=False)
+    return total, False
+
+async def cached_count(collection, query: Dict[str, Any], ttl_seconds: float = 60) -> int:
+    """عدد تقديري: من بيانات المجموعة بدون فلتر، أو count_documents مخزن مؤقتاً مع الفلتر"""
+    return (await cached_count_with_source(collection, query, ttl_seconds))[0]
+
+# كتالوج الفهارس: (المجموعة، المفاتيح، الخيارات) لكل شكل استعلام متكرر
+# الترتيب داخل الفهرس المركب: حقول المساواة ثم حقل الترتيب ثم حقول النطاق
+# tests/test_query_plans.py يتحقق بـ explain() من عدم وجود COLLSCAN أو SORT في الذاكرة
+INDEX_CATALOG: List[Tuple[str, List[Tuple[str, int]], Dict[str, Any]]] = [
+    # الطلاب: رقم الجلوس والبحث بالاسم
+    ("students", [("student_id", 1)], {"unique": True}),
+    ("students", [("name", "text")], {}),
+    ("students", [("name_prefixes", 1), ("student_id", 1)], {}),  # بدايات كلمات الاسم الموحد مرتبة برقم الجلوس
+    ("students", [("name_normalized", 1)], {}),
+    ("students", [("name_trigrams", 1)], {}),  # مرشحو البحث التقريبي
+    # الطلاب: قوائم الأدمن والإحصائيات مرتبة برقم الجلوس
+    ("students", [("educational_stage_id", 1), ("student_id", 1)], {}),
+    ("students", [("region", 1), ("student_id", 1)], {}),
+    # الطلاب: فلاتر الفصل والشعبة في البحث والعدادات (بدون كلمة بحث تُخدم من هنا فقط)
+    ("students", [("class_name", 1), ("student_id", 1)], {}),
+    ("students", [("section", 1), ("student_id", 1)], {}),
+    # الطلاب: ملخص المدارس وتحليلات المراحل والمحافظات (فلاتر المرحلة/المحافظة/الإدارة ثم المدرسة)
+    ("students", [("educational_stage_id", 1), ("region", 1), ("administration", 1), ("school_name", 1)], {}),
+    ("students", [("region", 1), ("administration", 1), ("school_name", 1)], {}),
+    ("students", [("administration", 1), ("school_name", 1)], {}),
+    # الطلاب: طلاب مدرسة مرتبين بالمعدل
+    ("students", [("school_name", 1), ("average", -1)], {}),
+    ("students", [("school_name", 1), ("educational_stage_id", 1), ("average", -1)], {}),
+    ("excel_files", [("file_hash", 1)], {"unique": True}),
+    ("excel_data_chunks", [("file_hash", 1), ("chunk_index", 1)], {}),  # ملفات مرفوعة قبل التخزين العمودي (upload_data)
+    # مهام الاستيراد: الطابور بترتيب الإنشاء وقائمة الأدمن
+    ("ingestion_jobs", [("id", 1)], {"unique": True}),
+    ("ingestion_jobs", [("status", 1), ("created_at", 1)], {}),
+    ("ingestion_jobs", [("created_at", -1)], {}),
+    ("admin_users", [("username", 1)], {"unique": True}),
+    ("admin_users", [("email", 1)], {"unique": True}),
+    ("educational_stages", [("id", 1)], {}),
+    ("educational_stages", [("name", 1)], {}),
+    ("educational_stages", [("display_order", 1)], {}),
+    ("educational_stages", [("is_active", 1), ("display_order", 1)], {}),
+    ("system_settings", [("id", 1)], {"unique": True}),
+    ("rate_limit_blocks", [("until", 1)], {"expireAfterSeconds": 0}),  # حذف الحظر المنتهي تلقائياً
+    ("stage_templates", [("stage_id", 1), ("created_at", -1)], {}),
+    ("stage_templates", [("created_at", -1)], {}),
+    ("stage_templates", [("created_by", 1)], {}),
+    ("mapping_templates", [("created_by", 1)], {}),
+    ("mapping_templates", [("stage_id", 1)], {}),
+    ("mapping_templates", [("usage_count", -1)], {}),
+    ("page_templates", [("type", 1), ("stage_id", 1)], {}),
+    ("certificate_templates", [("category", 1)], {}),
+    ("certificate_templates", [("usage_count", -1)], {}),
+    ("certificate_templates", [("is_active", 1), ("usage_count", -1)], {}),
+    # المشتركون: البحث بالبريد والاستهداف عند إرسال الإشعارات وترقيم الصفحات
+    ("subscribers", [("id", 1)], {}),
+    ("subscribers", [("email", 1)], {}),
+    ("subscribers", [("subscription_date", -1), ("id", -1)], {}),
+    ("subscribers", [("is_active", 1), ("educational_stage", 1)], {}),
+    ("subscribers", [("is_active", 1), ("region", 1)], {}),
+    ("subscribers", [("is_verified", 1)], {}),
+    # الإشعارات
+    ("notifications", [("id", 1)], {}),
+    ("notifications", [("created_at", -1), ("id", -1)], {}),
+    ("notifications", [("status", 1), ("created_at", -1), ("id", -1)], {}),
+    # محتوى الموقع
+    ("page_blocks", [("id", 1)], {}),
+    ("page_blocks", [("order_index", 1)], {}),
+    ("page_blocks", [("is_visible", 1), ("order_index", 1)], {}),
+    ("faq", [("id", 1)], {}),
+    ("faq", [("is_active", 1), ("order", 1)], {}),
+    ("educational_guides", [("id", 1)], {}),
+    ("educational_guides", [("is_active", 1), ("is_featured", -1), ("order", 1)], {}),
+    ("news_articles", [("id", 1)], {}),
+    ("news_articles", [("is_published", 1), ("is_featured", -1), ("published_at", -1)], {}),
+]
+
+async def create_indexes():
+    """إنشاء فهارس قاعدة البيانات من كتالوج الفهارس (فشل فهرس لا يوقف البقية)"""
+    failed = 0
+    for collection, keys, options in INDEX_CATALOG:
+        try:
+            await db[collection].create_index(keys, **options)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Error creating index {collection}{keys}: {str(e)}")
+    if failed:
+        logger.warning(f"Database indexes created with {failed} failures")
+    else:
         logger.info("Database indexes created successfully")
+
+async def backfill_name_search_fields(batch_size: int = 1000, pause_seconds: float = 0.05):
+    """إضافة حقول البحث بالاسم للطلاب المستوردين قبل إضافتها
+
+    تعمل في الخلفية بعد بدء الخدمة (start_background_task) على دفعات عبر jobs_db مع استراحة قصيرة بين الدفعات
+    """
+    try:
+        updated = 0
+        while True:
+            students = await jobs_db.students.find(
+                {"name_trigrams": {"$exists": False}}, {"_id": 1, "name": 1}
+            ).limit(batch_size).to_list(length=batch_size)
+            if not students:
+                break
+            await jobs_db.students.bulk_write([
+                UpdateOne({"_id": student["_id"]}, {"$set": build_name_search_fields(student.get("name") or "")})
+                for student in students
+            ], ordered=False)
+            updated += len(students)
+            await asyncio.sleep(pause_seconds)
+        if updated:
+            logger.info(f"Backfilled name search fields for {updated} students")
+            suggestion_index.schedule_rebuild()
     except Exception as e:
-        logger.error(f"Error creating indexes: {str(e)}")
+        logger.error(f"Error backfilling name search fields: {str(e)}")
 
 async def create_default_admin():
     """إنشاء مدير افتراضي"""
@@ -2162,9 +4084,15 @@ class SEOPage(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 @api_router.get("/stages", response_model=List[EducationalStage])
-async def get_educational_stages():
+async def get_educational_stages(request: Request, response: Response):
     """جلب جميع المراحل التعليمية"""
     try:
+        etag = await content_version_etag("stages")
+        if etag_matches(request, etag):
+            return not_modified_response(etag, CACHE_CONTROL_SITE)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL_SITE
+        
         cursor = db.educational_stages.find({"is_active": True}).sort("display_order", 1)
         stages = await cursor.to_list(length=100)
         return [EducationalStage(**stage) for stage in stages]
@@ -2200,6 +4128,7 @@ async def create_educational_stage(
         )
         
         await db.educational_stages.insert_one(new_stage.dict())
+        await bump_content_version("stages")
         return new_stage
     except Exception as e:
         logger.error(f"Error creating educational stage: {str(e)}")
@@ -2236,6 +4165,7 @@ async def update_educational_stage(
         )
         
         logger.info(f"Update result - matched: {result.matched_count}, modified: {result.modified_count}")
+        await bump_content_version("stages")
         
         updated_stage = await db.educational_stages.find_one({"id": stage_id})
         logger.info(f"Updated stage retrieved: {updated_stage.get('name')}")
@@ -2267,6 +4197,7 @@ async def delete_educational_stage(
         result = await db.educational_stages.delete_one({"id": stage_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="المرحلة التعليمية غير موجودة")
+        await bump_content_version("stages")
         
         return {"message": "تم حذف المرحلة التعليمية بنجاح"}
     except HTTPException:
@@ -2720,9 +4651,9 @@ async def get_school_students(
         cursor = db.students.find(query).sort("average", -1)
         students = await cursor.to_list(length=None)
         
-        return {
+        return Response(content=dumps_json({
             "school_name": school_name,
-            "students": [Student(**student) for student in students],
+            "students": [student_read_model(student) for student in students],
             "total_students": len(students),
             "statistics": {
                 "average_score": round(sum(s["average"] for s in students) / len(students), 2) if students else 0,
@@ -2730,7 +4661,7 @@ async def get_school_students(
                 "highest_score": max(s["average"] for s in students) if students else 0,
                 "lowest_score": min(s["average"] for s in students) if students else 0
             }
-        }
+        }), media_type="application/json")
         
     except Exception as e:
         logger.error(f"Error getting school students: {str(e)}")
@@ -2738,7 +4669,7 @@ async def get_school_students(
 
 # Dynamic Pages Management APIs
 @api_router.get("/stage/{stage_id}/page")
-async def get_stage_page(stage_id: str):
+async def get_stage_page(stage_id: str, request: Request, response: Response):
     """جلب صفحة مرحلة تعليمية"""
     try:
         # جلب بيانات المرحلة
@@ -2773,6 +4704,18 @@ async def get_stage_page(stage_id: str):
             await db.page_templates.insert_one(default_template)
             page_template = default_template
         
+        # الإحصائيات تتغير فقط مع استيراد/حذف الطلاب
+        etag = make_etag(
+            stage.get("updated_at"),
+            page_template.get("id"),
+            page_template.get("updated_at"),
+            await content_version_etag("students")
+        )
+        if etag_matches(request, etag):
+            return not_modified_response(etag, CACHE_CONTROL_PAGES)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL_PAGES
+        
         # حساب الإحصائيات
         student_count = await db.students.count_documents({"educational_stage_id": stage_id})
         regions = await db.students.distinct("region", {"educational_stage_id": stage_id})
@@ -2817,11 +4760,11 @@ async def get_stage_page(stage_id: str):
         raise HTTPException(status_code=500, detail="خطأ في جلب صفحة المرحلة")
 
 @api_router.get("/student/{student_id}/page")
-async def get_student_page(student_id: str):
+async def get_student_page(student_id: str, request: Request, response: Response):
     """جلب صفحة الطالب الشخصية"""
     try:
         # جلب بيانات الطالب
-        student_data = await db.students.find_one({"student_id": student_id})
+        student_data = await fetch_student_document(student_id)
         if not student_data:
             raise HTTPException(status_code=404, detail="لم يتم العثور على الطالب")
         
@@ -2870,6 +4813,17 @@ async def get_student_page(student_id: str):
             await db.page_templates.insert_one(default_template)
             page_template = default_template
         
+        etag = make_etag(
+            student_etag(student_data),
+            stage.get("updated_at") if stage else None,
+            page_template.get("id"),
+            page_template.get("updated_at")
+        )
+        if etag_matches(request, etag):
+            return not_modified_response(etag, CACHE_CONTROL_PAGES)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL_PAGES
+        
         # استبدال المتغيرات
         content = page_template["content"]
         title = page_template["title"]
@@ -2922,7 +4876,7 @@ async def generate_student_certificate(
 ):
     """إنشاء شهادة تقدير للطالب"""
     try:
-        student_data = await db.students.find_one({"student_id": student_id})
+        student_data = await fetch_student_document(student_id)
         if not student_data:
             raise HTTPException(status_code=404, detail="لم يتم العثور على الطالب")
         
@@ -2992,7 +4946,7 @@ async def generate_share_card(
 ):
     """إنشاء كارد مشاركة النتيجة"""
     try:
-        student_data = await db.students.find_one({"student_id": student_id})
+        student_data = await fetch_student_document(student_id)
         if not student_data:
             raise HTTPException(status_code=404, detail="لم يتم العثور على الطالب")
         
@@ -3069,17 +5023,6 @@ async def validate_excel_data(
         if not file_data:
             raise HTTPException(status_code=404, detail="لم يتم العثور على الملف")
         
-        # جلب البيانات (مع دعم البيانات المقسمة)
-        if "raw_data" in file_data:
-            raw_data = file_data['raw_data']
-        else:
-            chunks = []
-            async for chunk in db.excel_data_chunks.find({"file_hash": file_hash}).sort("chunk_index", 1):
-                chunks.extend(chunk["chunk_data"])
-            raw_data = chunks
-            
-        df = pd.DataFrame(raw_data)
-        
         # جلب قالب المرحلة إذا تم تحديده
         stage_template = None
         if stage_template_id:
@@ -3087,8 +5030,23 @@ async def validate_excel_data(
             if template_data:
                 stage_template = StageTemplate(**template_data)
         
-        # تنفيذ الفحص الذكي
-        validation_result = smart_data_validation(df, stage_template, mapping.dict() if mapping else None)
+        # تنفيذ الفحص الذكي في مجمع العمليات: يقرأ نسخة بيانات الرفع المؤقتة من القرص مباشرة إلى DataFrame
+        async with upload_data_file(file_hash) as data_path:
+            if data_path is not None:
+                validation_result = await cpu_pool.run(
+                    VALIDATION_TIMEOUT_SECONDS, validate_upload_data, data_path, stage_template, mapping.dict() if mapping else None
+                )
+        if data_path is None:
+            # ملفات مرفوعة قبل التخزين العمودي (raw_data أو excel_data_chunks)
+            if "raw_data" in file_data:
+                raw_data = file_data['raw_data']
+            else:
+                raw_data = []
+                async for chunk in db.excel_data_chunks.find({"file_hash": file_hash}).sort("chunk_index", 1):
+                    raw_data.extend(chunk["chunk_data"])
+            validation_result = await cpu_pool.run(
+                VALIDATION_TIMEOUT_SECONDS, validate_excel_rows, raw_data, stage_template, mapping.dict() if mapping else None
+            )
         
         return validation_result
         
@@ -3612,19 +5570,25 @@ async def calculate_grade(request: GradeCalculatorRequest):
 
 # Search suggestions API
 @api_router.get("/search/suggestions")
-async def get_search_suggestions(q: str = ""):
+async def get_search_suggestions(q: str = Query("", max_length=100)):
     """اقتراحات البحث التلقائية"""
     try:
         if len(q) < 2:
             return {"suggestions": []}
         
+        suggestion_index.refresh_if_stale()
+        if suggestion_index.ready:
+            return {"suggestions": suggestion_index.suggest(q)}
+        
+        # الفهرس لم يُبنَ بعد: الرجوع إلى قاعدة البيانات
         suggestions = []
         
         # البحث في أسماء الطلاب
+        name_clause = name_search_clause(q)
         name_suggestions = await db.students.find(
-            {"name": {"$regex": q, "$options": "i"}},
+            name_clause,
             {"name": 1, "student_id": 1}
-        ).limit(5).to_list(length=5)
+        ).limit(5).to_list(length=5) if name_clause else []
         
         for student in name_suggestions:
             suggestions.append({
@@ -3635,9 +5599,10 @@ async def get_search_suggestions(q: str = ""):
             })
         
         # البحث في أرقام الجلوس
-        if q.isdigit():
+        seat_number = normalize_student_id(q)
+        if seat_number.isdigit():
             id_suggestions = await db.students.find(
-                {"student_id": {"$regex": f"^{q}"}},
+                {"student_id": student_id_prefix_range(seat_number)},
                 {"name": 1, "student_id": 1}
             ).limit(3).to_list(length=3)
             
@@ -3651,10 +5616,7 @@ async def get_search_suggestions(q: str = ""):
         
         # البحث في أسماء المدارس
         school_suggestions = await db.students.find(
-            {
-                "school_name": {"$regex": q, "$options": "i"},
-                "school_name": {"$ne": None, "$ne": ""}
-            },
+            {"school_name": {"$regex": re.escape(q), "$options": "i", "$nin": [None, ""]}},
             {"school_name": 1}
         ).limit(3).to_list(length=3)
         
@@ -3743,18 +5705,31 @@ async def unsubscribe_from_notifications(token: str):
 # Admin APIs for notification management
 @api_router.get("/admin/subscribers", response_model=List[Subscriber])
 async def get_all_subscribers(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(False),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """جلب جميع المشتركين - أدمن فقط"""
+    """جلب جميع المشتركين (المؤشر التالي في X-Next-Cursor والعدد في X-Total-Count) - أدمن فقط"""
     try:
-        total = await db.subscribers.count_documents({})
-        cursor = db.subscribers.find({}).sort("subscription_date", -1).skip(skip).limit(limit)
-        subscribers = await cursor.to_list(length=limit)
+        if cursor:
+            last_date, last_id = decode_page_cursor(cursor, 2)
+            page = db.subscribers.find(keyset_after_descending("subscription_date", last_date, last_id))
+        else:
+            page = db.subscribers.find({}).skip(skip)
+        subscribers = await page.sort([("subscription_date", -1), ("id", -1)]).limit(limit).to_list(length=limit)
+        
+        if len(subscribers) == limit:
+            response.headers["X-Next-Cursor"] = encode_page_cursor(subscribers[-1]["subscription_date"], subscribers[-1]["id"])
+        if include_total:
+            response.headers["X-Total-Count"] = str(await cached_count(db.subscribers, {}))
         
         return [Subscriber(**subscriber) for subscriber in subscribers]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting subscribers: {str(e)}")
         raise HTTPException(status_code=500, detail="خطأ في جلب المشتركين")
@@ -3851,23 +5826,36 @@ async def delete_subscriber(
 # Notification management APIs
 @api_router.get("/admin/notifications", response_model=List[Notification])
 async def get_all_notifications(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     status: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None),
+    include_total: bool = Query(False),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """جلب جميع الإشعارات - أدمن فقط"""
+    """جلب جميع الإشعارات (المؤشر التالي في X-Next-Cursor والعدد في X-Total-Count) - أدمن فقط"""
     try:
         query = {}
         if status:
             query["status"] = status
-            
-        total = await db.notifications.count_documents(query)
-        cursor = db.notifications.find(query).sort("created_at", -1).skip(skip).limit(limit)
-        notifications = await cursor.to_list(length=limit)
+        
+        if cursor:
+            last_date, last_id = decode_page_cursor(cursor, 2)
+            page = db.notifications.find({**query, **keyset_after_descending("created_at", last_date, last_id)})
+        else:
+            page = db.notifications.find(query).skip(skip)
+        notifications = await page.sort([("created_at", -1), ("id", -1)]).limit(limit).to_list(length=limit)
+        
+        if len(notifications) == limit:
+            response.headers["X-Next-Cursor"] = encode_page_cursor(notifications[-1]["created_at"], notifications[-1]["id"])
+        if include_total:
+            response.headers["X-Total-Count"] = str(await cached_count(db.notifications, query))
         
         return [Notification(**notification) for notification in notifications]
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting notifications: {str(e)}")
         raise HTTPException(status_code=500, detail="خطأ في جلب الإشعارات")
@@ -4091,9 +6079,15 @@ async def send_email_notification(subscriber: dict, notification: Notification):
 
 # Site Settings APIs
 @api_router.get("/site-settings", response_model=SiteSettings)
-async def get_site_settings():
+async def get_site_settings(request: Request, response: Response):
     """جلب إعدادات الموقع العامة"""
     try:
+        etag = await content_version_etag("site_settings")
+        if etag_matches(request, etag):
+            return not_modified_response(etag, CACHE_CONTROL_SITE)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL_SITE
+        
         settings = await db.site_settings.find_one({})
         if not settings:
             # إنشاء إعدادات افتراضية
@@ -4129,6 +6123,7 @@ async def update_site_settings(
             {"id": existing_settings["id"]},
             {"$set": update_data}
         )
+        await bump_content_version("site_settings")
         
         # جلب الإعدادات المحدثة
         updated_settings = await db.site_settings.find_one({"id": existing_settings["id"]})
@@ -4157,9 +6152,15 @@ async def get_homepage():
         raise HTTPException(status_code=500, detail="خطأ في جلب الصفحة الرئيسية")
 
 @api_router.get("/homepage/blocks")
-async def get_homepage_blocks():
+async def get_homepage_blocks(request: Request, response: Response):
     """جلب جميع بلوكات الصفحة الرئيسية مرتبة"""
     try:
+        etag = await content_version_etag("homepage")
+        if etag_matches(request, etag):
+            return not_modified_response(etag, CACHE_CONTROL_SITE)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL_SITE
+        
         # جلب تكوين الصفحة الرئيسية
         homepage = await db.homepage.find_one({})
         if not homepage:
@@ -4218,6 +6219,7 @@ async def update_blocks_order(
                 {"id": block_id},
                 {"$set": {"order_index": index}}
             )
+        await bump_content_version("homepage")
         
         return {"message": "تم تحديث ترتيب البلوكات بنجاح"}
         
@@ -4263,6 +6265,7 @@ async def create_block(
         )
         
         await db.page_blocks.insert_one(new_block.dict())
+        await bump_content_version("homepage")
         return new_block
         
     except Exception as e:
@@ -4287,6 +6290,7 @@ async def update_block(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="البلوك غير موجود")
+        await bump_content_version("homepage")
         
         updated_block = await db.page_blocks.find_one({"id": block_id})
         return PageBlock(**updated_block)
@@ -4314,6 +6318,7 @@ async def delete_block(
             {},
             {"$pull": {"blocks": block_id}}
         )
+        await bump_content_version("homepage")
         
         return {"message": "تم حذف البلوك بنجاح"}
         
@@ -4594,7 +6599,7 @@ async def generate_certificate_from_template(
     """إنشاء شهادة من قالب محدد"""
     try:
         # جلب بيانات الطالب
-        student_data = await db.students.find_one({"student_id": student_id})
+        student_data = await fetch_student_document(student_id)
         if not student_data:
             raise HTTPException(status_code=404, detail="الطالب غير موجود")
         
@@ -4681,6 +6686,12 @@ async def update_system_settings(
         
         # تحديث الحقول المرسلة فقط
         update_data = {k: v for k, v in settings_update.dict().items() if v is not None}
+        if update_data.get("rate_limit_enabled") and not client_address_resolver.configured:
+            raise HTTPException(
+                status_code=400,
+                detail="لا يمكن تفعيل تحديد معدل الطلبات قبل ضبط RATE_LIMIT_CLIENT_IP_HEADER و RATE_LIMIT_TRUSTED_PROXIES "
+                       "(أو RATE_LIMIT_TRUST_PEER_ADDRESS إن لم يكن الخادم خلف proxy)"
+            )
         update_data["updated_at"] = datetime.utcnow()
         
         await db.system_settings.update_one(
@@ -4690,8 +6701,11 @@ async def update_system_settings(
         
         # جلب الإعدادات المحدثة
         updated_settings = await db.system_settings.find_one({"id": existing_settings["id"]})
+        rate_limiter.configure(updated_settings)  # العمال الآخرون يلتقطونها في دورة المزامنة التالية
         return SystemSettings(**updated_settings)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating system settings: {str(e)}")
         raise HTTPException(status_code=500, detail="خطأ في تحديث إعدادات النظام")
@@ -4738,60 +6752,195 @@ async def get_site_content():
         logger.error(f"Error getting site content: {str(e)}")
         raise HTTPException(status_code=500, detail="خطأ في جلب محتوى الموقع")
 
+def build_search_filters(request: SearchRequest) -> Dict[str, Any]:
+    """فلاتر البحث (المرحلة، المحافظة، الفصل، الشعبة، الإدارة) من طلب البحث"""
+    filters = {}
+    
+    # إضافة فلاتر المرحلة التعليمية والمحافظة
+    if request.educational_stage_id:
+        filters["educational_stage_id"] = sanitize_string(request.educational_stage_id)
+    
+    if request.region_filter:
+        filters["region"] = sanitize_string(request.region_filter)
+    
+    if request.class_filter:
+        filters["class_name"] = sanitize_string(request.class_filter)
+    
+    if request.section_filter:
+        filters["section"] = sanitize_string(request.section_filter)
+    
+    # فلتر الإدارة التعليمية
+    if request.administration_filter:
+        filters["administration"] = sanitize_string(request.administration_filter)
+    
+    return filters
+
+def build_text_search_query(query_text: str, search_type: str, filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """استعلام البحث بالاسم أو (رقم الجلوس أو الاسم) مع الفلاتر، يُخدم من الفهارس"""
+    search_term = sanitize_string(query_text)
+    name_clause = name_search_clause(search_term)
+    if search_type == "name":
+        return {**filters, **name_clause} if name_clause else None
+    
+    seat_number = normalize_student_id(search_term)
+    clauses = []
+    if seat_number:
+        clauses.append({"student_id": student_id_prefix_range(seat_number)})
+    if name_clause:
+        clauses.append(name_clause)
+    return {**filters, "$or": clauses} if clauses else None
+
+# أبعاد عدادات الفلاتر: (اسم البعد في الاستجابة، الحقل، أقصى عدد للقيم)
+SEARCH_FACETS = [
+    ("stages", "educational_stage_id", 50),
+    ("regions", "region", 50),
+    ("administrations", "administration", 100),
+    ("schools", "school_name", 100),
+]
+FACETS_TIMEOUT_MS = 2000
+
+def search_facets_pipeline(match: Dict[str, Any], hits_limit: int = 50) -> List[Dict[str, Any]]:
+    """aggregation واحدة: قائمة النتائج والعدد الكلي وعدادات كل بعد"""
+    facets = {
+        "hits": [
+            {"$sort": {"student_id": 1}},
+            {"$limit": hits_limit},
+            {"$project": {"name_trigrams": 0, "name_prefixes": 0}}
+        ],
+        "total": [{"$count": "count"}]
+    }
+    for facet_name, field, bucket_limit in SEARCH_FACETS:
+        facets[facet_name] = [
+            {"$match": {field: {"$nin": [None, ""]}}},
+            {"$sortByCount": f"${field}"},
+            {"$limit": bucket_limit}
+        ]
+    return [{"$match": match}, {"$facet": facets}]
+
+async def run_search_facets(match: Dict[str, Any]) -> bytes:
+    result = (await db.students.aggregate(
+        search_facets_pipeline(match), maxTimeMS=FACETS_TIMEOUT_MS
+    ).to_list(length=1))[0]
+    body = {
+        "students": [student_read_model(student) for student in result["hits"]],
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "facets": {
+            facet_name: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in result[facet_name]]
+            for facet_name, _, _ in SEARCH_FACETS
+        }
+    }
+    return dumps_json(body)
+
+@api_router.post("/search/facets")
+async def search_facets(request: FacetSearchRequest, http_request: Request):
+    """نتائج البحث مع عدادات المرحلة والمحافظة والإدارة والمدرسة في طلب واحد - API عام"""
+    try:
+        filters = build_search_filters(request)
+        if request.query.strip():
+            search_type = "name" if request.search_type == "fuzzy" else request.search_type
+            if search_type == "student_id":
+                seat_number = normalize_student_id(sanitize_string(request.query))
+                match = {**filters, "student_id": student_id_prefix_range(seat_number)} if seat_number else None
+            else:
+                match = build_text_search_query(request.query, search_type, filters)
+            if match is None:
+                return {"students": [], "total": 0, "facets": {name: [] for name, _, _ in SEARCH_FACETS}}
+        elif filters:
+            match = filters
+        else:
+            # بدون كلمة بحث أو فلتر تصبح aggregation على كامل المجموعة
+            raise HTTPException(status_code=400, detail="أدخل كلمة بحث أو اختر فلتراً واحداً على الأقل")
+        
+        etag = make_etag(await content_version_etag("students"), dumps_json(match))
+        if etag_matches(http_request, etag):
+            return not_modified_response(etag, CACHE_CONTROL_RESULTS)
+        
+        cached = search_facets_cache.get(etag)
+        if cached is None:
+            body = await search_facets_flight.do(etag, lambda: run_search_facets(match))
+            cached = CachedResult(body, etag)
+            search_facets_cache.set(etag, cached)
+        return Response(
+            content=cached.body,
+            media_type="application/json",
+            headers={"ETag": etag, "Cache-Control": CACHE_CONTROL_RESULTS}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting search facets: {str(e)}")
+        raise HTTPException(status_code=500, detail="خطأ في جلب عدادات البحث")
+
 @api_router.post("/search", response_model=List[Student])
 async def search_students(request: SearchRequest):
-    """البحث عن الطلاب - API عام"""
+    """البحث عن الطلاب - API عام (مرتبة حسب رقم الجلوس، الصفحة التالية عبر X-Next-Cursor)"""
     try:
-        query = {}
+        filters = build_search_filters(request)
+        after = decode_page_cursor(request.cursor, 1)[0] if request.cursor else None
+        page_size = 50
         
+        headers = {}
         if request.search_type == "student_id":
-            query["student_id"] = {"$regex": sanitize_string(request.query), "$options": "i"}
-        elif request.search_type == "name":
-            query["name"] = {"$regex": sanitize_string(request.query), "$options": "i"}
+            seat_number = normalize_student_id(sanitize_string(request.query))
+            results = await find_students_by_seat_number(seat_number, filters, page_size, after)
+        elif request.search_type == "fuzzy":
+            results = await find_students_by_fuzzy_name(sanitize_string(request.query), filters, page_size)
+            headers["X-Search-Mode"] = "fuzzy"
         else:
-            search_term = sanitize_string(request.query)
-            query["$or"] = [
-                {"student_id": {"$regex": search_term, "$options": "i"}},
-                {"name": {"$regex": search_term, "$options": "i"}}
-            ]
-        
-        # إضافة فلاتر المرحلة التعليمية والمحافظة
-        if request.educational_stage_id:
-            query["educational_stage_id"] = sanitize_string(request.educational_stage_id)
-        
-        if request.region_filter:
-            query["region"] = sanitize_string(request.region_filter)
-        
-        if request.class_filter:
-            query["class_name"] = sanitize_string(request.class_filter)
-        
-        if request.section_filter:
-            query["section"] = sanitize_string(request.section_filter)
-        
-        # فلتر الإدارة التعليمية
-        if hasattr(request, 'administration_filter') and request.administration_filter:
-            query["administration"] = sanitize_string(request.administration_filter)
-        
-        cursor = db.students.find(query).limit(50)
-        results = await cursor.to_list(length=50)
-        
-        return [Student(**student) for student in results]
+            query = build_text_search_query(request.query, request.search_type, filters)
+            if query is None:
+                return []
+            if after is not None:
+                query["student_id"] = {"$gt": after}
+            cursor = db.students.find(query).sort("student_id", 1).limit(page_size)
+            results = await cursor.to_list(length=page_size)
+            if not results and after is None and request.search_type == "name":
+                # لا تطابق تام: أقرب الأسماء بدلاً من نتيجة فارغة تدفع لإعادة المحاولة
+                results = await find_students_by_fuzzy_name(sanitize_string(request.query), filters, page_size)
+                headers["X-Search-Mode"] = "fuzzy"
+        
+        # نتائج البحث التقريبي مرتبة حسب التشابه: صفحة واحدة بدون مؤشر
+        if len(results) == page_size and "X-Search-Mode" not in headers:
+            headers["X-Next-Cursor"] = encode_page_cursor(results[-1]["student_id"])
+        return Response(
+            content=dumps_json([student_read_model(student) for student in results]),
+            media_type="application/json",
+            headers=headers
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching students: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في البحث: {str(e)}")
 
 @api_router.get("/student/{student_id}", response_model=Student)
-async def get_student(student_id: str):
+async def get_student(student_id: str, request: Request):
     """الحصول على بيانات طالب محدد - API عام"""
     try:
-        sanitized_id = sanitize_string(student_id)
-        student_data = await db.students.find_one({"student_id": sanitized_id})
+        sanitized_id = normalize_student_id(sanitize_string(student_id))
+        cached = student_result_cache.get(sanitized_id)
+        if cached is None:
+            if seat_number_filter.definitely_absent(sanitized_id):
+                raise HTTPException(status_code=404, detail="لم يتم العثور على الطالب")
+            
+            student_data = await fetch_student_document(sanitized_id)
+            
+            if not student_data:
+                seat_number_filter.record_missing(sanitized_id)
+                raise HTTPException(status_code=404, detail="لم يتم العثور على الطالب")
+            
+            cached = cache_student_result(student_data)
         
-        if not student_data:
-            raise HTTPException(status_code=404, detail="لم يتم العثور على الطالب")
+        if etag_matches(request, cached.etag):
+            return not_modified_response(cached.etag, CACHE_CONTROL_RESULTS)
         
-        return Student(**student_data)
+        return Response(
+            content=cached.body,
+            media_type="application/json",
+            headers={"ETag": cached.etag, "Cache-Control": CACHE_CONTROL_RESULTS}
+        )
         
     except HTTPException:
         raise
@@ -4799,6 +6948,50 @@ async def get_student(student_id: str):
         logger.error(f"Error getting student: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في جلب بيانات الطالب: {str(e)}")
 
+@api_router.post("/students/batch")
+async def get_students_batch(request: StudentBatchRequest):
+    """جلب نتائج عدة طلاب في طلب واحد (استعلام $in واحد على الفهرس الفريد) - API عام"""
+    try:
+        seat_numbers = list(dict.fromkeys(
+            normalize_student_id(sanitize_string(student_id)) for student_id in request.student_ids
+        ))
+        seat_numbers = [seat_number for seat_number in seat_numbers if seat_number]
+        
+        payloads = {}
+        uncached = []
+        for seat_number in seat_numbers:
+            cached = student_result_cache.get(seat_number)
+            if cached is None:
+                if not seat_number_filter.definitely_absent(seat_number):
+                    uncached.append(seat_number)
+            else:
+                payloads[seat_number] = cached.body
+        
+        if uncached:
+            async for student_data in db.students.find({"student_id": {"$in": uncached}}):
+                payloads[student_data["student_id"]] = cache_student_result(student_data).body
+            for seat_number in uncached:
+                if seat_number not in payloads:
+                    seat_number_filter.record_missing(seat_number)
+        
+        missing = [seat_number for seat_number in seat_numbers if seat_number not in payloads]
+        
+        # تجميع الاستجابة من نتائج مسلسلة مسبقاً دون إعادة تحويلها
+        results = b",".join(
+            json.dumps(seat_number, ensure_ascii=False).encode("utf-8") + b":" + payloads[seat_number]
+            for seat_number in seat_numbers if seat_number in payloads
+        )
+        body = (
+            b'{"results":{' + results + b'},"missing":' +
+            json.dumps(missing, ensure_ascii=False).encode("utf-8") +
+            b',"found_count":' + str(len(payloads)).encode() + b'}'
+        )
+        return Response(content=body, media_type="application/json")
+        
+    except Exception as e:
+        logger.error(f"Error getting students batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="خطأ في جلب بيانات الطلاب")
+
 @api_router.get("/stats")
 async def get_statistics(stage_id: Optional[str] = Query(None), region: Optional[str] = Query(None)):
     """إحصائيات عامة للنظام - API عام مع إمكانية الفلترة"""
@@ -4876,6 +7069,671 @@ async def get_current_admin(current_user: AdminUser = Depends(get_current_user))
     """الحصول على بيانات الأدمن الحالي"""
     return current_user
 
+def upload_data_bucket() -> AsyncIOMotorGridFSBucket:
+    return AsyncIOMotorGridFSBucket(jobs_db, bucket_name=UPLOAD_DATA_BUCKET)
+
+async def save_upload_data(file_hash: str, data_path: str):
+    """رفع ملف Parquet الذي كتبه stage_excel_upload إلى GridFS (مع حذف بقايا رفع سابق لنفس الملف)"""
+    bucket = upload_data_bucket()
+    async for previous in bucket.find({"filename": file_hash}):
+        await bucket.delete(previous._id)
+    with open(data_path, "rb") as source:
+        await bucket.upload_from_stream(file_hash, source, metadata={"format": "parquet", "compression": UPLOAD_DATA_COMPRESSION})
+
+@asynccontextmanager
+async def upload_data_file(file_hash: str):
+    """مسار نسخة مؤقتة من بيانات الرفع (تُنزّل من GridFS جزءاً بجزء وتُحذف بعد الاستخدام)،
+    أو None للملفات المرفوعة قبل التخزين العمودي. الذاكرة لا تكبر مع حجم الملف: القراءة row group بعد آخر
+    """
+    try:
+        download = await upload_data_bucket().open_download_stream_by_name(file_hash)
+    except NoFile:
+        yield None
+        return
+    target = tempfile.NamedTemporaryFile(suffix='.parquet', delete=False)
+    try:
+        while chunk := await download.readchunk():
+            await asyncio.to_thread(target.write, chunk)
+        target.close()
+        yield target.name
+    finally:
+        target.close()
+        try:
+            os.unlink(target.name)
+        except FileNotFoundError:
+            pass
+
+async def iter_uploaded_frames(file_hash: str, columns: Optional[List[str]] = None, start_chunk: int = 0):
+    """دفعات الملف المرفوع كـ DataFrame: row groups من بيانات الرفع (الأعمدة المطلوبة فقط)،
+    أو raw_data / excel_data_chunks للملفات المرفوعة قبل التخزين العمودي
+
+    start_chunk: تخطي الدفعات المعالجة سابقاً عند استئناف مهمة استيراد
+    """
+    async with upload_data_file(file_hash) as data_path:
+        if data_path is not None:
+            if columns is not None:
+                columns = [*columns, SOURCE_ROW_COLUMN]
+            for row_group in range(start_chunk, await asyncio.to_thread(upload_data_row_groups, data_path)):
+                yield await asyncio.to_thread(read_upload_data, data_path, columns, row_group)
+            return
+    
+    file_data = await db.excel_files.find_one({"file_hash": file_hash}, {"raw_data": 1})
+    if file_data and "raw_data" in file_data:
+        if start_chunk == 0:
+            yield pd.DataFrame(file_data["raw_data"])
+        return
+    # batch_size صغير: لا نحمّل أكثر من بضع دفعات في الذاكرة
+    cursor = db.excel_data_chunks.find(
+        {"file_hash": file_hash, "chunk_index": {"$gte": start_chunk}}, {"chunk_data": 1}
+    ).sort("chunk_index", 1).batch_size(4)
+    async for chunk in cursor:
+        yield pd.DataFrame(chunk["chunk_data"])
+
+def cell_text(value: Any) -> str:
+    """نص الخلية منظفاً (cell_string ثم sanitize_string)، والخلية الفارغة نص فارغ فتُعد بيانات ناقصة"""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ""
+    return sanitize_string(cell_string(value))
+
+def clean_text_column(series: pd.Series) -> pd.Series:
+    """cell_text لعمود كامل"""
+    text = series.astype(object).where(series.notna(), "").map(cell_string)
+    return text.str.replace(SANITIZE_RE, '', regex=True).str.strip()
+
+def normalize_student_id_column(series: pd.Series) -> pd.Series:
+    """normalize_student_id(sanitize_string(str(value))) لعمود كامل"""
+    return clean_text_column(series).str.translate(ARABIC_DIGITS_TRANSLATION).str.replace(r'\s+', '', regex=True)
+
+def source_row_numbers(df: pd.DataFrame, row_offset: int) -> List[int]:
+    """رقم كل صف في الملف المصدر، أو ترتيبه بين الصفوف للملفات المرفوعة قبل حفظ أرقام الصفوف"""
+    if SOURCE_ROW_COLUMN in df.columns:
+        return [int(row_number) for row_number in df[SOURCE_ROW_COLUMN]]
+    return list(range(row_offset + 1, row_offset + len(df) + 1))
+
+def round_like_python(values: np.ndarray, ndigits: int = 2) -> np.ndarray:
+    """np.round مع إعادة حساب القيم القريبة من منتصف الخانة بـ round() حتى تطابق نتائج النماذج تماماً"""
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    with np.errstate(invalid='ignore'):
+        near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for position in np.flatnonzero(near_half):
+        rounded.flat[position] = round(float(values.flat[position]), ndigits)
+    return rounded
+
+# حدود التقدير كما في Student.calculate_grade
+GRADE_LEVELS = [(90, "ممتاز"), (80, "جيد جداً"), (70, "جيد"), (60, "مقبول")]
+FAILING_GRADE = "ضعيف"
+
+# الحقول النصية الاختيارية: (حقل الطالب، عمود الربط، أقصى طول في النموذج)
+OPTIONAL_TEXT_FIELDS = [
+    ("class_name", "class_column", 100),
+    ("section", "section_column", 50),
+    ("school_name", "school_column", 200),
+    ("administration", "administration_column", 200),
+    ("school_code", "school_code_column", 50),
+]
+
+def build_student_documents(
+    df: pd.DataFrame,
+    mapping: ColumnMapping,
+    educational_stage_id: Optional[str],
+    region: Optional[str],
+    row_offset: int = 0
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """نسخة متجهة من build_students_from_rows: نفس المستندات (Student.dict()) ونفس الأخطاء.
+    الدرجات تُحوّل كمصفوفة واحدة، والمجموع والمتوسط والتقدير تُحسب بـ NumPy عبر الأعمدة؛
+    الصفوف النادرة التي يرفضها النموذج (نص طويل، مجموع غير صالح) تمر بالمسار القديم لنفس رسالة الخطأ"""
+    df = df.reset_index(drop=True)
+    row_count = len(df)
+    if row_count == 0:
+        return [], []
+    
+    student_ids = normalize_student_id_column(df[mapping.student_id_column])
+    names = clean_text_column(df[mapping.name_column])
+    missing = ((student_ids.str.len() == 0) | (names.str.len() == 0)).to_numpy()
+    needs_model = ((student_ids.str.len() > 50) | (names.str.len() > 200)).to_numpy(copy=True)
+    
+    # مصفوفة الدرجات: القيم غير الرقمية NaN، ولا تُحتسب إلا الدرجات بين 0 و100 كما في StudentSubject
+    subject_names = []
+    score_columns = []
+    for subject_col in mapping.subject_columns:
+        subject_name = sanitize_string(subject_col)
+        if subject_col not in df.columns or not 1 <= len(subject_name) <= 100:
+            logger.warning(f"Skipping subject column {subject_col}: missing or invalid name")
+            continue
+        subject_names.append(subject_name)
+        score_columns.append(subject_col)
+    if score_columns:
+        scores = df[score_columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    else:
+        scores = np.empty((row_count, 0))
+    with np.errstate(invalid='ignore'):
+        valid_scores = (scores >= 0) & (scores <= 100)
+    subject_counts = valid_scores.sum(axis=1)
+    has_subjects = subject_counts > 0
+    
+    # الجمع عموداً بعد عمود بنفس ترتيب sum() في النموذج حتى تتطابق الأرقام العشرية
+    totals = np.zeros(row_count)
+    for column in range(scores.shape[1]):
+        totals = totals + np.where(valid_scores[:, column], scores[:, column], 0.0)
+    averages = round_like_python(totals / np.maximum(subject_counts, 1))
+    percentages = round_like_python(scores / 100 * 100)
+    grades = np.select(
+        [averages >= threshold for threshold, _ in GRADE_LEVELS],
+        [grade for _, grade in GRADE_LEVELS],
+        default=FAILING_GRADE
+    )
+    
+    given_totals = None
+    if mapping.total_column and mapping.total_column in df.columns:
+        given_totals = pd.to_numeric(df[mapping.total_column], errors='coerce').to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            needs_model |= ~(given_totals >= 0)  # NaN أو سالب: النموذج يرفض الصف
+    
+    text_fields = {}
+    for field_name, mapping_attr, max_length in OPTIONAL_TEXT_FIELDS:
+        column = getattr(mapping, mapping_attr, None)
+        if column and column in df.columns:
+            values = clean_text_column(df[column])
+            needs_model |= (values.str.len() > max_length).to_numpy()
+            text_fields[field_name] = values.tolist()
+    
+    if (educational_stage_id is not None and not educational_stage_id) or (region is not None and len(region) > 100):
+        needs_model[:] = True
+    
+    row_numbers = source_row_numbers(df, row_offset)
+    rows_with_errors = [(index, f"الصف {row_numbers[index]}: بيانات ناقصة") for index in np.flatnonzero(missing)]
+    documents_by_row = []
+    
+    model_rows = np.flatnonzero(needs_model & ~missing)
+    if len(model_rows):
+        for index in model_rows:
+            students, errors = build_students_from_rows(df.iloc[[index]], mapping, educational_stage_id, region, row_offset)
+            documents_by_row.extend((index, student.dict()) for student in students)
+            rows_with_errors.extend((index, error) for error in errors)
+    
+    # بناء المستندات فقط عند حدود الكتابة
+    now = datetime.utcnow()
+    student_id_list = student_ids.tolist()
+    name_list = names.tolist()
+    score_rows = scores.tolist()
+    valid_rows = valid_scores.tolist()
+    percentage_rows = percentages.tolist()
+    total_list = totals.tolist()
+    average_list = averages.tolist()
+    grade_list = grades.tolist()
+    given_total_list = given_totals.tolist() if given_totals is not None else None
+    for index in np.flatnonzero(~(missing | needs_model)).tolist():
+        if has_subjects[index]:
+            subjects = [
+                {"name": subject_names[column], "score": score_rows[index][column], "max_score": 100, "percentage": percentage_rows[index][column]}
+                for column, valid in enumerate(valid_rows[index]) if valid
+            ]
+            total_score, average, grade = total_list[index], average_list[index], grade_list[index]
+        else:
+            subjects = []
+            total_score = given_total_list[index] if given_total_list is not None else None
+            average = grade = None
+        documents_by_row.append((index, {
+            "id": str(uuid.uuid4()),
+            "student_id": student_id_list[index],
+            "name": name_list[index],
+            "subjects": subjects,
+            "total_score": total_score,
+            "average": average,
+            "grade": grade,
+            **{field_name: text_fields[field_name][index] if field_name in text_fields else None
+               for field_name in ("class_name", "section")},
+            "educational_stage_id": educational_stage_id,
+            "region": region,
+            **{field_name: text_fields[field_name][index] if field_name in text_fields else None
+               for field_name in ("school_name", "administration", "school_code")},
+            "ranks": {},
+            "additional_info": {},
+            "created_at": now,
+            "updated_at": now
+        }))
+    
+    # نفس ترتيب الصفوف في الملف (آخر تكرار لرقم الجلوس هو الذي يُحفظ)
+    documents_by_row.sort(key=lambda item: item[0])
+    rows_with_errors.sort(key=lambda item: item[0])
+    return [document for _, document in documents_by_row], [error for _, error in rows_with_errors]
+
+# حقول الطالب المأخوذة من صف الملف: تغيّر أي منها يعني أن الطالب تغيّر
+STUDENT_CONTENT_FIELDS = (
+    "student_id", "name", "subjects", "total_score", "average", "grade", "class_name", "section",
+    "educational_stage_id", "region", "school_name", "administration", "school_code", "additional_info"
+)
+
+def student_content_hash(document: Dict[str, Any]) -> str:
+    content = json.dumps(
+        [document.get(field) for field in STUDENT_CONTENT_FIELDS], ensure_ascii=False, separators=(',', ':'), default=str
+    )
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+def build_import_documents(
+    df: pd.DataFrame,
+    mapping: ColumnMapping,
+    educational_stage_id: Optional[str],
+    region: Optional[str],
+    row_offset: int = 0
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """build_student_documents مع content_hash لكل مستند لمقارنة إعادة الاستيراد بالمخزن"""
+    documents, errors = build_student_documents(df, mapping, educational_stage_id, region, row_offset)
+    for document in documents:
+        document["content_hash"] = student_content_hash(document)
+    return documents, errors
+
+def build_students_from_rows(
+    df: pd.DataFrame,
+    mapping: ColumnMapping,
+    educational_stage_id: Optional[str],
+    region: Optional[str],
+    row_offset: int = 0
+) -> Tuple[List[Student], List[str]]:
+    """تحويل دفعة صفوف إلى طلاب (row_offset: عدد الصفوف قبل الدفعة لترقيم الأخطاء إن لم تحمل أرقام صفوف الملف)"""
+    processed_students = []
+    errors = []
+    
+    for index, row in df.iterrows():
+        row_number = int(row[SOURCE_ROW_COLUMN]) if SOURCE_ROW_COLUMN in df.columns else row_offset + index + 1
+        try:
+            student_id = normalize_student_id(cell_text(row[mapping.student_id_column]))
+            name = cell_text(row[mapping.name_column])
+            
+            if not student_id or not name:
+                errors.append(f"الصف {row_number}: بيانات ناقصة")
+                continue
+            
+            subjects = []
+            for subject_col in mapping.subject_columns:
+                try:
+                    score = pd.to_numeric(row[subject_col], errors='coerce')
+                    if not pd.isna(score):
+                        subjects.append(StudentSubject(
+                            name=sanitize_string(subject_col),
+                            score=float(score)
+                        ))
+                except Exception as e:
+                    logger.warning(f"Error processing subject {subject_col} for student {student_id}: {str(e)}")
+            
+            additional_info = {}
+            class_name = None
+            section = None
+            total_score = None
+            school_name = None
+            administration = None
+            school_code = None
+            
+            if mapping.class_column and mapping.class_column in df.columns:
+                class_name = cell_text(row[mapping.class_column])
+            
+            if mapping.section_column and mapping.section_column in df.columns:
+                section = cell_text(row[mapping.section_column])
+            
+            if mapping.total_column and mapping.total_column in df.columns:
+                try:
+                    total_score = float(pd.to_numeric(row[mapping.total_column], errors='coerce'))
+                except:
+                    pass
+            
+            # معالجة معلومات المدرسة والإدارة
+            if hasattr(mapping, 'school_column') and mapping.school_column and mapping.school_column in df.columns:
+                school_name = cell_text(row[mapping.school_column])
+            
+            if hasattr(mapping, 'administration_column') and mapping.administration_column and mapping.administration_column in df.columns:
+                administration = cell_text(row[mapping.administration_column])
+                
+            if hasattr(mapping, 'school_code_column') and mapping.school_code_column and mapping.school_code_column in df.columns:
+                school_code = cell_text(row[mapping.school_code_column])
+            
+            student = Student(
+                student_id=student_id,
+                name=name,
+                subjects=subjects,
+                total_score=total_score,
+                class_name=class_name,
+                section=section,
+                educational_stage_id=educational_stage_id,  # ربط بالمرحلة التعليمية
+                region=region,  # ربط بالمحافظة
+                school_name=school_name,  # اسم المدرسة
+                administration=administration,  # الإدارة التعليمية
+                school_code=school_code,  # كود المدرسة
+                additional_info=additional_info
+            )
+            
+            processed_students.append(student)
+            
+        except Exception as e:
+            errors.append(f"الصف {row_number}: {str(e)}")
+            continue
+    
+    return processed_students, errors
+
+# كتابة الطلاب المعالجين: ReplaceOne على دفعات غير مرتبة بدل رحلة ذهاب وعودة لكل طالب
+STUDENT_WRITE_BATCH_SIZE = int(os.environ.get('STUDENT_WRITE_BATCH_SIZE', 500))
+STUDENT_WRITE_CONCURRENCY = int(os.environ.get('STUDENT_WRITE_CONCURRENCY', 2))  # أقل من حجم مجمع jobs_client
+
+async def bulk_upsert_students(
+    collection,
+    documents: List[Dict[str, Any]],
+    batch_size: int = STUDENT_WRITE_BATCH_SIZE,
+    concurrency: int = STUDENT_WRITE_CONCURRENCY
+) -> Tuple[int, List[str]]:
+    """استبدال/إدراج الطلاب بـ bulk_write(ordered=False) مع عدد محدود من الدفعات المتزامنة
+
+    يعيد (عدد الطلاب المكتوبين، أخطاء الكتابة بصيغة تقرير الأخطاء).
+    يُكتب آخر ظهور لكل رقم جلوس كما في الكتابة المتسلسلة، فلا يظهر الرقم نفسه في دفعتين متزامنتين.
+    """
+    unique_documents = list({document["student_id"]: document for document in documents}.values())
+    batches = [unique_documents[i:i + batch_size] for i in range(0, len(unique_documents), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def write_batch(batch: List[Dict[str, Any]]) -> List[str]:
+        async with semaphore:
+            try:
+                await collection.bulk_write(
+                    [ReplaceOne({"student_id": document["student_id"]}, document, upsert=True) for document in batch],
+                    ordered=False
+                )
+            except BulkWriteError as e:
+                if e.details.get("writeConcernErrors"):
+                    logger.warning(f"Student bulk write concern errors: {e.details['writeConcernErrors']}")
+                return [
+                    f"رقم الجلوس {batch[error['index']]['student_id']}: {error.get('errmsg', 'تعذر الحفظ')}"
+                    for error in e.details.get("writeErrors", [])
+                ]
+            return []
+    
+    results = await asyncio.gather(*(write_batch(batch) for batch in batches))
+    write_errors = [error for batch_errors in results for error in batch_errors]
+    return len(unique_documents) - len(write_errors), write_errors
+
+async def diff_student_batch(collection, documents: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """(المستندات التي تحتاج كتابة، عدد الجديد والمتغير وغير المتغير) بمقارنة content_hash مع المخزن
+
+    آخر ظهور لكل رقم جلوس هو المعتمد كما في bulk_upsert_students
+    """
+    unique_documents = {document["student_id"]: document for document in documents}
+    stored_hashes = {}
+    async for stored in collection.find(
+        {"student_id": {"$in": list(unique_documents)}}, {"_id": 0, "student_id": 1, "content_hash": 1}
+    ):
+        stored_hashes[stored["student_id"]] = stored.get("content_hash")
+    
+    counts = {"added": 0, "changed": 0, "unchanged": 0}
+    pending = []
+    for student_id, document in unique_documents.items():
+        if student_id not in stored_hashes:
+            counts["added"] += 1
+        elif stored_hashes[student_id] != document["content_hash"]:
+            counts["changed"] += 1
+        else:
+            counts["unchanged"] += 1
+            continue
+        pending.append(document)
+    return pending, counts
+
+async def remove_missing_students(
+    file_hash: str,
+    mapping: ColumnMapping,
+    educational_stage_id: str,
+    region: Optional[str]
+) -> int:
+    """حذف طلاب المرحلة (والمحافظة إن حُددت) الذين لا يظهر رقم جلوسهم في الملف
+
+    يُقرأ عمود رقم الجلوس وحده من بيانات الرفع، فالعملية آمنة للتكرار عند استئناف المهمة
+    """
+    file_student_ids = set()
+    async for frame in iter_uploaded_frames(file_hash, [mapping.student_id_column]):
+        file_student_ids.update(normalize_student_id_column(frame[mapping.student_id_column]).tolist())
+    file_student_ids.discard("")
+    if not file_student_ids:
+        return 0  # لا نفرغ المرحلة بسبب ملف بلا أرقام جلوس
+    
+    scope = {"educational_stage_id": educational_stage_id}
+    if region:
+        scope["region"] = region
+    missing = [
+        stored["student_id"]
+        async for stored in jobs_db.students.find(scope, {"_id": 0, "student_id": 1})
+        if stored["student_id"] not in file_student_ids
+    ]
+    removed = 0
+    for start in range(0, len(missing), STUDENT_WRITE_BATCH_SIZE):
+        batch = missing[start:start + STUDENT_WRITE_BATCH_SIZE]
+        result = await jobs_db.students.delete_many({**scope, "student_id": {"$in": batch}})
+        removed += result.deleted_count
+        student_result_cache.invalidate_many(batch)
+    return removed
+
+async def save_student_batch(students_data: List[Dict[str, Any]], processed_by: str) -> Tuple[int, List[str]]:
+    """حفظ دفعة طلاب معالجة وتحديث كاش النتائج وفلتر أرقام الجلوس"""
+    processed_at = datetime.utcnow()
+    for student_data in students_data:
+        student_data['processed_by'] = processed_by
+        student_data['processed_at'] = processed_at
+        student_data.update(build_name_search_fields(student_data['name']))
+    
+    written_count, write_errors = await bulk_upsert_students(jobs_db.students, students_data)
+    student_result_cache.invalidate_many(student_data["student_id"] for student_data in students_data)
+    seat_number_filter.add(student_data["student_id"] for student_data in students_data)
+    return written_count, write_errors
+
+# ========== مهام الاستيراد في الخلفية ==========
+
+INGESTION_TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+class IngestionWorker:
+    """عامل خلفي يستلم مهام ingestion_jobs بالترتيب وينفذها دفعة بدفعة
+
+    العامل المنفذ يحدّث heartbeat_at دورياً. المهمة التي توقف نبضها (إعادة تشغيل الخادم أو توقف العامل)
+    يستلمها أي عامل ويستأنفها من chunks_done؛ الكتابة upsert برقم الجلوس فإعادة آخر دفعة آمنة.
+    """
+
+    def __init__(
+        self,
+        poll_seconds: float,
+        heartbeat_seconds: float,
+        stale_seconds: float,
+        max_attempts: int,
+        pool: Optional[CpuTaskPool] = None,
+        chunk_attempts: int = 3
+    ):
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stale_seconds = stale_seconds
+        self.max_attempts = max_attempts
+        self.pool = pool if pool is not None else ingestion_cpu_pool
+        self.chunk_attempts = chunk_attempts  # إعادة الدفعة إن انهار مجمع العمليات أثناءها
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.current_job_id: Optional[str] = None
+        self.finished = {status: 0 for status in INGESTION_TERMINAL_STATUSES}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = start_background_task(self._loop())
+
+    def wake(self):
+        """مهمة جديدة في الطابور: لا ننتظر دورة الاستطلاع التالية"""
+        self._wake.set()
+
+    async def _loop(self):
+        while True:
+            try:
+                job = await self.claim()
+                if job is not None:
+                    await self.run(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Error in ingestion worker: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def claim(self) -> Optional[Dict[str, Any]]:
+        """استلام أقدم مهمة في الطابور، أو مهمة توقف نبضها لاستئنافها"""
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.stale_seconds)
+        await jobs_db.ingestion_jobs.update_many(
+            {"status": "running", "heartbeat_at": {"$lt": stale_before}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "finished_at": now, "message": "توقفت المهمة أكثر من مرة أثناء التنفيذ"}}
+        )
+        claim = {"$set": {"status": "running", "worker_id": self.worker_id, "heartbeat_at": now}, "$inc": {"attempts": 1}}
+        for query in ({"status": "queued"}, {"status": "running", "heartbeat_at": {"$lt": stale_before}}):
+            job = await jobs_db.ingestion_jobs.find_one_and_update(
+                query, claim, sort=[("created_at", 1)], return_document=ReturnDocument.AFTER
+            )
+            if job is not None:
+                return job
+        return None
+
+    async def run(self, job: Dict[str, Any]):
+        job_id = job["id"]
+        owner = {"id": job_id, "worker_id": self.worker_id}
+        self.current_job_id = job_id
+        heartbeat = start_background_task(self._heartbeat(owner))
+        result = {}
+        try:
+            status, result = await self._process(job, owner)
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed: {str(e)}")
+            status, result = "failed", {"message": f"خطأ في معالجة البيانات: {str(e)}"}
+        finally:
+            heartbeat.cancel()
+            self.current_job_id = None
+        
+        if status is None:
+            logger.warning(f"Ingestion job {job_id} was taken over by another worker")
+            return
+        await jobs_db.ingestion_jobs.update_one(owner, {"$set": {"status": status, "finished_at": datetime.utcnow(), **result}})
+        self.finished[status] += 1
+        logger.info(f"Ingestion job {job_id} {status}")
+
+    async def _process(self, job: Dict[str, Any], owner: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+        """تنفيذ المهمة من نقطة الاستئناف؛ الحالة None تعني أن عاملاً آخر استلمها"""
+        if job.get("started_at") is None:
+            await jobs_db.ingestion_jobs.update_one(owner, {"$set": {"started_at": datetime.utcnow()}})
+        mapping = ColumnMapping(**job["mapping"])
+        rows_done, rows_failed = job["rows_done"], job["rows_failed"]
+        processed_count, chunks_done = job["processed_count"], job["chunks_done"]
+        counts = {key: job.get(f"{key}_count", 0) for key in ("added", "changed", "unchanged")}
+        cancelled = job.get("cancel_requested", False)
+        run_started = time.monotonic()
+        run_rows = 0
+        
+        if not cancelled:
+            async for rows in iter_uploaded_frames(job["file_hash"], mapping_columns(mapping), start_chunk=chunks_done):
+                students_data, row_errors = await self.build_chunk(
+                    rows, mapping, job["educational_stage_id"], job["region"], rows_done
+                )
+                # لا يُكتب إلا الطلاب الجدد والمتغيرون
+                pending, batch_counts = await diff_student_batch(jobs_db.students, students_data)
+                written_count, write_errors = await save_student_batch(pending, job["created_by"]) if pending else (0, [])
+                if written_count:
+                    await bump_content_version("students")  # الدفعة مرئية لكاش وفلاتر العمال الآخرين من الآن
+                new_errors = row_errors + write_errors
+                
+                rows_done += len(rows)
+                rows_failed += len(new_errors)
+                processed_count += written_count + batch_counts["unchanged"]
+                for key, value in batch_counts.items():
+                    counts[key] += value
+                chunks_done += 1
+                run_rows += len(rows)
+                elapsed = time.monotonic() - run_started
+                update = {"$set": {
+                    "rows_done": rows_done,
+                    "rows_failed": rows_failed,
+                    "processed_count": processed_count,
+                    "chunks_done": chunks_done,
+                    **{f"{key}_count": value for key, value in counts.items()},
+                    "rows_per_second": round(run_rows / elapsed, 1) if elapsed else None,
+                    "heartbeat_at": datetime.utcnow()
+                }}
+                if new_errors:
+                    update["$push"] = {"errors": {"$each": new_errors[:10], "$slice": 10}}
+                current = await jobs_db.ingestion_jobs.find_one_and_update(
+                    owner, update, projection={"cancel_requested": 1}, return_document=ReturnDocument.AFTER
+                )
+                if current is None:
+                    return None, {}
+                if current.get("cancel_requested"):
+                    cancelled = True
+                    break
+        
+        removed_count = 0
+        if not cancelled and job.get("delete_missing") and job["educational_stage_id"]:
+            removed_count = await remove_missing_students(job["file_hash"], mapping, job["educational_stage_id"], job["region"])
+        
+        # البيانات المكتوبة قبل الإلغاء تبقى، فنحدّث النسخة والترتيب في الحالتين
+        ranks_updated = 0
+        if counts["added"] or counts["changed"] or removed_count:
+            await bump_content_version("students")
+            suggestion_index.schedule_rebuild()
+            ranks_updated = await update_student_ranks()
+        if cancelled:
+            return "cancelled", {"ranks_updated": ranks_updated, "message": "تم إلغاء المهمة"}
+        return "completed", {"ranks_updated": ranks_updated, "removed_count": removed_count, "message": "تم معالجة البيانات بنجاح"}
+
+    async def build_chunk(
+        self,
+        rows: pd.DataFrame,
+        mapping: ColumnMapping,
+        educational_stage_id: Optional[str],
+        region: Optional[str],
+        row_offset: int
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """build_import_documents في مجمع العمليات؛ BrokenProcessPool (عملية قُتلت) يعيد الدفعة بدل إفشال المهمة"""
+        for attempt in range(1, self.chunk_attempts + 1):
+            try:
+                return await self.pool.run(
+                    None, build_import_documents, rows, mapping, educational_stage_id, region, row_offset, wait_for_slot=True
+                )
+            except BrokenProcessPool:
+                if attempt == self.chunk_attempts:
+                    raise
+                logger.warning(f"Process pool broke while building rows from {row_offset + 1}; retrying chunk")
+
+    async def _heartbeat(self, owner: Dict[str, Any]):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await jobs_db.ingestion_jobs.update_one(owner, {"$set": {"heartbeat_at": datetime.utcnow()}})
+            except Exception as e:
+                logger.error(f"Error updating ingestion job heartbeat: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "running": self._task is not None and not self._task.done(),
+            "current_job_id": self.current_job_id,
+            "finished": dict(self.finished)
+        }
+
+ingestion_worker = IngestionWorker(
+    poll_seconds=float(os.environ.get('INGESTION_POLL_SECONDS', 5)),
+    heartbeat_seconds=float(os.environ.get('INGESTION_HEARTBEAT_SECONDS', 10)),
+    stale_seconds=float(os.environ.get('INGESTION_STALE_SECONDS', 60)),
+    max_attempts=int(os.environ.get('INGESTION_MAX_ATTEMPTS', 3))
+)
+
+def ingestion_job_progress(job: Dict[str, Any]) -> Dict[str, Any]:
+    """حالة المهمة للأدمن مع نسبة الإنجاز والوقت المتبقي المتوقع"""
+    progress = {key: value for key, value in job.items() if key not in ("_id", "worker_id")}
+    total_rows = job.get("total_rows") or 0
+    rows_done = job.get("rows_done", 0)
+    rate = job.get("rows_per_second")
+    progress["percent"] = round(min(rows_done * 100 / total_rows, 100), 1) if total_rows else None
+    progress["eta_seconds"] = (
+        round(max(total_rows - rows_done, 0) / rate) if rate and job.get("status") == "running" else None
+    )
+    return jsonable_encoder(progress)
+
 # Admin Management Endpoints
 @api_router.post("/admin/upload-excel", response_model=ExcelAnalysis)
 async def admin_upload_excel(
@@ -4884,95 +7742,75 @@ async def admin_upload_excel(
 ):
     """رفع وتحليل ملف الإكسيل - أدمن فقط"""
     try:
-        if not file.filename.endswith(('.xlsx', '.xls')):
-            raise HTTPException(status_code=400, detail="نوع الملف غير مدعوم. يرجى رفع ملف Excel فقط")
-        
-        content = await file.read()
-        file_hash = calculate_file_hash(content)
-        
-        # التحقق من حجم الملف
-        file_size_mb = len(content) / (1024 * 1024)  # حساب الحجم بالميجابايت
+        upload_format = upload_file_format(file.filename or "")
+        if upload_format is None:
+            raise HTTPException(status_code=400, detail="نوع الملف غير مدعوم. يرجى رفع ملف Excel أو CSV أو TSV أو Parquet")
+        file_format, file_suffix = upload_format
         
         # جلب الحد الأقصى من إعدادات النظام
         system_settings = await db.system_settings.find_one({})
         max_file_size = system_settings.get('max_file_size', 50) if system_settings else 50  # افتراضي 50 MB
         
-        if file_size_mb > max_file_size:
-            raise HTTPException(status_code=413, detail=f"حجم الملف ({file_size_mb:.1f} MB) يتجاوز الحد الأقصى المسموح ({max_file_size} MB)")
-        
-        existing_file = await db.excel_files.find_one({"file_hash": file_hash})
-        if existing_file:
-            return ExcelAnalysis(**existing_file)
-        
+        # حساب الـ hash والحجم على أجزاء مع نسخ الملف إلى ملف مؤقت تقرؤه عملية المعالجة
+        source = tempfile.NamedTemporaryFile(suffix=file_suffix, delete=False)
+        data_path = source.name + '.parquet'
         try:
-            df = pd.read_excel(BytesIO(content))
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"خطأ في قراءة ملف الإكسيل: {str(e)}")
-        
-        if df.empty:
-            raise HTTPException(status_code=400, detail="الملف فارغ أو لا يحتوي على بيانات صالحة")
-        
-        df.columns = [sanitize_string(str(col)) for col in df.columns]
-        
-        columns = df.columns.tolist()
-        suggested_mappings = {}
-        
-        for col in columns:
-            suggested_type = detect_column_type(df[col], col)
-            if suggested_type not in suggested_mappings.values() or suggested_type == 'subject':
-                suggested_mappings[col] = suggested_type
-        
-        sample_data = []
-        for _, row in df.head(5).iterrows():
-            sample_row = {}
-            for col in columns:
-                value = row[col]
-                if pd.isna(value):
-                    sample_row[col] = ""
-                else:
-                    sample_row[col] = sanitize_string(str(value))
-            sample_data.append(sample_row)
+            hasher = hashlib.sha256()
+            file_size = 0
+            while chunk := await file.read(UPLOAD_READ_BYTES):
+                hasher.update(chunk)
+                file_size += len(chunk)
+                if file_size > max_file_size * 1024 * 1024:
+                    raise HTTPException(status_code=413, detail=f"حجم الملف يتجاوز الحد الأقصى المسموح ({max_file_size} MB)")
+                await asyncio.to_thread(source.write, chunk)
+            source.close()
+            file_hash = hasher.hexdigest()
+            file_size_mb = file_size / (1024 * 1024)  # حساب الحجم بالميجابايت
+            
+            existing_file = await db.excel_files.find_one({"file_hash": file_hash})
+            if existing_file:
+                return ExcelAnalysis(**existing_file)
+            
+            # قراءة الملف وتحليل العينة في مجمع العمليات حتى لا تتوقف الطلبات العامة أثناء الرفع
+            try:
+                staged = await cpu_pool.run(UPLOAD_PARSE_TIMEOUT_SECONDS, stage_excel_upload, source.name, file_format, data_path)
+            except CpuPoolBusy:
+                raise
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"خطأ في قراءة الملف: {str(e)}")
+            
+            if staged["total_rows"] == 0:
+                raise HTTPException(status_code=400, detail="الملف فارغ أو لا يحتوي على بيانات صالحة")
+            
+            # حفظ البيانات الخام Parquet مضغوطاً في GridFS
+            stored_bytes = os.path.getsize(data_path)
+            await save_upload_data(file_hash, data_path)
+        finally:
+            source.close()
+            for path in (source.name, data_path):
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
         
         analysis = ExcelAnalysis(
             filename=sanitize_string(file.filename),
-            columns=columns,
-            sample_data=sample_data,
-            suggested_mappings=suggested_mappings,
-            total_rows=len(df),
+            columns=staged["columns"],
+            sample_data=staged["sample_data"],
+            suggested_mappings=staged["suggested_mappings"],
+            total_rows=staged["total_rows"],
             file_hash=file_hash
         )
         
-        # حفظ البيانات بطريقة محسنة للملفات الكبيرة
-        file_data = {
+        await db.excel_files.insert_one({
             **analysis.dict(),
             "uploaded_by": current_user.username,
             "created_at": datetime.utcnow(),
-            "file_size_mb": round(file_size_mb, 2)
-        }
-        
-        # تقسيم البيانات إذا كانت كبيرة لتجنب حد MongoDB
-        raw_data = df.to_dict('records')
-        
-        # حفظ البيانات في مجموعات أصغر إذا لزم الأمر
-        if len(raw_data) > 1000:  # إذا كان أكثر من 1000 صف
-            # حفظ البيانات الأساسية بدون raw_data أولاً
-            await db.excel_files.insert_one(file_data)
-            
-            # حفظ البيانات الخام في مجموعات منفصلة
-            chunk_size = 1000
-            for i in range(0, len(raw_data), chunk_size):
-                chunk = raw_data[i:i + chunk_size]
-                chunk_data = {
-                    "file_hash": file_hash,
-                    "chunk_index": i // chunk_size,
-                    "chunk_data": chunk,
-                    "created_at": datetime.utcnow()
-                }
-                await db.excel_data_chunks.insert_one(chunk_data)
-        else:
-            # للملفات الصغيرة، احفظ كما هو
-            file_data["raw_data"] = raw_data
-            await db.excel_files.insert_one(file_data)
+            "file_size_mb": round(file_size_mb, 2),
+            "file_format": file_format,
+            "chunk_count": staged["chunk_count"],
+            "stored_size_mb": round(stored_bytes / (1024 * 1024), 2)
+        })
         
         return analysis
         
@@ -4982,140 +7820,123 @@ async def admin_upload_excel(
         logger.error(f"Error uploading Excel: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في معالجة الملف: {str(e)}")
 
-@api_router.post("/admin/process-excel")
+@api_router.post("/admin/process-excel", status_code=202)
 async def admin_process_excel(
     file_hash: str = Query(...),
     mapping: ColumnMapping = None,
     educational_stage_id: Optional[str] = Query(None),
     region: Optional[str] = Query(None),
+    delete_missing: bool = Query(False),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """معالجة ملف الإكسيل وحفظ بيانات الطلاب - أدمن فقط"""
+    """إضافة مهمة استيراد للملف المرفوع إلى الطابور وإعادة رقمها فوراً - أدمن فقط
+
+    التقدم من /admin/ingestion-jobs/{job_id} (أو /events للبث المباشر) والإلغاء من /cancel.
+    لا يُكتب إلا الطلاب الجدد والمتغيرون؛ delete_missing يحذف طلاب المرحلة غير الموجودين في الملف
+    """
     try:
-        file_data = await db.excel_files.find_one({"file_hash": file_hash})
+        if delete_missing and not educational_stage_id:
+            raise HTTPException(status_code=400, detail="حذف الطلاب غير الموجودين في الملف يتطلب تحديد المرحلة التعليمية")
+        
+        file_data = await db.excel_files.find_one({"file_hash": file_hash}, {"raw_data": 0})
         if not file_data:
             raise HTTPException(status_code=404, detail="لم يتم العثور على الملف")
         
-        # جلب البيانات - إما من raw_data أو من الـ chunks
-        if "raw_data" in file_data:
-            # ملف صغير - البيانات محفوظة مباشرة
-            raw_data = file_data['raw_data']
-        else:
-            # ملف كبير - البيانات مقسمة في chunks
-            chunks = []
-            async for chunk in db.excel_data_chunks.find({"file_hash": file_hash}).sort("chunk_index", 1):
-                chunks.extend(chunk["chunk_data"])
-            raw_data = chunks
-            
-        if not raw_data:
-            raise HTTPException(status_code=400, detail="لا توجد بيانات في الملف")
-        
-        df = pd.DataFrame(raw_data)
-        processed_students = []
-        errors = []
-        
         required_columns = [mapping.student_id_column, mapping.name_column] + mapping.subject_columns
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in required_columns if col not in file_data.get("columns", [])]
         if missing_columns:
             raise HTTPException(status_code=400, detail=f"أعمدة مفقودة: {', '.join(missing_columns)}")
         
-        for index, row in df.iterrows():
-            try:
-                student_id = sanitize_string(str(row[mapping.student_id_column]))
-                name = sanitize_string(str(row[mapping.name_column]))
-                
-                if not student_id or not name:
-                    errors.append(f"الصف {index + 1}: بيانات ناقصة")
-                    continue
-                
-                subjects = []
-                for subject_col in mapping.subject_columns:
-                    try:
-                        score = pd.to_numeric(row[subject_col], errors='coerce')
-                        if not pd.isna(score):
-                            subjects.append(StudentSubject(
-                                name=sanitize_string(subject_col),
-                                score=float(score)
-                            ))
-                    except Exception as e:
-                        logger.warning(f"Error processing subject {subject_col} for student {student_id}: {str(e)}")
-                
-                additional_info = {}
-                class_name = None
-                section = None
-                total_score = None
-                school_name = None
-                administration = None
-                school_code = None
-                
-                if mapping.class_column and mapping.class_column in df.columns:
-                    class_name = sanitize_string(str(row[mapping.class_column]))
-                
-                if mapping.section_column and mapping.section_column in df.columns:
-                    section = sanitize_string(str(row[mapping.section_column]))
-                
-                if mapping.total_column and mapping.total_column in df.columns:
-                    try:
-                        total_score = float(pd.to_numeric(row[mapping.total_column], errors='coerce'))
-                    except:
-                        pass
-                
-                # معالجة معلومات المدرسة والإدارة
-                if hasattr(mapping, 'school_column') and mapping.school_column and mapping.school_column in df.columns:
-                    school_name = sanitize_string(str(row[mapping.school_column]))
-                
-                if hasattr(mapping, 'administration_column') and mapping.administration_column and mapping.administration_column in df.columns:
-                    administration = sanitize_string(str(row[mapping.administration_column]))
-                    
-                if hasattr(mapping, 'school_code_column') and mapping.school_code_column and mapping.school_code_column in df.columns:
-                    school_code = sanitize_string(str(row[mapping.school_code_column]))
-                
-                student = Student(
-                    student_id=student_id,
-                    name=name,
-                    subjects=subjects,
-                    total_score=total_score,
-                    class_name=class_name,
-                    section=section,
-                    educational_stage_id=educational_stage_id,  # ربط بالمرحلة التعليمية
-                    region=region,  # ربط بالمحافظة
-                    school_name=school_name,  # اسم المدرسة
-                    administration=administration,  # الإدارة التعليمية
-                    school_code=school_code,  # كود المدرسة
-                    additional_info=additional_info
-                )
-                
-                processed_students.append(student)
-                
-            except Exception as e:
-                errors.append(f"الصف {index + 1}: {str(e)}")
-                continue
+        if not file_data.get("total_rows"):
+            raise HTTPException(status_code=400, detail="لا توجد بيانات في الملف")
         
-        if processed_students:
-            students_data = [student.dict() for student in processed_students]
-            
-            for student_data in students_data:
-                student_data['processed_by'] = current_user.username
-                student_data['processed_at'] = datetime.utcnow()
-                await db.students.replace_one(
-                    {"student_id": student_data["student_id"]},
-                    student_data,
-                    upsert=True
-                )
+        job = IngestionJob(
+            file_hash=file_hash,
+            filename=file_data.get("filename"),
+            mapping=mapping,
+            educational_stage_id=educational_stage_id,
+            region=region,
+            delete_missing=delete_missing,
+            total_rows=file_data["total_rows"],
+            created_by=current_user.username
+        )
+        await db.ingestion_jobs.insert_one(job.dict())
+        ingestion_worker.wake()
         
-        return {
-            "message": "تم معالجة البيانات بنجاح",
-            "processed_count": len(processed_students),
-            "error_count": len(errors),
-            "errors": errors[:10]
-        }
+        return {"message": "تمت إضافة المهمة إلى طابور المعالجة", "job_id": job.id, **ingestion_job_progress(job.dict())}
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing Excel: {str(e)}")
+        logger.error(f"Error queueing Excel processing: {str(e)}")
         raise HTTPException(status_code=500, detail=f"خطأ في معالجة البيانات: {str(e)}")
 
+@api_router.get("/admin/ingestion-jobs")
+async def list_ingestion_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: AdminUser = Depends(get_current_user)
+):
+    """أحدث مهام الاستيراد - أدمن فقط"""
+    jobs = await db.ingestion_jobs.find({}, {"errors": 0}).sort("created_at", -1).limit(limit).to_list(length=limit)
+    return [ingestion_job_progress(job) for job in jobs]
+
+async def get_ingestion_job_or_404(job_id: str) -> Dict[str, Any]:
+    job = await db.ingestion_jobs.find_one({"id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="مهمة الاستيراد غير موجودة")
+    return job
+
+@api_router.get("/admin/ingestion-jobs/{job_id}")
+async def get_ingestion_job(job_id: str, current_user: AdminUser = Depends(get_current_user)):
+    """تقدم مهمة استيراد: الصفوف المنجزة والفاشلة والسرعة والوقت المتبقي - أدمن فقط"""
+    return ingestion_job_progress(await get_ingestion_job_or_404(job_id))
+
+# مدة البث الواحد محدودة لأن الاتصال يحجز مكاناً في مسار admin؛ العميل يعيد الاتصال
+INGESTION_EVENTS_MAX_SECONDS = 300
+INGESTION_EVENTS_POLL_SECONDS = 1.0
+
+@api_router.get("/admin/ingestion-jobs/{job_id}/events")
+async def stream_ingestion_job(job_id: str, current_user: AdminUser = Depends(get_current_user)):
+    """بث تقدم مهمة الاستيراد (Server-Sent Events) حتى انتهائها - أدمن فقط"""
+    await get_ingestion_job_or_404(job_id)
+    
+    async def events():
+        deadline = time.monotonic() + INGESTION_EVENTS_MAX_SECONDS
+        last_payload = None
+        while time.monotonic() < deadline:
+            job = await db.ingestion_jobs.find_one({"id": job_id})
+            if not job:
+                return
+            payload = json.dumps(ingestion_job_progress(job), ensure_ascii=False)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            if job["status"] in INGESTION_TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(INGESTION_EVENTS_POLL_SECONDS)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@api_router.post("/admin/ingestion-jobs/{job_id}/cancel")
+async def cancel_ingestion_job(job_id: str, current_user: AdminUser = Depends(get_current_user)):
+    """إلغاء مهمة استيراد: فوراً إن كانت في الطابور، أو بعد الدفعة الحالية إن كانت قيد التنفيذ - أدمن فقط"""
+    await get_ingestion_job_or_404(job_id)
+    now = datetime.utcnow()
+    job = await db.ingestion_jobs.find_one_and_update(
+        {"id": job_id, "status": "queued"},
+        {"$set": {"status": "cancelled", "cancel_requested": True, "finished_at": now, "message": "تم إلغاء المهمة"}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        job = await db.ingestion_jobs.find_one_and_update(
+            {"id": job_id, "status": "running"},
+            {"$set": {"cancel_requested": True}},
+            return_document=ReturnDocument.AFTER
+        )
+    if job is None:
+        raise HTTPException(status_code=409, detail="المهمة انتهت بالفعل")
+    return ingestion_job_progress(job)
+
 @api_router.get("/admin/content", response_model=SiteContent)
 async def get_admin_content(current_user: AdminUser = Depends(get_current_user)):
     """جلب محتوى الموقع للأدمن"""
@@ -5154,21 +7975,44 @@ async def update_site_content(
 async def get_all_students(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    educational_stage_id: Optional[str] = Query(None),
+    region: Optional[str] = Query(None),
+    school_name: Optional[str] = Query(None),
+    include_total: bool = Query(True),
     current_user: AdminUser = Depends(get_current_user)
 ):
-    """جلب جميع الطلاب مع pagination - أدمن فقط"""
+    """جلب جميع الطلاب مع pagination (skip أو cursor مرتب حسب رقم الجلوس) - أدمن فقط"""
     try:
-        total = await db.students.count_documents({})
-        cursor = db.students.find({}).skip(skip).limit(limit)
-        students = await cursor.to_list(length=limit)
+        query = {}
+        if educational_stage_id:
+            query["educational_stage_id"] = educational_stage_id
+        if region:
+            query["region"] = region
+        if school_name:
+            query["school_name"] = school_name
         
-        return {
+        if cursor:
+            (last_student_id,) = decode_page_cursor(cursor, 1)
+            page = db.students.find({**query, "student_id": {"$gt": last_student_id}})
+        else:
+            page = db.students.find(query).skip(skip)
+        students = await page.sort("student_id", 1).limit(limit).to_list(length=limit)
+        
+        next_cursor = encode_page_cursor(students[-1]["student_id"]) if len(students) == limit else None
+        total, total_is_estimate = await cached_count_with_source(db.students, query) if include_total else (None, False)
+        
+        return Response(content=dumps_json({
             "total": total,
-            "students": [Student(**student) for student in students],
+            "total_is_estimate": total_is_estimate,
+            "students": [student_read_model(student) for student in students],
             "skip": skip,
-            "limit": limit
-        }
+            "limit": limit,
+            "next_cursor": next_cursor
+        }), media_type="application/json")
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting all students: {str(e)}")
         raise HTTPException(status_code=500, detail="خطأ في جلب بيانات الطلاب")
@@ -5180,7 +8024,13 @@ async def delete_student(
 ):
     """حذف طالب - أدمن فقط"""
     try:
-        result = await db.students.delete_one({"student_id": sanitize_string(student_id)})
+        sanitized_id = normalize_student_id(sanitize_string(student_id))
+        result = await db.students.delete_one({"student_id": sanitized_id})
+        student_result_cache.invalidate(sanitized_id)
+        if result.deleted_count:
+            suggestion_index.schedule_rebuild()
+            student_rank_scheduler.schedule()
+            await bump_content_version("students")
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="الطالب غير موجود")
@@ -5201,6 +8051,10 @@ async def delete_all_students(current_user: AdminUser = Depends(get_current_user
             raise HTTPException(status_code=403, detail="صلاحية المدير العام مطلوبة")
         
         result = await db.students.delete_many({})
+        student_result_cache.clear()
+        suggestion_index.schedule_rebuild()
+        student_rank_scheduler.schedule()
+        await bump_content_version("students")
         
         return {
             "message": f"تم حذف {result.deleted_count} طالب بنجاح",
@@ -5213,6 +8067,23 @@ async def delete_all_students(current_user: AdminUser = Depends(get_current_user
         logger.error(f"Error deleting all students: {str(e)}")
         raise HTTPException(status_code=500, detail="خطأ في حذف البيانات")
 
+@api_router.get("/admin/performance")
+async def get_performance_stats(current_user: AdminUser = Depends(get_current_user)):
+    """عدادات الأداء الداخلية (الكاش، دمج الطلبات، الاقتراحات، فلتر أرقام الجلوس) - أدمن فقط"""
+    return {
+        "student_cache": student_result_cache.stats(),
+        "student_lookup_coalescing": student_lookup_flight.stats(),
+        "search_facets_cache": search_facets_cache.stats(),
+        "search_facets_coalescing": search_facets_flight.stats(),
+        "suggestion_index": suggestion_index.stats(),
+        "seat_number_filter": seat_number_filter.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "admission": admission_controller.stats(),
+        "ingestion_worker": ingestion_worker.stats(),
+        "cpu_pool": cpu_pool.stats(),
+        "ingestion_cpu_pool": ingestion_cpu_pool.stats()
+    }
+
 # Include router and startup events
 @app.on_event("startup")
 async def startup_event():
@@ -5220,6 +8091,7 @@ async def startup_event():
     try:
         logger.info("Starting up the application...")
         await create_indexes()
+        start_background_task(backfill_name_search_fields())
         await create_default_admin()
         await create_default_educational_stages()
         await create_default_content()
@@ -5229,6 +8101,14 @@ async def startup_event():
         await create_default_educational_content()
         await create_default_notification_system()
         await create_default_homepage_system()
+        suggestion_index.schedule_rebuild()
+        seat_number_filter.start()
+        rate_limiter.start()
+        if not client_address_resolver.configured:
+            logger.warning("Rate limiting is inactive until the client address source is configured (RATE_LIMIT_CLIENT_IP_HEADER)")
+        cpu_pool.start()
+        ingestion_cpu_pool.start()
+        ingestion_worker.start()
         logger.info("Application startup completed successfully")
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
@@ -5247,5 +8127,7 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """تنظيف الموارد عند الإغلاق"""
+    cpu_pool.shutdown()
+    ingestion_cpu_pool.shutdown()
     client.close()
     logger.info("Application shutdown completed")
\ No newline at end of file
@@ -7,6 +7,7 @@ Comprehensive testing for the Smart Results Query System - Backend APIs
 import requests
 import sys
 import json
+import time
 from datetime import datetime
 import os
 from pathlib import Path
@@ -244,10 +245,22 @@ class BackendTester:
                 timeout=30
             )
 
-            success = response.status_code == 200
+            success = response.status_code == 202
             
             if success:
+                # المعالجة مهمة خلفية: انتظار انتهائها
                 data = response.json()
+                job_id = data['job_id']
+                for _ in range(30):
+                    if data.get('status') not in ('queued', 'running'):
+                        break
+                    time.sleep(1)
+                    data = requests.get(
+                        f"{self.api_url}/admin/ingestion-jobs/{job_id}",
+                        headers=self.get_auth_headers(),
+                        timeout=10
+                    ).json()
+                success = data.get('status') == 'completed'
                 details = f"تم معالجة: {data.get('processed_count', 0)} طالب مع المرحلة: {stages[0]['name']}, المنطقة: {region}"
             else:
                 details = f"كود الحالة: {response.status_code}, الرسالة: {response.text}"
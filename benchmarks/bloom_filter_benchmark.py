@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+قياس حجم Bloom filter أرقام الجلوس ومعدل الإيجابيات الكاذبة - Seat number filter benchmark
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import BloomFilter  # noqa: E402
+
+
+def measure(student_count: int, error_rate: float, probes: int = 200000):
+    bloom = BloomFilter(capacity=int(student_count * 1.2) + 1000, error_rate=error_rate)
+    started = time.perf_counter()
+    for i in range(student_count):
+        bloom.add(str(1000000 + i))
+    build_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    false_positives = sum(str(90000000 + i) in bloom for i in range(probes))
+    lookup_us = (time.perf_counter() - started) / probes * 1e6
+
+    print(
+        f"{student_count:>9,} ids  target={error_rate:<6}  memory={len(bloom.bits) / 1024 / 1024:6.2f} MB  "
+        f"k={bloom.hash_count:<2}  observed_fp={false_positives / probes:.5f}  "
+        f"estimated_fp={bloom.estimated_false_positive_rate():.5f}  build={build_seconds:5.1f}s  lookup={lookup_us:.2f} µs"
+    )
+
+
+def main():
+    for student_count in (100000, 1000000):
+        for error_rate in (0.01, 0.001):
+            measure(student_count, error_rate)
+
+
+if __name__ == "__main__":
+    main()
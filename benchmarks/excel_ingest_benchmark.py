@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+ذاكرة قراءة ملفات الإكسيل: القراءة المتدفقة على دفعات مقابل pandas - Excel ingestion RSS benchmark
+
+كل وضع يعمل في عملية مستقلة ويُقاس أقصى RSS لها (ru_maxrss).
+الاستخدام: python benchmarks/excel_ingest_benchmark.py [عدد الصفوف ...] [--skip-pandas-above N]
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+SUBJECTS = ["عربي", "انجليزي", "رياضيات", "علوم", "دراسات", "حاسب"]
+
+
+def workbook_path(rows: int) -> Path:
+    """ملف اختبار بعدد الصفوف المطلوب (يُنشأ مرة واحدة ويُعاد استخدامه)"""
+    path = Path(tempfile.gettempdir()) / f"students_{rows}.xlsx"
+    if path.exists():
+        return path
+    import openpyxl
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["رقم الجلوس", "اسم الطالب", "المدرسة", "الإدارة", *SUBJECTS])
+    for i in range(rows):
+        sheet.append([
+            100000 + i, f"طالب رقم {i} محمد احمد", f"مدرسة {i % 400}", f"إدارة {i % 30}",
+            *((i * (k + 3)) % 101 for k in range(len(SUBJECTS)))
+        ])
+    workbook.save(path)
+    return path
+
+
+def run_mode(mode: str, path: str):
+    import pandas as pd
+    from server import open_excel_row_stream
+
+    baseline_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # بعد الاستيراد، قبل القراءة
+    started = time.perf_counter()
+    rows = 0
+    if mode == "stream":
+        with open(path, "rb") as source:
+            _, batches = open_excel_row_stream(source)
+            for batch in batches:
+                rows += len(batch)
+    else:
+        rows = len(pd.read_excel(path).to_dict("records"))
+    seconds = time.perf_counter() - started
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{rows}\t{seconds:.1f}\t{peak_mb:.0f}\t{peak_mb - baseline_mb:.0f}")
+
+
+def measure(mode: str, path: Path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--run", mode, str(path)], capture_output=True, text=True, check=True
+    ).stdout.strip().splitlines()[-1]
+    rows, seconds, peak_mb, growth_mb = output.split("\t")
+    return int(rows), float(seconds), float(peak_mb), float(growth_mb)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="*", type=int, default=[100000, 1000000])
+    parser.add_argument("--skip-pandas-above", type=int, default=None)
+    parser.add_argument("--run", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        run_mode(*args.run)
+        return
+
+    for rows in args.rows:
+        path = workbook_path(rows)
+        size_mb = path.stat().st_size / 1024 / 1024
+        modes = ["stream"]
+        if args.skip_pandas_above is None or rows <= args.skip_pandas_above:
+            modes.append("pandas")
+        for mode in modes:
+            read_rows, seconds, peak_mb, growth_mb = measure(mode, path)
+            print(
+                f"{rows:>9,} rows ({size_mb:5.1f} MB)  {mode:<6}  peak RSS={peak_mb:6.0f} MB  "
+                f"growth while reading={growth_mb:6.0f} MB  time={seconds:6.1f}s  rows read={read_rows:,}"
+            )
+
+
+if __name__ == "__main__":
+    main()
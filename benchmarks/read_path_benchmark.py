@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+قياس تكلفة مسار القراءة لطالب بعشر مواد - Read path benchmark
+
+يقارن المسار القديم (Student(**doc) ثم التحقق مرة ثانية عبر response_model ثم التحويل)
+بمسار القراءة الموثوق (student_read_model + json.dumps).
+"""
+
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from server import Student, build_name_search_fields, serialize_student_document  # noqa: E402
+
+
+def build_document():
+    student = Student(
+        student_id="123456",
+        name="أحمد محمد علي",
+        subjects=[{"name": f"مادة {i}", "score": 55 + i * 4} for i in range(10)],
+        class_name="3/1",
+        school_name="مدرسة النصر الثانوية",
+        administration="إدارة شرق",
+        region="القاهرة",
+    )
+    return {
+        **student.model_dump(),
+        "processed_by": "admin",
+        "processed_at": datetime.utcnow(),
+        **build_name_search_fields(student.name),
+    }
+
+
+def validated_path(document):
+    # ما كان يحدث: بناء النموذج في الـ handler ثم تحقق response_model ثم التحويل إلى JSON
+    student = Student(**document)
+    revalidated = Student.model_validate(student.model_dump())
+    return json.dumps(revalidated.model_dump(mode="json"), ensure_ascii=False).encode("utf-8")
+
+
+def main():
+    document = build_document()
+    runs = 20000
+    old = min(timeit.repeat(lambda: validated_path(document), number=runs, repeat=3)) / runs
+    new = min(timeit.repeat(lambda: serialize_student_document(document), number=runs, repeat=3)) / runs
+    print(f"validated path : {old * 1e6:8.1f} µs/request")
+    print(f"trusted path   : {new * 1e6:8.1f} µs/request")
+    print(f"CPU saved      : {(old - new) * 1e6:8.1f} µs/request ({old / new:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+سرعة كتابة الطلاب المعالجين: replace_one لكل طالب مقابل bulk_upsert_students - Student write throughput benchmark
+
+يحتاج mongod (MONGO_BENCH_URL، الافتراضي mongodb://localhost:27017) ويستخدم قاعدة مؤقتة تُحذف في النهاية.
+بدون mongod: --offline يقيس جانب التطبيق فقط (ترميز BSON وعدد الأوامر) مع زمن ذهاب وعودة ثابت --rtt-ms لكل أمر،
+ولا يشمل كلفة الكتابة في الخادم.
+الاستخدام: python benchmarks/student_write_benchmark.py [--rows N] [--batch-sizes 100 500 1000] [--concurrency 1 2 4]
+          [--offline --rtt-ms 0.5]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import bson  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from server import Student, build_name_search_fields, bulk_upsert_students  # noqa: E402
+
+DATABASE = "student_write_benchmark"
+
+
+def build_documents(rows: int):
+    documents = []
+    for i in range(rows):
+        student = Student(
+            student_id=str(100000 + i),
+            name=f"طالب رقم {i} محمد احمد",
+            subjects=[{"name": f"مادة {k}", "score": (i * (k + 3)) % 101} for k in range(8)],
+            school_name=f"مدرسة {i % 400}",
+            administration=f"إدارة {i % 30}",
+            region="القاهرة",
+        )
+        documents.append({**student.dict(), "processed_by": "benchmark", **build_name_search_fields(student.name)})
+    return documents
+
+
+async def fresh_collection(client):
+    await client.drop_database(DATABASE)
+    collection = client[DATABASE].students
+    await collection.create_index([("student_id", 1)], unique=True)
+    return collection
+
+
+class OfflineCollection:
+    """بديل المجموعة بدون خادم: يرمّز كل أمر BSON كما يرسله المشغّل وينتظر rtt لكل أمر"""
+
+    def __init__(self, rtt_seconds: float):
+        self.rtt_seconds = rtt_seconds
+        self.commands = 0
+
+    async def _send(self, operations):
+        bson.encode({"updates": [{"q": query, "u": document, "upsert": True} for query, document in operations]})
+        self.commands += 1
+        await asyncio.sleep(self.rtt_seconds)
+
+    async def replace_one(self, query, document, upsert=False):
+        await self._send([(query, document)])
+
+    async def bulk_write(self, requests, ordered=True):
+        await self._send([(request._filter, request._doc) for request in requests])
+
+
+async def sequential(collection, documents):
+    for document in documents:
+        await collection.replace_one({"student_id": document["student_id"]}, document, upsert=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[100, 500, 1000, 2000])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 2, 4])
+    parser.add_argument("--skip-sequential", action="store_true")
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    args = parser.parse_args()
+
+    documents = build_documents(args.rows)
+    runs = [] if args.skip_sequential else [("replace_one x N", sequential)]
+    runs += [
+        (f"bulk batch={batch_size} x{concurrency}",
+         lambda collection, docs, b=batch_size, c=concurrency: bulk_upsert_students(collection, docs, batch_size=b, concurrency=c))
+        for batch_size in args.batch_sizes
+        for concurrency in args.concurrency
+    ]
+    if args.offline:
+        await offline(runs, documents, args)
+        return
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_BENCH_URL", "mongodb://localhost:27017"), maxPoolSize=8)
+    try:
+        for label, write in runs:
+            # أول تشغيل يُدرج في مجموعة فارغة، والثاني يستبدل المستندات نفسها (إعادة رفع الملف)
+            for phase in ("insert", "replace"):
+                collection = await fresh_collection(client) if phase == "insert" else client[DATABASE].students
+                started = time.perf_counter()
+                await write(collection, documents)
+                seconds = time.perf_counter() - started
+                print(f"{label:<24} {phase:<8} {args.rows / seconds:>10,.0f} rows/s  ({seconds:6.2f}s)")
+    finally:
+        await client.drop_database(DATABASE)
+        client.close()
+
+
+async def offline(runs, documents, args):
+    print(f"offline: client-side cost only, {args.rtt_ms} ms per command round trip")
+    for label, write in runs:
+        collection = OfflineCollection(args.rtt_ms / 1000)
+        started = time.perf_counter()
+        await write(collection, documents)
+        seconds = time.perf_counter() - started
+        print(f"{label:<24} {args.rows / seconds:>10,.0f} rows/s  ({seconds:6.2f}s, {collection.commands:,} commands)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
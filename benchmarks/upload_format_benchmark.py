@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+زمن قراءة ملف الرفع لكل صيغة لنفس البيانات - Upload parse time per format benchmark
+
+نفس الصفوف تُكتب xlsx و csv و csv.gz و tsv و parquet، وتُقرأ كل صيغة بـ open_upload_row_stream
+(المسار الذي يستخدمه admin_upload_excel) حتى آخر دفعة.
+الاستخدام: python benchmarks/upload_format_benchmark.py [عدد الصفوف] [--formats xlsx csv ...]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+SUBJECTS = ["عربي", "انجليزي", "رياضيات", "علوم", "دراسات", "حاسب"]
+FORMATS = {
+    "xlsx": ("xlsx", ".xlsx"),
+    "csv": ("csv", ".csv"),
+    "csv.gz": ("csv", ".csv.gz"),
+    "tsv": ("tsv", ".tsv"),
+    "parquet": ("parquet", ".parquet"),
+}
+
+
+def dataset(rows: int):
+    import pandas as pd
+
+    data = {
+        "رقم الجلوس": [100000 + i for i in range(rows)],
+        "اسم الطالب": [f"طالب رقم {i} محمد احمد" for i in range(rows)],
+        "المدرسة": [f"مدرسة {i % 400}" for i in range(rows)],
+        "الإدارة": [f"إدارة {i % 30}" for i in range(rows)],
+    }
+    for k, subject in enumerate(SUBJECTS):
+        data[subject] = [(i * (k + 3)) % 101 for i in range(rows)]
+    return pd.DataFrame(data)
+
+
+def dataset_path(rows: int, name: str, df) -> Path:
+    """ملف البيانات بالصيغة المطلوبة (يُنشأ مرة واحدة ويُعاد استخدامه)"""
+    path = Path(tempfile.gettempdir()) / f"students_{rows}{FORMATS[name][1]}"
+    if path.exists():
+        return path
+    if name == "xlsx":
+        import openpyxl
+
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(list(df.columns))
+        for values in df.itertuples(index=False):
+            sheet.append(list(values))
+        workbook.save(path)
+    elif name == "parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False, sep="\t" if name == "tsv" else ",")
+    return path
+
+
+def parse(path: Path, file_format: str):
+    from server import open_upload_row_stream
+
+    started = time.perf_counter()
+    _, batches = open_upload_row_stream(str(path), file_format)
+    rows = sum(len(batch) for batch in batches)
+    return rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="?", type=int, default=500000)
+    parser.add_argument("--formats", nargs="+", choices=list(FORMATS), default=list(FORMATS))
+    args = parser.parse_args()
+
+    df = None
+    for name in args.formats:
+        path = Path(tempfile.gettempdir()) / f"students_{args.rows}{FORMATS[name][1]}"
+        if not path.exists():
+            df = dataset(args.rows) if df is None else df
+            path = dataset_path(args.rows, name, df)
+        size_mb = path.stat().st_size / 1024 / 1024
+        rows, seconds = parse(path, FORMATS[name][0])
+        print(
+            f"{name:<8} ({size_mb:6.1f} MB)  parse time={seconds:6.2f}s  "
+            f"rows/s={rows / seconds:>10,.0f}  rows read={rows:,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2591,6 +2591,7 @@ const UploadTab = ({ adminToken, onSuccess }) => {
   const [fileAnalysis, setFileAnalysis] = useState(null);
   const [selectedStage, setSelectedStage] = useState('');
   const [selectedRegion, setSelectedRegion] = useState('');
+  const [deleteMissing, setDeleteMissing] = useState(false);
   const [availableStages, setAvailableStages] = useState([]);
   const [availableRegions, setAvailableRegions] = useState([]);
   const [stageTemplates, setStageTemplates] = useState([]);
@@ -2830,8 +2831,8 @@ const UploadTab = ({ adminToken, onSuccess }) => {
   }, []);
 
   const handleFileUpload = async (file) => {
-    if (!file.name.match(/\.(xlsx|xls)$/)) {
-      alert('يرجى اختيار ملف Excel صالح (.xlsx أو .xls)');
+    if (!file.name.toLowerCase().match(/\.(xlsx|xls|csv|tsv|csv\.gz|tsv\.gz|parquet)$/)) {
+      alert('يرجى اختيار ملف صالح (.xlsx أو .xls أو .csv أو .tsv أو .parquet)');
       return;
     }
 
@@ -2930,6 +2931,10 @@ const UploadTab = ({ adminToken, onSuccess }) => {
         params.append('region', selectedRegion);
       }
 
+      if (deleteMissing) {
+        params.append('delete_missing', 'true');
+      }
+
       const response = await axios.post(`${API}/admin/process-excel?${params}`, mapping, {
         headers: {
           'Authorization': `Bearer ${adminToken}`,
@@ -2937,7 +2942,24 @@ const UploadTab = ({ adminToken, onSuccess }) => {
         }
       });
 
-      alert(`تم معالجة الملف بنجاح! تم إضافة ${response.data.total_processed} طالب`);
+      // المعالجة تتم في الخلفية: متابعة حالة المهمة حتى انتهائها
+      let job = response.data;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        const progress = await axios.get(`${API}/admin/ingestion-jobs/${response.data.job_id}`, {
+          headers: { 'Authorization': `Bearer ${adminToken}` }
+        });
+        job = progress.data;
+      }
+
+      if (job.status !== 'completed') {
+        throw new Error(job.message || 'تم إيقاف المعالجة');
+      }
+
+      alert(
+        `تم معالجة الملف بنجاح! جديد: ${job.added_count} - متغير: ${job.changed_count} - ` +
+        `بدون تغيير: ${job.unchanged_count} - محذوف: ${job.removed_count}`
+      );
       setFileAnalysis(null);
       setMapping({
         student_id_column: '',
@@ -2949,6 +2971,7 @@ const UploadTab = ({ adminToken, onSuccess }) => {
       });
       setSelectedStage('');
       setSelectedRegion('');
+      setDeleteMissing(false);
       
       if (onSuccess) onSuccess();
       
@@ -2979,7 +3002,7 @@ const UploadTab = ({ adminToken, onSuccess }) => {
           >
             <input
               type="file"
-              accept=".xlsx,.xls"
+              accept=".xlsx,.xls,.csv,.tsv,.gz,.parquet"
               onChange={handleFileInput}
               className="absolute inset-0 w-full h-full opacity-0 cursor-pointer"
               disabled={isLoading}
@@ -2999,7 +3022,7 @@ const UploadTab = ({ adminToken, onSuccess }) => {
                   اسحب ملف الإكسيل هنا أو اضغط للاختيار
                 </h3>
                 <p className="text-gray-600">
-                  يدعم ملفات .xlsx و .xls فقط
+                  يدعم ملفات .xlsx و .xls و .csv و .tsv (ومضغوطة .gz) و .parquet
                 </p>
               </div>
               
@@ -3071,6 +3094,16 @@ const UploadTab = ({ adminToken, onSuccess }) => {
                   </p>
                 </div>
               )}
+
+              <label className="mt-4 flex items-center gap-2 text-sm text-gray-700">
+                <input
+                  type="checkbox"
+                  checked={deleteMissing}
+                  onChange={(e) => setDeleteMissing(e.target.checked)}
+                  disabled={!selectedStage}
+                />
+                حذف طلاب هذه المرحلة غير الموجودين في الملف الجديد
+              </label>
             </div>
 
             {/* قوالب الربط المحفوظة */}
@@ -0,0 +1,53 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server.py يقرأ إعدادات قاعدة البيانات عند الاستيراد (الاتصال الفعلي كسول)
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "student_results_test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def mongo_db():
+    """قاعدة بيانات مؤقتة على mongod محلي (تُتخطى الاختبارات إن لم يكن متاحاً)"""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    client = MongoClient(os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017"), serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("mongod محلي غير متاح")
+    name = "student_results_plan_test"
+    client.drop_database(name)
+    yield client[name]
+    client.drop_database(name)
+    client.close()
+
+
+@pytest.fixture
+def plan_stages():
+    """دالة تُعيد جميع مراحل الخطة الفائزة من ناتج explain()"""
+    return winning_plan_stages
+
+
+def winning_plan_stages(explain: dict) -> list:
+    stages = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.append(node["stage"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    planner = explain.get("queryPlanner", explain)
+    walk(planner.get("winningPlan", {}))
+    return stages
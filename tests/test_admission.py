@@ -0,0 +1,78 @@
+import asyncio
+
+from server import AdmissionController, AdmissionLane, admission_lane_name
+
+
+def lane(name="admin", priority=2, limit=1, queue_limit=1, queue_timeout=0.05, overload_limit=1):
+    return AdmissionLane(name, priority, limit, queue_limit, queue_timeout, overload_limit)
+
+
+def test_paths_map_to_priority_lanes():
+    assert admission_lane_name("GET", "/api/student/123") == "lookup"
+    assert admission_lane_name("POST", "/api/search/facets") == "lookup"
+    assert admission_lane_name("GET", "/api/faq") == "pages"
+    assert admission_lane_name("GET", "/api/admin/students") == "admin"
+    assert admission_lane_name("DELETE", "/api/admin/students") == "jobs"
+    assert admission_lane_name("POST", "/api/admin/process-excel") == "jobs"
+
+
+def test_waiters_get_released_slots_in_order_and_overflow_is_shed():
+    async def scenario():
+        admin = lane(limit=1, queue_limit=1, queue_timeout=1)
+        order = []
+        assert await admin.acquire(False)
+
+        async def queued():
+            admitted = await admin.acquire(False)
+            order.append("queued")
+            admin.release(False)
+            return admitted
+
+        waiter = asyncio.ensure_future(queued())
+        await asyncio.sleep(0)
+        overflow = await admin.acquire(False)
+        admin.release(False)
+        return overflow, await waiter, order, admin.stats()
+
+    overflow, queued_admitted, order, stats = asyncio.run(scenario())
+    assert overflow is False
+    assert queued_admitted is True and order == ["queued"]
+    assert stats["active"] == 0 and stats["waiting"] == 0 and stats["shed"] == 1
+
+
+def test_queue_timeout_sheds_and_frees_the_waiter():
+    async def scenario():
+        jobs = lane("jobs", priority=3, limit=1, queue_limit=5, queue_timeout=0.01)
+        await jobs.acquire(False)
+        admitted = await jobs.acquire(False)
+        jobs.release(False)
+        return admitted, jobs.stats()
+
+    admitted, stats = asyncio.run(scenario())
+    assert admitted is False
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_lower_lanes_shrink_and_stop_queueing_when_lookups_slow_down():
+    async def scenario():
+        admin = lane(limit=4, queue_limit=10, overload_limit=1)
+        pages = lane("pages", priority=1, limit=4, queue_limit=10, queue_timeout=0.01, overload_limit=2)
+        controller = AdmissionController([admin, pages], latency_target_ms=100)
+        for _ in range(5):
+            controller.record_lookup_latency(0.5)
+        assert controller.overloaded
+
+        admin_results = [await admin.acquire(controller.overloaded) for _ in range(2)]
+        pages_results = [await pages.acquire(controller.overloaded) for _ in range(3)]
+        return admin_results, pages_results, admin.stats(), pages.stats()
+
+    admin_results, pages_results, admin_stats, pages_stats = asyncio.run(scenario())
+    assert admin_results == [True, False] and admin_stats["queued"] == 0
+    # الصفحات العامة تنتظر في الطابور قبل رفضها
+    assert pages_results == [True, True, False] and pages_stats["queued"] == 1
+
+
+def test_overload_clears_without_recent_lookup_samples():
+    controller = AdmissionController([lane()], latency_target_ms=100, latency_window_seconds=0)
+    controller.record_lookup_latency(1.0)
+    assert not controller.overloaded
@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from server import bulk_upsert_students
+
+
+def run_upsert(mongo_db, documents, **kwargs):
+    async def main():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017"))
+        try:
+            return await bulk_upsert_students(client[mongo_db.name].students, documents, **kwargs)
+        finally:
+            client.close()
+
+    return asyncio.run(main())
+
+
+def test_bulk_upsert_replaces_in_batches_and_keeps_last_duplicate(mongo_db):
+    mongo_db.students.create_index([("student_id", 1)], unique=True)
+    mongo_db.students.insert_one({"student_id": "100001", "name": "قديم", "stale": True})
+    documents = [{"student_id": str(100000 + i), "name": f"طالب {i}"} for i in range(25)]
+    documents.append({"student_id": "100003", "name": "آخر ظهور"})
+
+    written, errors = run_upsert(mongo_db, documents, batch_size=4, concurrency=3)
+
+    assert (written, errors) == (25, [])
+    assert mongo_db.students.count_documents({}) == 25
+    assert mongo_db.students.find_one({"student_id": "100001"}, {"_id": 0}) == {"student_id": "100001", "name": "طالب 1"}
+    assert mongo_db.students.find_one({"student_id": "100003"})["name"] == "آخر ظهور"
+
+
+def test_bulk_upsert_reports_failed_rows_and_writes_the_rest(mongo_db):
+    mongo_db.students.create_index([("student_id", 1)], unique=True)
+    mongo_db.students.create_index([("school_code", 1)], unique=True, sparse=True)
+    documents = [{"student_id": str(200000 + i), "name": f"طالب {i}"} for i in range(10)]
+    documents[2]["school_code"] = documents[7]["school_code"] = "X1"
+
+    written, errors = run_upsert(mongo_db, documents, batch_size=3, concurrency=1)
+
+    assert written == 9
+    assert len(errors) == 1 and errors[0].startswith("رقم الجلوس 200007:")
+    assert mongo_db.students.count_documents({}) == 9
@@ -0,0 +1,63 @@
+import asyncio
+import os
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+
+def test_student_endpoint_returns_304_for_matching_etag():
+    server.student_result_cache.clear()
+    server.cache_student_result({
+        "id": "x", "student_id": "7001", "name": "سارة",
+        "processed_at": datetime(2025, 7, 1, 9, 0, 0),
+    })
+    client = TestClient(server.app)
+
+    first = client.get("/api/student/7001")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == server.CACHE_CONTROL_RESULTS
+
+    second = client.get("/api/student/7001", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+    changed = client.get("/api/student/7001", headers={"If-None-Match": '"other"'})
+    assert changed.status_code == 200
+
+
+def test_student_etag_changes_with_processing_time_and_ranks():
+    base = {"student_id": "1", "processed_at": datetime(2025, 7, 1)}
+    assert server.student_etag(base) == server.student_etag(dict(base))
+    assert server.student_etag(base) != server.student_etag({**base, "processed_at": datetime(2025, 7, 2)})
+    assert server.student_etag(base) != server.student_etag({**base, "ranks_updated_at": datetime(2025, 7, 2)})
+
+
+def test_etags_change_with_the_build_version(monkeypatch):
+    before = server.student_etag({"student_id": "1", "processed_at": datetime(2025, 7, 1)})
+    monkeypatch.setattr(server, "ETAG_BUILD_VERSION", "3.0.1:")
+    assert server.student_etag({"student_id": "1", "processed_at": datetime(2025, 7, 1)}) != before
+
+
+def test_content_etag_follows_documents_changed_without_a_version_bump(mongo_db, monkeypatch):
+    mongo_db.content_versions.insert_one({"_id": "site_settings", "updated_at": datetime(2025, 7, 1)})
+    mongo_db.site_settings.insert_one({"site_name": "أ", "updated_at": datetime(2025, 7, 1)})
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017"))
+        monkeypatch.setattr(server, "db", client[mongo_db.name])
+        try:
+            first = await server.content_version_etag("site_settings")
+            unchanged = await server.content_version_etag("site_settings")
+            # إعادة إنشاء الإعدادات الافتراضية لا تمر بـ bump_content_version
+            await server.db.site_settings.replace_one({}, {"site_name": "ب", "updated_at": datetime(2025, 7, 2)})
+            return first, unchanged, await server.content_version_etag("site_settings")
+        finally:
+            client.close()
+
+    first, unchanged, changed = asyncio.run(scenario())
+    assert first == unchanged != changed
@@ -0,0 +1,138 @@
+import asyncio
+import time
+
+from concurrent.futures.process import BrokenProcessPool
+
+import openpyxl
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from server import ColumnMapping, CpuPoolBusy, CpuTaskPool, IngestionWorker, stage_excel_upload
+
+MAPPING = ColumnMapping(student_id_column="رقم الجلوس", name_column="الاسم", subject_columns=["عربي"])
+
+
+def pool(**overrides):
+    settings = dict(max_workers=1, max_pending=2, queue_timeout=5, default_timeout=120)
+    settings.update(overrides)
+    return CpuTaskPool(**settings)
+
+
+def write_workbook(path, row_count):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["رقم الجلوس", "الاسم", "عربي", "رياضيات"])
+    for index in range(row_count):
+        sheet.append([100000 + index, f"طالب {index}", index % 100, (index * 7) % 100])
+    workbook.save(path)
+
+
+async def max_loop_lag(task, interval=0.01):
+    """أكبر تأخير لمؤقت دوري (مثل طلب عام صغير) حتى تنتهي task"""
+    lag = 0.0
+    while not task.done():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(lag, time.perf_counter() - started - interval)
+    return lag
+
+
+def test_event_loop_stays_responsive_while_a_large_upload_is_parsed(tmp_path):
+    source = tmp_path / "students.xlsx"
+    write_workbook(source, 200_000)
+    data_path = str(tmp_path / "students.parquet")
+
+    async def scenario():
+        cpu = pool()
+        try:
+            await cpu.run(None, int)  # تشغيل العملية قبل القياس
+            upload = asyncio.ensure_future(cpu.run(None, stage_excel_upload, str(source), "xlsx", data_path))
+            lag = await max_loop_lag(upload)
+            return await upload, lag
+        finally:
+            cpu.shutdown()
+
+    staged, lag = asyncio.run(scenario())
+    assert staged["total_rows"] == 200_000
+    assert staged["suggested_mappings"]["رقم الجلوس"] == "student_id"
+    assert pq.ParquetFile(data_path).metadata.num_rows == 200_000
+    assert lag < 0.25
+
+
+def test_full_pool_rejects_after_queue_timeout():
+    async def scenario():
+        cpu = pool(max_pending=1, queue_timeout=0.05)
+        try:
+            running = asyncio.ensure_future(cpu.run(None, time.sleep, 1))
+            await asyncio.sleep(0)
+            with pytest.raises(CpuPoolBusy):
+                await cpu.run(None, int)
+            await running
+            return cpu.stats()
+        finally:
+            cpu.shutdown()
+
+    stats = asyncio.run(scenario())
+    assert stats["rejected"] == 1 and stats["completed"] == 1 and stats["active"] == 0
+
+
+def test_timed_out_task_restarts_the_pool():
+    async def scenario():
+        cpu = pool()
+        try:
+            with pytest.raises(CpuPoolBusy):
+                await cpu.run(0.5, time.sleep, 30)
+            return await cpu.run(None, abs, -3), cpu.stats()
+        finally:
+            cpu.shutdown()
+
+    result, stats = asyncio.run(scenario())
+    assert result == 3
+    assert stats["timed_out"] == 1 and stats["restarts"] == 1
+
+
+def ingestion_worker(cpu):
+    return IngestionWorker(poll_seconds=0.1, heartbeat_seconds=0.05, stale_seconds=30, max_attempts=2, pool=cpu)
+
+
+def test_timed_out_upload_does_not_kill_a_concurrent_ingestion_chunk():
+    rows = pd.DataFrame({"رقم الجلوس": ["1001", "1002"], "الاسم": ["منى", "علي"], "عربي": ["90", "80"]})
+
+    async def scenario():
+        cpu, ingestion_cpu = pool(max_workers=2), pool()
+        try:
+            await asyncio.gather(cpu.run(None, int), ingestion_cpu.run(None, int))
+            worker = ingestion_worker(ingestion_cpu)
+            chunk = asyncio.ensure_future(ingestion_cpu.run(None, time.sleep, 1))
+            await asyncio.sleep(0.1)
+            with pytest.raises(CpuPoolBusy):
+                await cpu.run(0.3, time.sleep, 30)
+            await chunk
+            return await worker.build_chunk(rows, MAPPING, "s1", None, 0), cpu.stats(), ingestion_cpu.stats()
+        finally:
+            cpu.shutdown()
+            ingestion_cpu.shutdown()
+
+    (students, errors), stats, ingestion_stats = asyncio.run(scenario())
+    assert errors == [] and [s["student_id"] for s in students] == ["1001", "1002"]
+    assert stats["restarts"] == 1
+    assert ingestion_stats["restarts"] == 0 and ingestion_stats["failed"] == 0
+
+
+class BreaksOncePool:
+    def __init__(self):
+        self.calls = 0
+
+    async def run(self, timeout, fn, *args, wait_for_slot=False):
+        self.calls += 1
+        if self.calls == 1:
+            raise BrokenProcessPool("worker terminated")
+        return fn(*args)
+
+
+def test_chunk_is_retried_when_the_process_pool_breaks():
+    rows = pd.DataFrame({"رقم الجلوس": ["1001"], "الاسم": ["منى"], "عربي": ["90"]})
+    broken = BreaksOncePool()
+    students, errors = asyncio.run(ingestion_worker(broken).build_chunk(rows, MAPPING, "s1", None, 0))
+    assert broken.calls == 2 and errors == [] and students[0]["content_hash"]
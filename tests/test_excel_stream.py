@@ -0,0 +1,50 @@
+from io import BytesIO
+
+import openpyxl
+import pandas as pd
+
+from server import SOURCE_ROW_COLUMN, ColumnMapping, build_students_from_rows, open_excel_row_stream
+
+
+def workbook_bytes(rows):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_rows_are_streamed_in_fixed_size_batches():
+    source = workbook_bytes([
+        ["رقم الجلوس", "الاسم", None, "عربي", "عربي"],
+        [1001, "أحمد", "x", 90, 80],
+        [None, None, None, None, None],
+        [1002, "سارة", None, 70, 60],
+        [1003, "علي", None, 50, 40],
+    ])
+    columns, batches = open_excel_row_stream(source, batch_rows=2)
+    batches = list(batches)
+
+    assert columns == ["رقم الجلوس", "الاسم", "Unnamed: 2", "عربي", "عربي.1"]
+    assert [len(batch) for batch in batches] == [2, 1]
+    # الصف الفارغ يُتخطى ويبقى رقم الصف في الملف
+    assert batches[0][1] == {
+        "رقم الجلوس": 1002, "الاسم": "سارة", "Unnamed: 2": None, "عربي": 70, "عربي.1": 60, SOURCE_ROW_COLUMN: 3
+    }
+    assert batches[1][0][SOURCE_ROW_COLUMN] == 4
+
+
+def test_empty_workbook_has_no_columns():
+    columns, batches = open_excel_row_stream(workbook_bytes([]))
+    assert columns == [] and list(batches) == []
+
+
+def test_batch_errors_are_numbered_by_file_row():
+    mapping = ColumnMapping(student_id_column="id", name_column="name", subject_columns=["math"])
+    df = pd.DataFrame([{"id": "5", "name": "منى", "math": 80}, {"id": "", "name": "", "math": 10}])
+    students, errors = build_students_from_rows(df, mapping, "s1", "القاهرة", row_offset=1000)
+    assert [student.student_id for student in students] == ["5"]
+    assert errors == ["الصف 1002: بيانات ناقصة"]
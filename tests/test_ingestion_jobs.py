@@ -0,0 +1,204 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+from server import ColumnMapping, IngestionJob, IngestionWorker, build_import_documents, ingestion_job_progress
+
+MAPPING = ColumnMapping(student_id_column="seat", name_column="name", subject_columns=["math", "science"])
+
+
+def test_progress_reports_percent_and_eta_only_while_running():
+    job = {**IngestionJob(file_hash="h", mapping=MAPPING, created_by="admin", total_rows=1000).dict(), "_id": 1}
+    job.update(status="running", rows_done=250, rows_per_second=50.0, worker_id="w1")
+
+    progress = ingestion_job_progress(job)
+    assert progress["percent"] == 25.0
+    assert progress["eta_seconds"] == 15
+    assert "_id" not in progress and "worker_id" not in progress
+
+    assert ingestion_job_progress({**job, "status": "cancelled"})["eta_seconds"] is None
+
+
+def test_content_hash_ignores_volatile_fields_and_tracks_row_content():
+    frame = server.pd.DataFrame([{"seat": "1", "name": "منى", "math": 80, "science": 70}] * 2)
+    (first, second), _ = build_import_documents(frame, MAPPING, "s1", None)
+    assert first["id"] != second["id"]
+    assert first["content_hash"] == second["content_hash"]
+
+    changed, _ = build_import_documents(frame.assign(math=81).head(1), MAPPING, "s1", None)
+    moved, _ = build_import_documents(frame.head(1), MAPPING, "s2", None)
+    assert changed[0]["content_hash"] != first["content_hash"]
+    assert moved[0]["content_hash"] != first["content_hash"]
+
+
+@pytest.fixture
+def jobs_env(mongo_db, monkeypatch):
+    """server.db / jobs_db على قاعدة الاختبار مع ملف مرفوع من ثلاث دفعات"""
+    mongo_db.excel_files.insert_one({"file_hash": "h1", "columns": ["seat", "name", "math", "science"], "total_rows": 9})
+    mongo_db.excel_data_chunks.insert_many([
+        {
+            "file_hash": "h1",
+            "chunk_index": chunk,
+            "chunk_data": [
+                {"seat": str(1000 + chunk * 3 + i), "name": f"طالب {chunk * 3 + i}" if i else "", "math": 50 + i, "science": 70}
+                for i in range(3)
+            ],
+        }
+        for chunk in range(3)
+    ])
+
+    def run(scenario):
+        async def main():
+            client = AsyncIOMotorClient(os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017"))
+            monkeypatch.setattr(server, "db", client[mongo_db.name])
+            monkeypatch.setattr(server, "jobs_db", client[mongo_db.name])
+            try:
+                return await scenario(IngestionWorker(poll_seconds=0.1, heartbeat_seconds=0.05, stale_seconds=30, max_attempts=2))
+            finally:
+                client.close()
+
+        return asyncio.run(main())
+
+    return mongo_db, run
+
+
+def insert_job(mongo_db, **fields):
+    job = IngestionJob(file_hash="h1", mapping=MAPPING, created_by="admin", total_rows=9).dict()
+    job.update(fields)
+    mongo_db.ingestion_jobs.insert_one(job)
+    return job["id"]
+
+
+def test_worker_processes_queued_job_in_batches(jobs_env):
+    mongo_db, run = jobs_env
+    job_id = insert_job(mongo_db)
+
+    async def scenario(worker):
+        await worker.run(await worker.claim())
+        return await worker.claim()
+
+    assert run(scenario) is None
+    job = mongo_db.ingestion_jobs.find_one({"id": job_id})
+    assert job["status"] == "completed"
+    assert (job["rows_done"], job["rows_failed"], job["processed_count"], job["chunks_done"]) == (9, 3, 6, 3)
+    assert job["errors"] == ["الصف 1: بيانات ناقصة", "الصف 4: بيانات ناقصة", "الصف 7: بيانات ناقصة"]
+    assert mongo_db.students.count_documents({}) == 6
+
+
+def test_stale_running_job_resumes_from_last_chunk(jobs_env):
+    mongo_db, run = jobs_env
+    long_ago = datetime.utcnow() - timedelta(minutes=10)
+    job_id = insert_job(
+        mongo_db, status="running", worker_id="dead", heartbeat_at=long_ago, attempts=1,
+        rows_done=6, rows_failed=2, processed_count=4, chunks_done=2
+    )
+
+    async def scenario(worker):
+        await worker.run(await worker.claim())
+
+    run(scenario)
+    job = mongo_db.ingestion_jobs.find_one({"id": job_id})
+    assert job["status"] == "completed" and job["attempts"] == 2
+    assert (job["rows_done"], job["processed_count"], job["chunks_done"]) == (9, 6, 3)
+    assert sorted(student["student_id"] for student in mongo_db.students.find()) == ["1007", "1008"]
+
+
+def test_cancel_requested_job_stops_without_writing(jobs_env):
+    mongo_db, run = jobs_env
+    job_id = insert_job(mongo_db, status="running", worker_id="dead", heartbeat_at=datetime.utcnow() - timedelta(minutes=10), cancel_requested=True)
+
+    async def scenario(worker):
+        await worker.run(await worker.claim())
+
+    run(scenario)
+    assert mongo_db.ingestion_jobs.find_one({"id": job_id})["status"] == "cancelled"
+    assert mongo_db.students.count_documents({}) == 0
+
+
+def test_worker_reads_columnar_upload_data_from_gridfs(jobs_env, tmp_path):
+    import gridfs
+
+    mongo_db, run = jobs_env
+    source = tmp_path / "students.csv"
+    source.write_text("seat,name,math,science,notes\n2001,منى,90,80,x\n2002,,70,60,y\n2003,علي,50,40,z\n", encoding="utf-8")
+    data_path = tmp_path / "students.parquet"
+    server.stage_excel_upload(str(source), "csv", str(data_path))
+    mongo_db.excel_files.insert_one({"file_hash": "h2", "columns": ["seat", "name", "math", "science", "notes"], "total_rows": 3})
+    gridfs.GridFSBucket(mongo_db, bucket_name=server.UPLOAD_DATA_BUCKET).upload_from_stream("h2", data_path.read_bytes())
+    job_id = insert_job(mongo_db, file_hash="h2", total_rows=3)
+
+    async def scenario(worker):
+        await worker.run(await worker.claim())
+
+    run(scenario)
+    job = mongo_db.ingestion_jobs.find_one({"id": job_id})
+    assert job["status"] == "completed"
+    assert (job["rows_done"], job["rows_failed"], job["processed_count"], job["chunks_done"]) == (3, 1, 2, 1)
+    assert sorted(student["student_id"] for student in mongo_db.students.find()) == ["2001", "2003"]
+
+
+def test_upload_data_is_streamed_to_a_temporary_file(jobs_env, tmp_path):
+    import gridfs
+
+    mongo_db, run = jobs_env
+    source = tmp_path / "students.csv"
+    source.write_text("seat,name,math\n" + "".join(f"{3000 + i},طالب {i},{i % 100}\n" for i in range(2500)), encoding="utf-8")
+    data_path = tmp_path / "students.parquet"
+    server.stage_excel_upload(str(source), "csv", str(data_path))
+    gridfs.GridFSBucket(mongo_db, bucket_name=server.UPLOAD_DATA_BUCKET, chunk_size_bytes=4096).upload_from_stream(
+        "h3", data_path.read_bytes()
+    )
+
+    async def scenario(worker):
+        async with server.upload_data_file("h3") as downloaded:
+            copy = Path(downloaded).read_bytes()
+            row_groups = [len(frame) async for frame in server.iter_uploaded_frames("h3", ["seat"], start_chunk=1)]
+        async with server.upload_data_file("missing") as absent:
+            pass
+        return downloaded, copy, row_groups, absent
+
+    downloaded, copy, row_groups, absent = run(scenario)
+    assert copy == data_path.read_bytes()
+    assert not Path(downloaded).exists()
+    assert row_groups == [1000, 500] and absent is None
+
+
+def test_reimport_writes_only_changed_rows_and_removes_missing_students(jobs_env):
+    mongo_db, run = jobs_env
+    insert_job(mongo_db, educational_stage_id="s1")
+
+    async def scenario(worker):
+        await worker.run(await worker.claim())
+
+    run(scenario)
+    first_write = {student["student_id"]: student["id"] for student in mongo_db.students.find()}
+    mongo_db.students.insert_one({"student_id": "other-stage", "name": "س", "educational_stage_id": "s2"})
+
+    # ملف مصحح: 1001 تغيرت درجته، 1002 حُذف، 1009 جديد، والباقي كما هو
+    rows = [
+        {"seat": "1001", "name": "طالب 1", "math": 99, "science": 70},
+        {"seat": "1004", "name": "طالب 4", "math": 51, "science": 70},
+        {"seat": "1005", "name": "طالب 5", "math": 52, "science": 70},
+        {"seat": "1007", "name": "طالب 7", "math": 51, "science": 70},
+        {"seat": "1008", "name": "طالب 8", "math": 52, "science": 70},
+        {"seat": "1009", "name": "طالب 9", "math": 60, "science": 70},
+    ]
+    mongo_db.excel_files.insert_one({"file_hash": "h3", "columns": ["seat", "name", "math", "science"], "total_rows": 6})
+    mongo_db.excel_data_chunks.insert_one({"file_hash": "h3", "chunk_index": 0, "chunk_data": rows})
+    job_id = insert_job(mongo_db, file_hash="h3", total_rows=6, educational_stage_id="s1", delete_missing=True)
+
+    run(scenario)
+    job = mongo_db.ingestion_jobs.find_one({"id": job_id})
+    assert job["status"] == "completed"
+    assert (job["added_count"], job["changed_count"], job["unchanged_count"], job["removed_count"]) == (1, 1, 4, 1)
+    assert job["processed_count"] == 6
+
+    students = {student["student_id"]: student for student in mongo_db.students.find()}
+    assert sorted(students) == ["1001", "1004", "1005", "1007", "1008", "1009", "other-stage"]
+    assert students["1004"]["id"] == first_write["1004"]  # غير المتغير لم يُعد كتابته
+    assert students["1001"]["id"] != first_write["1001"]
@@ -0,0 +1,73 @@
+from server import build_name_search_fields, fuzzy_name_pipeline, name_search_clause, normalize_arabic_name
+
+
+def test_normalize_arabic_name_unifies_letter_variants_and_tashkeel():
+    assert normalize_arabic_name("أَحْمَد  إبراهيم") == normalize_arabic_name("احمد ابراهيم")
+    assert normalize_arabic_name("فاطمة") == normalize_arabic_name("فاطمه")
+    assert normalize_arabic_name("مصطفى") == normalize_arabic_name("مصطفي")
+    assert normalize_arabic_name("عبـــدالله") == "عبدالله"
+
+
+def test_search_fields_contain_token_prefixes():
+    fields = build_name_search_fields("أحمد علي")
+    assert fields["name_normalized"] == "احمد علي"
+    assert {"اح", "احم", "احمد", "عل", "علي"} == set(fields["name_prefixes"])
+
+
+def test_name_clause_matches_stored_prefixes():
+    stored = set(build_name_search_fields("فاطمة الزهراء محمود")["name_prefixes"])
+    clause = name_search_clause("فاطمه محم")
+    assert set(clause["name_prefixes"]["$all"]) <= stored
+    assert name_search_clause("   ") is None
+    assert name_search_clause("ف") == {"name_normalized": {"$regex": "^ف"}}
+
+
+def test_name_clause_uses_prefix_index(mongo_db, plan_stages):
+    mongo_db.students.create_index([("name_prefixes", 1)])
+    mongo_db.students.insert_many([
+        {"student_id": str(i), **build_name_search_fields(f"طالب رقم{i} احمد")} for i in range(300)
+    ])
+    explain = mongo_db.students.find(name_search_clause("أحمد")).limit(50).explain()
+    assert "IXSCAN" in plan_stages(explain)
+    assert "COLLSCAN" not in plan_stages(explain)
+
+
+def test_trigrams_are_padded_per_token():
+    fields = build_name_search_fields("أحمد علي")
+    assert set(fields["name_trigrams"]) == {" اح", "احم", "حمد", "مد ", " عل", "علي", "لي "}
+
+
+def test_fuzzy_search_ranks_misspelled_names_by_similarity(mongo_db):
+    mongo_db.students.create_index([("name_trigrams", 1)])
+    names = ["محمد احمد ابراهيم", "محمود احمد ابراهيم", "سارة علي حسن", "محمد عبد الرحمن"]
+    mongo_db.students.insert_many([
+        {"student_id": str(i), "region": "القاهرة" if i != 3 else "الجيزة", **build_name_search_fields(name)}
+        for i, name in enumerate(names)
+    ])
+
+    hits = list(mongo_db.students.aggregate(fuzzy_name_pipeline("محمد احمد ابرهيم", {"region": "القاهرة"})))
+    assert [hit["student_id"] for hit in hits][:2] == ["0", "1"]
+    assert "2" not in {hit["student_id"] for hit in hits}
+    assert "name_trigrams" not in hits[0]
+    assert fuzzy_name_pipeline("   ", {}) is None
+
+
+def test_fuzzy_candidates_are_chosen_by_shared_trigrams_before_the_limit():
+    pipeline = fuzzy_name_pipeline("محمد احمد", {})
+    stages = [next(iter(stage)) for stage in pipeline]
+    assert stages.index("$sort") < stages.index("$limit")
+    assert pipeline[stages.index("$sort")]["$sort"] == {"shared": -1, "student_id": 1}
+
+
+def test_fuzzy_search_keeps_the_best_match_past_the_candidate_limit(mongo_db, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "FUZZY_CANDIDATE_LIMIT", 20)
+    mongo_db.students.create_index([("name_trigrams", 1)])
+    # مرشحون كثيرون يشاركون trigram واحداً ويسبقون الأفضل في ترتيب رقم الجلوس
+    mongo_db.students.insert_many([
+        {"student_id": f"{i:04d}", **build_name_search_fields(f"محمد {i}")} for i in range(200)
+    ] + [{"student_id": "9999", **build_name_search_fields("محمد احمد ابراهيم")}])
+
+    hits = list(mongo_db.students.aggregate(server.fuzzy_name_pipeline("محمد احمد ابرهيم", {})))
+    assert hits[0]["student_id"] == "9999"
@@ -0,0 +1,57 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from server import cached_count_with_source, decode_page_cursor, encode_page_cursor, keyset_after_descending
+
+
+def test_cursor_round_trips_datetimes_and_ids():
+    created = datetime(2024, 5, 1, 12, 30, 15, 250000)
+    cursor = encode_page_cursor(created, "abc-123")
+    assert "=" not in cursor
+    assert decode_page_cursor(cursor, 2) == [created, "abc-123"]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!!", encode_page_cursor("only-one")])
+def test_malformed_cursor_is_a_client_error(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_page_cursor(cursor, 2)
+    assert exc_info.value.status_code == 400
+
+
+def test_keyset_condition_breaks_ties_on_id():
+    created = datetime(2024, 5, 1)
+    assert keyset_after_descending("created_at", created, "m") == {"$or": [
+        {"created_at": {"$lt": created}},
+        {"created_at": created, "id": {"$lt": "m"}},
+    ]}
+
+
+class CountingCollection:
+    name = "students_count_test"
+
+    def __init__(self):
+        self.exact_counts = 0
+
+    async def estimated_document_count(self):
+        return 1000
+
+    async def count_documents(self, query):
+        self.exact_counts += 1
+        return 40
+
+
+def test_total_is_an_estimate_only_when_the_cached_or_metadata_count_is_used():
+    collection = CountingCollection()
+
+    async def scenario():
+        return [
+            await cached_count_with_source(collection, {}),
+            await cached_count_with_source(collection, {"region": "القاهرة"}),
+            await cached_count_with_source(collection, {"region": "القاهرة"}),
+        ]
+
+    assert asyncio.run(scenario()) == [(1000, True), (40, False), (40, True)]
+    assert collection.exact_counts == 1
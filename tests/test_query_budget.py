@@ -0,0 +1,50 @@
+import asyncio
+
+import pymongo
+from fastapi import HTTPException
+from pymongo.errors import AutoReconnect, ExecutionTimeout
+
+from server import is_query_timeout, public_query_budget_ms, service_busy_response, start_background_task
+
+
+def test_budgets_apply_to_public_paths_only():
+    assert public_query_budget_ms("/api/search/suggestions") == 300
+    assert public_query_budget_ms("/api/search") == 1000
+    assert public_query_budget_ms("/api/student/12345/page") == 1000
+    assert public_query_budget_ms("/api/faq") == 1500
+    assert public_query_budget_ms("/api/admin/process-excel") is None
+    assert public_query_budget_ms("/docs") is None
+
+
+def test_timeouts_are_detected_through_handler_wrapping():
+    try:
+        try:
+            raise ExecutionTimeout("operation exceeded time limit", 50)
+        except Exception:
+            raise HTTPException(status_code=500, detail="خطأ في البحث")
+    except HTTPException as wrapped:
+        assert is_query_timeout(wrapped)
+
+    assert not is_query_timeout(HTTPException(status_code=404))
+    assert not is_query_timeout(AutoReconnect("connection reset"))
+
+
+def test_timeout_response_asks_clients_to_retry_later():
+    response = service_busy_response()
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) > 0
+
+
+def test_background_tasks_do_not_inherit_the_request_budget():
+    async def remaining():
+        return pymongo._csot.remaining()
+
+    async def main():
+        with pymongo.timeout(0.3):
+            inherited = await asyncio.ensure_future(remaining())
+            detached = await start_background_task(remaining())
+        return inherited, detached
+
+    inherited, detached = asyncio.run(main())
+    assert inherited is not None and inherited <= 0.3
+    assert detached is None
@@ -0,0 +1,126 @@
+"""كل شكل استعلام متكرر في server.py يجب أن يُخدم من فهرس في INDEX_CATALOG بدون COLLSCAN أو SORT في الذاكرة"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from server import INDEX_CATALOG, name_search_clause, student_id_prefix_range
+
+NOW = datetime(2024, 7, 1)
+
+# (المجموعة، الفلتر، الترتيب) كما تُرسل من نقاط النهاية
+QUERY_SHAPES = {
+    # البحث والنتائج
+    "student by seat number": ("students", {"student_id": "100123"}, None),
+    "seat number prefix": ("students", {"student_id": student_id_prefix_range("1001"), "educational_stage_id": "s1"}, [("student_id", 1)]),
+    "fuzzy name candidates": ("students", {"name_trigrams": {"$in": [" مح", "محم", "حمد"]}, "region": "القاهرة"}, None),
+    "name prefix": ("students", {**name_search_clause("محمد"), "region": "القاهرة"}, [("student_id", 1)]),
+    "search by class": ("students", {"class_name": "3/1"}, [("student_id", 1)]),
+    "search by section": ("students", {"section": "علمي"}, [("student_id", 1)]),
+    # قوائم الأدمن
+    "admin students by stage": ("students", {"educational_stage_id": "s1", "student_id": {"$gt": "100050"}}, [("student_id", 1)]),
+    "admin students by region": ("students", {"region": "الجيزة"}, [("student_id", 1)]),
+    "admin students by stage and region": ("students", {"educational_stage_id": "s1", "region": "الجيزة"}, [("student_id", 1)]),
+    # المدارس والتحليلات ($match في الـ pipelines)
+    "school students": ("students", {"school_name": "مدرسة 3"}, [("average", -1)]),
+    "school students by stage": ("students", {"school_name": "مدرسة 3", "educational_stage_id": "s1", "region": "القاهرة"}, [("average", -1)]),
+    "schools summary by stage": ("students", {"educational_stage_id": "s1"}, None),
+    "schools summary by stage and region": ("students", {"educational_stage_id": "s1", "region": "القاهرة", "administration": "إدارة 1"}, None),
+    "schools summary by region": ("students", {"region": "القاهرة", "administration": "إدارة 1"}, None),
+    "schools summary by administration": ("students", {"administration": "إدارة 1"}, None),
+    "stage schools": ("students", {"educational_stage_id": "s1", "school_name": {"$nin": [None, ""]}}, None),
+    "region schools": ("students", {"region": "القاهرة", "school_name": {"$nin": [None, ""]}}, None),
+    # المشتركون والإشعارات
+    "subscriber by email": ("subscribers", {"email": "user5@example.com"}, None),
+    "subscribers page": ("subscribers", {"subscription_date": {"$lt": NOW}}, [("subscription_date", -1), ("id", -1)]),
+    "notification targets by stage": ("subscribers", {"is_active": True, "educational_stage": "s1", "notification_preferences.results": True}, None),
+    "notification targets by region": ("subscribers", {"is_active": True, "region": "القاهرة"}, None),
+    "notifications page": ("notifications", {"created_at": {"$lt": NOW}}, [("created_at", -1), ("id", -1)]),
+    "notifications by status": ("notifications", {"status": "sent"}, [("created_at", -1), ("id", -1)]),
+    "notification by id": ("notifications", {"id": "n5"}, None),
+    # مهام الاستيراد
+    "ingestion queue": ("ingestion_jobs", {"status": "queued"}, [("created_at", 1)]),
+    "stale ingestion jobs": ("ingestion_jobs", {"status": "running", "heartbeat_at": {"$lt": NOW}}, [("created_at", 1)]),
+    "ingestion job by id": ("ingestion_jobs", {"id": "j5"}, None),
+    "ingestion jobs page": ("ingestion_jobs", {}, [("created_at", -1)]),
+    # محتوى الموقع
+    "homepage blocks": ("page_blocks", {"id": {"$nin": ["b1"]}, "is_visible": True}, [("order_index", 1)]),
+    "admin blocks": ("page_blocks", {"block_type": "text"}, [("order_index", 1)]),
+    "faq": ("faq", {"is_active": True}, [("order", 1)]),
+    "guides": ("educational_guides", {"is_active": True, "category": "c1"}, [("is_featured", -1), ("order", 1)]),
+    "guide by id": ("educational_guides", {"id": "g5", "is_active": True}, None),
+    "news": ("news_articles", {"is_published": True, "is_featured": True}, [("is_featured", -1), ("published_at", -1)]),
+    "article by id": ("news_articles", {"id": "a5", "is_published": True}, None),
+    "active stages": ("educational_stages", {"is_active": True}, [("display_order", 1)]),
+}
+
+
+@pytest.fixture
+def seeded_db(mongo_db):
+    for collection, keys, options in INDEX_CATALOG:
+        mongo_db[collection].create_index(keys, **options)
+
+    regions = ["القاهرة", "الجيزة", "الإسكندرية"]
+    mongo_db.students.insert_many([
+        {
+            "student_id": str(100000 + i),
+            "name": f"محمد أحمد {i}",
+            "name_prefixes": ["م", "مح", "محم", "محمد", "ا", "اح", "احم", "احمد"],
+            "educational_stage_id": f"s{i % 3}",
+            "region": regions[i % 3],
+            "administration": f"إدارة {i % 5}",
+            "school_name": f"مدرسة {i % 20}",
+            "average": (i * 7) % 100,
+            "class_name": f"3/{i % 8}",
+            "section": ["علمي", "أدبي"][i % 2],
+        }
+        for i in range(600)
+    ])
+    mongo_db.subscribers.insert_many([
+        {
+            "id": f"u{i}", "email": f"user{i}@example.com", "is_active": i % 4 != 0, "is_verified": i % 2 == 0,
+            "educational_stage": f"s{i % 3}", "region": regions[i % 3],
+            "notification_preferences": {"results": True}, "subscription_date": NOW - timedelta(hours=i),
+        }
+        for i in range(300)
+    ])
+    mongo_db.notifications.insert_many([
+        {"id": f"n{i}", "status": ["draft", "sent"][i % 2], "created_at": NOW - timedelta(hours=i)}
+        for i in range(300)
+    ])
+    mongo_db.ingestion_jobs.insert_many([
+        {
+            "id": f"j{i}", "status": ["queued", "running", "completed"][i % 3],
+            "created_at": NOW - timedelta(minutes=i), "heartbeat_at": NOW - timedelta(minutes=i),
+        }
+        for i in range(100)
+    ])
+    mongo_db.page_blocks.insert_many([
+        {"id": f"b{i}", "block_type": ["text", "image"][i % 2], "is_visible": True, "order_index": i}
+        for i in range(100)
+    ])
+    mongo_db.faq.insert_many([{"id": f"f{i}", "is_active": True, "order": i} for i in range(100)])
+    mongo_db.educational_guides.insert_many([
+        {"id": f"g{i}", "is_active": True, "category": f"c{i % 4}", "is_featured": i % 10 == 0, "order": i}
+        for i in range(100)
+    ])
+    mongo_db.news_articles.insert_many([
+        {"id": f"a{i}", "is_published": True, "is_featured": i % 10 == 0, "published_at": NOW - timedelta(days=i)}
+        for i in range(100)
+    ])
+    mongo_db.educational_stages.insert_many([
+        {"id": f"s{i}", "name": f"مرحلة {i}", "is_active": True, "display_order": i} for i in range(30)
+    ])
+    return mongo_db
+
+
+@pytest.mark.parametrize("shape", sorted(QUERY_SHAPES))
+def test_query_shape_is_served_by_an_index(seeded_db, plan_stages, shape):
+    collection, query, sort = QUERY_SHAPES[shape]
+    cursor = seeded_db[collection].find(query).limit(50)
+    if sort:
+        cursor = cursor.sort(sort)
+    stages = plan_stages(cursor.explain())
+
+    assert "COLLSCAN" not in stages, stages
+    assert "SORT" not in stages, stages
+    assert any(stage in ("IXSCAN", "EXPRESS_IXSCAN", "IDHACK") for stage in stages), stages
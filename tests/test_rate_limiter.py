@@ -0,0 +1,113 @@
+import pytest
+from starlette.responses import PlainTextResponse
+from starlette.testclient import TestClient
+
+import server
+from server import ClientAddressResolver, RateLimiter, RateLimitMiddleware, SystemSettings, rate_limit_route
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    return now
+
+
+def make_limiter(**settings):
+    limiter = RateLimiter(max_clients=1000, sync_seconds=5, block_threshold=100)
+    limiter.configure(SystemSettings(**{"rate_limit_enabled": True, **settings}).dict())
+    return limiter
+
+
+def http_scope(peer, headers=()):
+    return {"client": (peer, 1234), "headers": [(name.encode(), value.encode()) for name, value in headers]}
+
+
+def test_limiting_and_block_escalation_are_opt_in():
+    settings = SystemSettings()
+    assert settings.rate_limit_enabled is False
+    assert settings.rate_limit_block_minutes == 0
+
+
+def test_routes_are_classified_by_prefix():
+    assert rate_limit_route("/api/student/123") == ("lookup", 1)
+    assert rate_limit_route("/api/students/batch") == ("lookup", 10)
+    assert rate_limit_route("/api/search/suggestions") == ("suggest", 1)
+    assert rate_limit_route("/api/search") == ("search", 1)
+    assert rate_limit_route("/api/faq") == ("default", 1)
+    assert rate_limit_route("/api/admin/students") is None
+
+
+def test_bucket_allows_burst_then_refills(clock):
+    limiter = make_limiter(rate_limit_lookup_per_minute=60, rate_limit_burst=3)
+    assert [limiter.check("1.1.1.1", "lookup") for _ in range(3)] == [None, None, None]
+    assert limiter.check("1.1.1.1", "lookup") == pytest.approx(1.0)
+    # عميل آخر وفئة أخرى لهما رصيد مستقل
+    assert limiter.check("2.2.2.2", "lookup") is None
+    assert limiter.check("1.1.1.1", "search") is None
+
+    clock[0] += 2
+    assert limiter.check("1.1.1.1", "lookup") is None
+    assert limiter.check("1.1.1.1", "lookup") is None
+    assert limiter.check("1.1.1.1", "lookup") is not None
+
+
+def test_expensive_routes_consume_more_tokens(clock):
+    limiter = make_limiter(rate_limit_lookup_per_minute=60, rate_limit_burst=20)
+    assert limiter.check("1.1.1.1", "lookup", 10) is None
+    assert limiter.check("1.1.1.1", "lookup", 10) is None
+    assert limiter.check("1.1.1.1", "lookup", 10) == pytest.approx(10.0)
+
+
+def test_trusted_and_disabled_clients_are_not_limited(clock):
+    limiter = make_limiter(rate_limit_search_per_minute=1, rate_limit_burst=1, rate_limit_trusted_ips=["10.0.0.1"])
+    assert all(limiter.check("10.0.0.1", "search") is None for _ in range(10))
+    limiter.configure(SystemSettings(rate_limit_enabled=False).dict())
+    assert all(limiter.check("3.3.3.3", "search") is None for _ in range(10))
+
+
+def test_middleware_throttles_before_the_app_runs():
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["path"])
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    limiter = make_limiter(rate_limit_lookup_per_minute=1, rate_limit_burst=2)
+    resolver = ClientAddressResolver(trust_peer_address=True)
+    client = TestClient(RateLimitMiddleware(app, limiter=limiter, resolver=resolver))
+    statuses = [client.get("/api/student/1").status_code for _ in range(3)]
+    throttled = client.get("/api/student/2")
+
+    assert statuses == [200, 200, 429]
+    assert throttled.status_code == 429
+    assert int(throttled.headers["Retry-After"]) >= 1
+    assert calls == ["/api/student/1", "/api/student/1"]
+    assert client.get("/api/admin/students").status_code == 200
+
+
+def test_unconfigured_client_address_never_limits_the_shared_proxy():
+    async def app(scope, receive, send):
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    limiter = make_limiter(rate_limit_lookup_per_minute=1, rate_limit_burst=1)
+    client = TestClient(RateLimitMiddleware(app, limiter=limiter, resolver=ClientAddressResolver()))
+    assert [client.get("/api/student/1").status_code for _ in range(5)] == [200] * 5
+    assert limiter.stats()["tracked_buckets"] == 0
+
+
+def test_client_header_is_only_trusted_from_configured_proxies():
+    cloudflare = ClientAddressResolver("CF-Connecting-IP", "173.245.48.0/20")
+    assert cloudflare.resolve(http_scope("173.245.48.7", [("cf-connecting-ip", "41.33.1.2")])) == "41.33.1.2"
+    # اتصال مباشر يتجاوز الـ proxy: الترويسة مزورة ويُستخدم عنوان الاتصال
+    assert cloudflare.resolve(http_scope("5.6.7.8", [("cf-connecting-ip", "41.33.1.2")])) == "5.6.7.8"
+    # طلب من الـ proxy بلا ترويسة: لا نحدد معدل الـ proxy نفسه
+    assert cloudflare.resolve(http_scope("173.245.48.7")) is None
+
+
+def test_forwarded_for_uses_the_nearest_untrusted_hop():
+    nginx = ClientAddressResolver("x-forwarded-for", "10.0.0.0/8, 127.0.0.1")
+    spoofed = [("x-forwarded-for", "1.2.3.4, 41.33.1.2, 10.0.0.5")]
+    assert nginx.resolve(http_scope("127.0.0.1", spoofed)) == "41.33.1.2"
+    assert nginx.resolve(http_scope("127.0.0.1", [("x-forwarded-for", "10.0.0.9")])) is None
+    assert not ClientAddressResolver("x-forwarded-for").configured
@@ -0,0 +1,35 @@
+import json
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+
+from server import Student, build_name_search_fields, serialize_student_document
+
+
+def stored_student_document():
+    student = Student(
+        student_id="123456",
+        name="أحمد محمد",
+        subjects=[{"name": f"مادة {i}", "score": 50 + i * 4.5} for i in range(10)],
+        school_name="مدرسة النصر",
+    )
+    return {
+        "_id": "ObjectId",
+        **student.dict(),
+        "processed_by": "admin",
+        "processed_at": datetime(2025, 7, 1, 10, 30, 0, 123000),
+        **build_name_search_fields(student.name),
+    }
+
+
+def test_read_model_matches_validated_model_output():
+    document = stored_student_document()
+    expected = jsonable_encoder(Student(**document))
+    assert json.loads(serialize_student_document(document)) == expected
+
+
+def test_read_model_fills_defaults_for_missing_fields():
+    document = {"id": "x", "student_id": "1", "name": "علي"}
+    result = json.loads(serialize_student_document(document))
+    assert result["subjects"] == [] and result["additional_info"] == {}
+    assert "processed_by" not in result and "name_prefixes" not in result
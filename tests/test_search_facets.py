@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+from fastapi.testclient import TestClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.requests import Request
+
+import server
+from server import SEARCH_FACETS, FacetSearchRequest, build_name_search_fields, search_facets_pipeline
+
+
+def test_pipeline_has_one_facet_per_dimension():
+    pipeline = search_facets_pipeline({"region": "القاهرة"}, hits_limit=10)
+    assert pipeline[0] == {"$match": {"region": "القاهرة"}}
+    facets = pipeline[1]["$facet"]
+    assert set(facets) == {"hits", "total"} | {name for name, _, _ in SEARCH_FACETS}
+    assert {"$limit": 10} in facets["hits"]
+
+
+def test_facet_counts_follow_the_filters(mongo_db):
+    mongo_db.students.insert_many([
+        {
+            "student_id": str(i),
+            "educational_stage_id": "s1" if i < 6 else "s2",
+            "region": "القاهرة" if i % 2 else "الجيزة",
+            "administration": "",
+            "school_name": f"مدرسة {i % 3}",
+            **build_name_search_fields(f"طالب {i}"),
+        }
+        for i in range(10)
+    ])
+
+    (result,) = mongo_db.students.aggregate(search_facets_pipeline({"educational_stage_id": "s1"}, hits_limit=4))
+    assert result["total"] == [{"count": 6}]
+    assert [hit["student_id"] for hit in result["hits"]] == ["0", "1", "2", "3"]
+    assert "name_trigrams" not in result["hits"][0]
+    assert result["stages"] == [{"_id": "s1", "count": 6}]
+    assert sorted((bucket["_id"], bucket["count"]) for bucket in result["regions"]) == [("الجيزة", 3), ("القاهرة", 3)]
+    assert result["administrations"] == []
+    assert sum(bucket["count"] for bucket in result["schools"]) == 6
+
+
+def test_unfiltered_or_paged_facet_requests_are_rejected(monkeypatch):
+    monkeypatch.setattr(server, "db", None)  # الرفض قبل أي استعلام
+    client = TestClient(server.app)
+    assert client.post("/api/search/facets", json={}).status_code == 400
+    assert client.post("/api/search/facets", json={"query": "   "}).status_code == 400
+    assert client.post("/api/search/facets", json={"query": "منى", "cursor": "abc"}).status_code == 422
+
+
+def test_facet_etag_changes_once_ranks_are_written(mongo_db, monkeypatch):
+    mongo_db.students.insert_many([
+        {"student_id": str(i), "educational_stage_id": "s1", "average": float(90 - i), "ranks": {}}
+        for i in range(3)
+    ])
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017"))
+        monkeypatch.setattr(server, "db", client[mongo_db.name])
+        monkeypatch.setattr(server, "jobs_db", client[mongo_db.name])
+        server.search_facets_cache.clear()
+
+        async def facets():
+            response = await server.search_facets(
+                FacetSearchRequest(educational_stage_id="s1"),
+                Request({"type": "http", "method": "POST", "path": "/api/search/facets", "headers": []})
+            )
+            return response.headers["etag"], server.json.loads(response.body)
+
+        try:
+            # الاستيراد يرفع النسخة قبل حساب الترتيب
+            await server.bump_content_version("students")
+            before = await facets()
+            await server.update_student_ranks()
+            return before, await facets()
+        finally:
+            client.close()
+
+    (etag_before, body_before), (etag_after, body_after) = asyncio.run(scenario())
+    assert body_before["students"][0]["ranks"] == {}
+    assert etag_after != etag_before
+    assert body_after["students"][0]["ranks"]["stage"] == {"rank": 1, "out_of": 3}
@@ -0,0 +1,114 @@
+import asyncio
+import os
+from datetime import datetime
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+from server import BloomFilter, SeatNumberFilter
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(capacity=20000, error_rate=0.01)
+    for i in range(20000):
+        bloom.add(str(100000 + i))
+    assert all(str(100000 + i) in bloom for i in range(20000))
+    false_positives = sum(str(900000 + i) in bloom for i in range(20000))
+    assert false_positives / 20000 < 0.02
+    assert bloom.estimated_false_positive_rate() < 0.02
+
+
+def test_seat_number_filter_rejects_and_caches_false_positives():
+    seat_filter = SeatNumberFilter(error_rate=0.01, negative_ttl_seconds=60, negative_max_entries=10, refresh_seconds=5)
+    assert not seat_filter.definitely_absent("1")  # غير جاهز: لا رفض
+
+    seat_filter._bloom = BloomFilter(capacity=100, error_rate=0.01)
+    seat_filter.add(["1", "2"])
+    assert not seat_filter.definitely_absent("1")
+    assert seat_filter.definitely_absent("does-not-exist")
+
+    # رقم مر من الفلتر ولم يوجد في قاعدة البيانات
+    seat_filter.record_missing("2")
+    assert seat_filter.definitely_absent("2")
+    seat_filter.add(["2"])  # استيراد لاحق يزيله من الكاش السلبي
+    assert not seat_filter.definitely_absent("2")
+
+    stats = seat_filter.stats()
+    assert stats["ready"] and stats["false_positives"] == 1
+    assert stats["memory_bytes"] > 0
+
+
+def test_other_workers_stop_rejecting_while_an_import_is_running(mongo_db, monkeypatch):
+    mongo_db.students.insert_one({"student_id": "1001"})
+    mongo_db.content_versions.insert_one({"_id": "students", "updated_at": datetime(2025, 7, 1)})
+
+    async def scenario():
+        client = AsyncIOMotorClient(os.environ.get("MONGO_TEST_URL", "mongodb://localhost:27017"))
+        monkeypatch.setattr(server, "db", client[mongo_db.name])
+        monkeypatch.setattr(server, "jobs_db", client[mongo_db.name])
+        # العامل المستورد والعامل الآخر يحمل كل منهما فلتره
+        importing, other = (
+            SeatNumberFilter(error_rate=0.001, negative_ttl_seconds=60, negative_max_entries=10, refresh_seconds=5)
+            for _ in range(2)
+        )
+        try:
+            for seat_filter in (importing, other):
+                await seat_filter.refresh()
+            assert other.definitely_absent("2001")
+
+            # مهمة تعمل وقد كتبت أول دفعة، ولم تنته بعد
+            await server.jobs_db.ingestion_jobs.insert_one({"id": "j1", "status": "running"})
+            await server.db.students.insert_one({"student_id": "2001"})
+            importing.add(["2001"])
+            await other.refresh()
+            during = other.definitely_absent("2001"), other.definitely_absent("9999")
+
+            await server.jobs_db.ingestion_jobs.update_one({"id": "j1"}, {"$set": {"status": "completed"}})
+            await server.bump_content_version("students")
+            await other.refresh()
+            after = other.definitely_absent("2001"), other.definitely_absent("9999")
+            return during, after
+        finally:
+            client.close()
+
+    during, after = asyncio.run(scenario())
+    assert during == (False, False)
+    assert after == (False, True)
+
+
+class FakeVersions:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def find_one(self, query, projection=None):
+        return self.documents.get(query.get("_id", query.get("status")))
+
+
+class FakeDb:
+    def __init__(self, versions, jobs):
+        self.content_versions = FakeVersions(versions)
+        self.ingestion_jobs = FakeVersions(jobs)
+
+
+def test_student_version_change_clears_the_result_cache_of_this_worker(monkeypatch):
+    versions = {"students": {"updated_at": datetime(2025, 7, 1), "revision": 1}}
+    fake_db = FakeDb(versions, {"running": {"_id": 1}})  # مهمة جارية: لا إعادة بناء للفلتر
+    monkeypatch.setattr(server, "db", fake_db)
+    monkeypatch.setattr(server, "jobs_db", fake_db)
+    seat_filter = SeatNumberFilter(error_rate=0.01, negative_ttl_seconds=60, negative_max_entries=10, refresh_seconds=5)
+    server.student_result_cache.clear()
+
+    def cached(student_id):
+        return server.student_result_cache.get(student_id) is not None
+
+    async def scenario():
+        await seat_filter.refresh()
+        server.cache_student_result({"student_id": "1001", "name": "منى", "processed_at": datetime(2025, 7, 1)})
+        await seat_filter.refresh()  # النسخة نفسها: يبقى الكاش
+        kept = cached("1001")
+        # عامل آخر كتب ترتيباً أو حذف طلاباً
+        versions["students"] = {"updated_at": datetime(2025, 7, 1), "revision": 2}
+        await seat_filter.refresh()
+        return kept, cached("1001")
+
+    assert asyncio.run(scenario()) == (True, False)
@@ -0,0 +1,61 @@
+import asyncio
+
+from server import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        executions = 0
+
+        async def fetch():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0.01)
+            return {"student_id": "1"}
+
+        results = await asyncio.gather(*(flight.do("1", fetch) for _ in range(20)))
+        return flight, executions, results
+
+    flight, executions, results = asyncio.run(scenario())
+    assert executions == 1
+    assert all(result == {"student_id": "1"} for result in results)
+    stats = flight.stats()
+    assert stats["coalesced"] == 19 and stats["in_flight"] == 0
+
+
+def test_errors_propagate_to_all_waiters_and_are_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        results = await asyncio.gather(*(flight.do("1", failing) for _ in range(3)), return_exceptions=True)
+
+        async def ok():
+            return "ok"
+
+        return results, await flight.do("1", ok)
+
+    results, retry = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retry == "ok"
+
+
+def test_cancelled_caller_does_not_cancel_shared_fetch():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("1", fetch))
+        second = asyncio.ensure_future(flight.do("1", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
@@ -0,0 +1,47 @@
+import time
+
+from server import CachedResult, StudentResultCache
+
+
+def entry(body: bytes) -> CachedResult:
+    return CachedResult(body, '"etag"')
+
+
+def test_lru_eviction_by_entries():
+    cache = StudentResultCache(max_entries=2, max_bytes=1024, ttl_seconds=60)
+    cache.set("1", entry(b"a"))
+    cache.set("2", entry(b"b"))
+    assert cache.get("1").body == b"a"  # "1" أصبح الأحدث استخداماً
+    cache.set("3", entry(b"c"))
+    assert cache.get("2") is None
+    assert cache.get("1").body == b"a"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_by_size():
+    cache = StudentResultCache(max_entries=100, max_bytes=10, ttl_seconds=60)
+    cache.set("1", entry(b"12345"))
+    cache.set("2", entry(b"12345"))
+    cache.set("3", entry(b"123"))
+    assert cache.get("1") is None
+    assert cache.stats()["size_bytes"] == 8
+
+
+def test_ttl_expiry():
+    cache = StudentResultCache(max_entries=10, max_bytes=1024, ttl_seconds=0.01)
+    cache.set("1", entry(b"a"))
+    time.sleep(0.02)
+    assert cache.get("1") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_invalidation():
+    cache = StudentResultCache(max_entries=10, max_bytes=1024, ttl_seconds=60)
+    cache.set("1", entry(b"a"))
+    cache.set("2", entry(b"b"))
+    cache.invalidate_many(["1", "missing"])
+    assert cache.get("1") is None
+    cache.clear()
+    stats = cache.stats()
+    assert stats["entries"] == 0 and stats["size_bytes"] == 0
+    assert stats["invalidations"] == 2
@@ -0,0 +1,32 @@
+from server import normalize_student_id, student_id_prefix_range
+
+
+def test_normalize_student_id_converts_arabic_digits_and_strips_spaces():
+    assert normalize_student_id(" ١٢٣ ٤٥ ") == "12345"
+    assert normalize_student_id("۱۲۳") == "123"
+    assert normalize_student_id("AB 12") == "AB12"
+
+
+def test_prefix_range_is_anchored():
+    assert student_id_prefix_range("123") == {"$gte": "123", "$lt": "124"}
+    assert student_id_prefix_range("19") == {"$gte": "19", "$lt": "1:"}
+
+
+def test_seat_number_lookups_use_the_unique_index(mongo_db, plan_stages):
+    mongo_db.students.create_index([("student_id", 1)], unique=True)
+    mongo_db.students.insert_many([
+        {"student_id": str(100000 + i), "name": f"طالب {i}", "educational_stage_id": "s1"}
+        for i in range(500)
+    ])
+
+    exact = mongo_db.students.find({"student_id": "100123"}).explain()
+    assert "IXSCAN" in plan_stages(exact)
+    assert "COLLSCAN" not in plan_stages(exact)
+
+    prefix = mongo_db.students.find(
+        {"student_id": student_id_prefix_range("1001"), "educational_stage_id": "s1"}
+    ).sort("student_id", 1).limit(50).explain()
+    stages = plan_stages(prefix)
+    assert "IXSCAN" in stages
+    assert "COLLSCAN" not in stages and "SORT" not in stages
+    assert len(list(mongo_db.students.find({"student_id": student_id_prefix_range("1001")}))) == 100
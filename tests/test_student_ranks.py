@@ -0,0 +1,62 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+
+import server
+from server import RANK_FIELDS, compute_student_ranks
+
+
+def test_ranks_handle_ties_and_scopes():
+    frame = pd.DataFrame([
+        {"student_id": "1", "average": 95.0, "educational_stage_id": "s1", "region": "القاهرة", "administration": "شرق", "school_name": "أ"},
+        {"student_id": "2", "average": 95.0, "educational_stage_id": "s1", "region": "القاهرة", "administration": "شرق", "school_name": "ب"},
+        {"student_id": "3", "average": 90.0, "educational_stage_id": "s1", "region": "الجيزة", "administration": "غرب", "school_name": "أ"},
+        {"student_id": "4", "average": 99.0, "educational_stage_id": "s2", "region": None, "administration": None, "school_name": None},
+        {"student_id": "5", "average": None, "educational_stage_id": "s1", "region": "القاهرة", "administration": "شرق", "school_name": "أ"},
+    ], columns=RANK_FIELDS)
+
+    ranks = compute_student_ranks(frame)
+
+    assert ranks[0]["overall"] == {"rank": 2, "out_of": 4}
+    assert ranks[1]["overall"] == {"rank": 2, "out_of": 4}
+    assert ranks[2]["overall"] == {"rank": 4, "out_of": 4}
+    assert ranks[2]["stage"] == {"rank": 3, "out_of": 3}
+    assert ranks[2]["region"] == {"rank": 1, "out_of": 1}
+    assert ranks[0]["school"] == {"rank": 1, "out_of": 1}
+    assert ranks[3] == {"overall": {"rank": 1, "out_of": 4}, "stage": {"rank": 1, "out_of": 1}}
+    assert ranks[4] == {}
+
+
+def test_ranks_computed_per_stage_match_the_whole_collection():
+    frame = pd.DataFrame([
+        {"student_id": str(i), "average": float((i * 37) % 23), "educational_stage_id": f"s{i % 3}",
+         "region": ["القاهرة", "الجيزة"][i % 2], "administration": "شرق", "school_name": f"مدرسة {i % 4}"}
+        for i in range(60)
+    ], columns=RANK_FIELDS)
+    overall_averages = np.sort(frame["average"].to_numpy(dtype=float))
+
+    expected = compute_student_ranks(frame)
+    for _, stage in frame.groupby("educational_stage_id"):
+        assert compute_student_ranks(stage, overall_averages) == [expected[position] for position in stage.index]
+
+
+def test_deletes_coalesce_into_one_rank_update(monkeypatch):
+    calls = []
+
+    async def update_student_ranks():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+
+    monkeypatch.setattr(server, "update_student_ranks", update_student_ranks)
+
+    async def scenario():
+        scheduler = server.StudentRankScheduler()
+        scheduler.schedule()
+        await asyncio.sleep(0.005)  # الجولة الأولى بدأت
+        for _ in range(5):
+            scheduler.schedule()
+        await scheduler._task
+
+    asyncio.run(scenario())
+    assert len(calls) == 2  # الجولة الجارية ثم جولة واحدة لكل الطلبات أثناءها
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+def student(student_id, name):
+    return {"id": f"id-{student_id}", "student_id": student_id, "name": name, "processed_at": datetime(2025, 7, 1)}
+
+
+class FakeStudents:
+    """db.students مع تسجيل استعلامات find"""
+
+    def __init__(self, documents):
+        self.documents = {document["student_id"]: document for document in documents}
+        self.queries = []
+
+    async def find(self, query):
+        self.queries.append(query)
+        for student_id in query["student_id"]["$in"]:
+            if student_id in self.documents:
+                yield self.documents[student_id]
+
+
+class FakeDb:
+    def __init__(self, documents):
+        self.students = FakeStudents(documents)
+
+
+@pytest.fixture
+def batch_client(monkeypatch):
+    server.student_result_cache.clear()
+    fake_db = FakeDb([student("1001", "منى"), student("1002", "علي"), student("1003", "سارة")])
+    monkeypatch.setattr(server, "db", fake_db)
+    yield TestClient(server.app), fake_db.students
+    server.student_result_cache.clear()
+
+
+def test_cached_results_skip_the_database_and_unknown_ids_are_missing(batch_client):
+    client, students = batch_client
+    server.cache_student_result(student("1001", "منى"))
+
+    response = client.post("/api/students/batch", json={"student_ids": ["1001", "1002", "9999"]})
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["results"]) == ["1001", "1002"]
+    assert body["results"]["1002"]["name"] == "علي"
+    assert body["missing"] == ["9999"] and body["found_count"] == 2
+    assert students.queries == [{"student_id": {"$in": ["1002", "9999"]}}]
+
+    # 1002 أصبح في الكاش بعد الطلب الأول
+    client.post("/api/students/batch", json={"student_ids": ["1001", "1002"]})
+    assert len(students.queries) == 1
+
+
+def test_ids_are_normalized_and_deduplicated_in_request_order(batch_client):
+    client, students = batch_client
+    response = client.post("/api/students/batch", json={"student_ids": ["١٠٠٣", " 1001 ", "1003", "", "1001"]})
+    body = response.json()
+    assert list(body["results"]) == ["1003", "1001"]
+    assert body["missing"] == [] and body["found_count"] == 2
+    assert students.queries == [{"student_id": {"$in": ["1003", "1001"]}}]
+
+
+def test_more_than_500_ids_are_rejected(batch_client):
+    client, students = batch_client
+    response = client.post("/api/students/batch", json={"student_ids": [str(i) for i in range(501)]})
+    assert response.status_code == 422
+    assert client.post("/api/students/batch", json={"student_ids": []}).status_code == 422
+    assert students.queries == []
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime
+
+import server
+from server import SuggestionIndex
+
+
+def build_index():
+    index = SuggestionIndex(refresh_seconds=600)
+    index.load([
+        {"student_id": "123456", "name": "أحمد محمد علي", "school_name": "مدرسة النصر الثانوية"},
+        {"student_id": "123789", "name": "إسراء أحمد", "school_name": "مدرسة الأمل"},
+        {"student_id": "555000", "name": "فاطمة حسن", "school_name": None},
+    ])
+    return index
+
+
+def test_name_suggestions_use_normalized_prefix():
+    suggestions = build_index().suggest("احمد مح")
+    assert [s["text"] for s in suggestions if s["type"] == "student"] == ["أحمد محمد علي"]
+    assert [s["text"] for s in build_index().suggest("اسراء") if s["type"] == "student"] == ["إسراء أحمد"]
+
+
+def test_seat_number_suggestions():
+    suggestions = build_index().suggest("١٢٣")
+    assert [s["text"] for s in suggestions if s["type"] == "student_id"] == ["123456", "123789"]
+
+
+def test_school_suggestions_match_any_word():
+    suggestions = build_index().suggest("النصر")
+    assert [s["text"] for s in suggestions if s["type"] == "school"] == ["مدرسة النصر الثانوية"]
+    schools = [s["text"] for s in build_index().suggest("مدرسة") if s["type"] == "school"]
+    assert sorted(schools) == ["مدرسة الأمل", "مدرسة النصر الثانوية"]
+
+
+def test_stats_report_size():
+    stats = build_index().stats()
+    assert stats["ready"] and stats["students"] == 3
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+        self.batch = None
+
+    def batch_size(self, size):
+        self.batch = size
+        return self
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeStudents:
+    def __init__(self, documents):
+        self.documents = documents
+        self.cursors = []
+
+    def find(self, query, projection):
+        self.cursors.append(FakeCursor(list(self.documents)))
+        return self.cursors[-1]
+
+
+class FakeVersions:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def find_one(self, query):
+        return self.documents.get(query["_id"])
+
+
+class FakeDb:
+    def __init__(self, versions, students):
+        self.content_versions = FakeVersions(versions)
+        self.students = FakeStudents(students)
+
+
+def test_periodic_refresh_reads_students_only_after_a_version_change(monkeypatch):
+    versions = {"students": {"updated_at": datetime(2025, 7, 1), "revision": 1}}
+    fake_db = FakeDb(versions, [{"student_id": "123456", "name": "أحمد محمد علي", "school_name": None}])
+    monkeypatch.setattr(server, "db", fake_db)
+    index = SuggestionIndex(refresh_seconds=600)
+
+    async def scenario():
+        await index.rebuild()
+        await index.rebuild(force=False)  # النسخة نفسها: لا قراءة للطلاب
+        unchanged_reads = len(fake_db.students.cursors)
+        fake_db.students.documents.append({"student_id": "555000", "name": "فاطمة حسن", "school_name": None})
+        versions["students"] = {"updated_at": datetime(2025, 7, 1), "revision": 2}
+        await index.rebuild(force=False)
+        return unchanged_reads
+
+    assert asyncio.run(scenario()) == 1
+    assert len(fake_db.students.cursors) == 2
+    assert all(cursor.batch for cursor in fake_db.students.cursors)
+    assert index.stats()["students"] == 2
@@ -0,0 +1,113 @@
+import gzip
+
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from server import (
+    SOURCE_ROW_COLUMN,
+    ColumnMapping,
+    build_student_documents,
+    open_upload_row_stream,
+    read_upload_data,
+    stage_excel_upload,
+    upload_file_format,
+)
+
+HEADER = ["رقم الجلوس", "الاسم", "عربي", "عربي"]
+ROWS = [[1001, "أحمد", 90, 80.5], [None, None, None, None], [1002, "سارة", None, 60]]
+EXPECTED_COLUMNS = ["رقم الجلوس", "الاسم", "عربي", "عربي.1"]
+# CSV/TSV تُقرأ نصاً كما هي في الملف (الدرجات تُحوّل أرقاماً عند الفحص والمعالجة)
+EXPECTED_ROWS = [
+    {"رقم الجلوس": "1001", "الاسم": "أحمد", "عربي": "90", "عربي.1": "80.5", SOURCE_ROW_COLUMN: 1},
+    {"رقم الجلوس": "1002", "الاسم": "سارة", "عربي": None, "عربي.1": "60", SOURCE_ROW_COLUMN: 3},
+]
+
+
+def delimited_text(delimiter):
+    lines = [delimiter.join(HEADER)]
+    lines += [delimiter.join("" if value is None else str(value) for value in row) for row in ROWS]
+    return "\n".join(lines) + "\n"
+
+
+def read_rows(path, file_format, batch_rows=1000):
+    columns, batches = open_upload_row_stream(str(path), file_format, batch_rows)
+    return columns, [row for batch in batches for row in batch]
+
+
+def test_upload_formats_are_detected_from_the_file_name():
+    assert upload_file_format("results.CSV") == ("csv", ".csv")
+    assert upload_file_format("results.tsv.gz") == ("tsv", ".tsv.gz")
+    assert upload_file_format("results.parquet") == ("parquet", ".parquet")
+    assert upload_file_format("results.xlsx") == ("xlsx", ".xlsx")
+    assert upload_file_format("results.gz") is None
+    assert upload_file_format("results.pdf") is None
+
+
+def test_csv_and_gzipped_tsv_match_the_excel_row_shape(tmp_path):
+    csv_path = tmp_path / "students.csv"
+    csv_path.write_text(delimited_text(","), encoding="utf-8")
+    tsv_path = tmp_path / "students.tsv.gz"
+    with gzip.open(tsv_path, "wt", encoding="utf-8") as output:
+        output.write(delimited_text("\t"))
+
+    assert read_rows(csv_path, "csv") == (EXPECTED_COLUMNS, EXPECTED_ROWS)
+    assert read_rows(tsv_path, "tsv") == (EXPECTED_COLUMNS, EXPECTED_ROWS)
+
+
+def test_parquet_is_read_in_fixed_size_batches(tmp_path):
+    path = tmp_path / "students.parquet"
+    table = pa.table({
+        "رقم الجلوس": pa.array([1001 + i for i in range(5)]),
+        "الاسم": pa.array([f"طالب {i}" for i in range(5)]),
+    })
+    pq.write_table(table, path, row_group_size=2)
+
+    columns, batches = open_upload_row_stream(str(path), "parquet", batch_rows=3)
+    batches = list(batches)
+    assert columns == ["رقم الجلوس", "الاسم"]
+    assert [len(batch) for batch in batches] == [3, 2]
+    assert batches[1][1] == {"رقم الجلوس": 1005, "الاسم": "طالب 4", SOURCE_ROW_COLUMN: 5}
+
+
+def test_every_format_stages_the_same_analysis(tmp_path):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in [HEADER, *ROWS]:
+        sheet.append(row)
+    xlsx_path = tmp_path / "students.xlsx"
+    workbook.save(xlsx_path)
+    csv_path = tmp_path / "students.csv"
+    csv_path.write_text(delimited_text(","), encoding="utf-8")
+
+    xlsx = stage_excel_upload(str(xlsx_path), "xlsx", str(tmp_path / "xlsx.parquet"))
+    csv = stage_excel_upload(str(csv_path), "csv", str(tmp_path / "csv.parquet"))
+    assert csv["columns"] == xlsx["columns"]
+    assert csv["total_rows"] == xlsx["total_rows"] == 2
+    assert csv["suggested_mappings"] == xlsx["suggested_mappings"]
+
+
+def test_leading_zeros_in_seat_numbers_and_school_codes_are_kept(tmp_path):
+    source = tmp_path / "students.csv"
+    source.write_text("seat,name,school_code,math\n00123,منى,0042,95\n00124,علي,0042,غ\n", encoding="utf-8")
+    data_path = tmp_path / "students.parquet"
+    stage_excel_upload(str(source), "csv", str(data_path))
+
+    mapping = ColumnMapping(student_id_column="seat", name_column="name", subject_columns=["math"], school_code_column="school_code")
+    students, errors = build_student_documents(read_upload_data(data_path.read_bytes()), mapping, "s1", None)
+    assert errors == []
+    assert [(s["student_id"], s["school_code"]) for s in students] == [("00123", "0042"), ("00124", "0042")]
+    assert students[0]["subjects"][0]["score"] == 95.0 and students[1]["subjects"] == []
+
+
+def test_errors_name_the_file_row_after_skipped_blank_rows(tmp_path):
+    source = tmp_path / "students.csv"
+    source.write_text("seat,name,math\n1001,منى,90\n,,\n,,\n1002, ,80\n", encoding="utf-8")
+    data_path = tmp_path / "students.parquet"
+    stage_excel_upload(str(source), "csv", str(data_path))
+
+    mapping = ColumnMapping(student_id_column="seat", name_column="name", subject_columns=["math"])
+    df = read_upload_data(data_path.read_bytes(), ["seat", "name", "math", SOURCE_ROW_COLUMN])
+    students, errors = build_student_documents(df, mapping, "s1", None)
+    assert [s["student_id"] for s in students] == ["1001"]
+    assert errors == ["الصف 4: بيانات ناقصة"]
@@ -0,0 +1,120 @@
+from datetime import datetime
+
+import bson
+import openpyxl
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from server import (
+    ColumnMapping,
+    arrow_column_type,
+    build_import_documents,
+    build_student_documents,
+    mapping_columns,
+    read_upload_data,
+    stage_excel_upload,
+)
+
+MAPPING = ColumnMapping(student_id_column="رقم الجلوس", name_column="الاسم", subject_columns=["عربي", "رياضيات"])
+
+
+def write_csv(path, rows):
+    lines = ["رقم الجلوس,الاسم,المدرسة,عربي,رياضيات,ملاحظات"]
+    lines += [f"{100000 + i},طالب رقم {i} محمد احمد,مدرسة {i % 40},{i % 101},{(i * 7) % 101}," for i in range(rows)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def test_cell_types_map_to_one_arrow_type_per_column():
+    assert arrow_column_type({int, type(None)}) == pa.string()
+    assert arrow_column_type({int, float}) == pa.string()
+    assert arrow_column_type({bool}) == pa.bool_()
+    assert arrow_column_type({datetime}) == pa.timestamp("us")
+    assert arrow_column_type({int, str}) == pa.string()
+    assert arrow_column_type({bool, int}) == pa.string()
+    assert arrow_column_type({type(None)}) == pa.string()
+
+
+def test_mixed_excel_cells_are_stored_as_text(tmp_path):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in [["seat", "score"], [1, 90], [2, "غائب"], [3, None]]:
+        sheet.append(row)
+    source = tmp_path / "mixed.xlsx"
+    workbook.save(source)
+    data_path = tmp_path / "mixed.parquet"
+    stage_excel_upload(str(source), "xlsx", str(data_path))
+
+    df = read_upload_data(data_path.read_bytes())
+    assert df["seat"].tolist() == ["1", "2", "3"]
+    assert df["score"].tolist()[:2] == ["90", "غائب"] and pd.isna(df["score"].iloc[2])
+
+
+def test_staged_data_is_columnar_compressed_and_split_by_batch(tmp_path):
+    source = tmp_path / "students.csv"
+    write_csv(source, 2500)
+    data_path = tmp_path / "students.parquet"
+    staged = stage_excel_upload(str(source), "csv", str(data_path))
+
+    parquet_file = pq.ParquetFile(data_path)
+    assert staged["chunk_count"] == parquet_file.num_row_groups == 3
+    assert [parquet_file.metadata.row_group(i).num_rows for i in range(3)] == [1000, 1000, 500]
+
+    # نفس الصفوف كمستندات excel_data_chunks (1000 صف لكل مستند)
+    rows = read_upload_data(data_path.read_bytes()).astype(object).to_dict("records")
+    chunk_bytes = sum(
+        len(bson.encode({"file_hash": "h", "chunk_index": index, "chunk_data": rows[start:start + 1000]}))
+        for index, start in enumerate(range(0, len(rows), 1000))
+    )
+    assert data_path.stat().st_size * 4 < chunk_bytes
+
+
+def test_row_groups_load_only_the_mapped_columns(tmp_path):
+    source = tmp_path / "students.csv"
+    write_csv(source, 1500)
+    data_path = tmp_path / "students.parquet"
+    stage_excel_upload(str(source), "csv", str(data_path))
+
+    df = read_upload_data(data_path.read_bytes(), mapping_columns(MAPPING), row_group=1)
+    assert list(df.columns) == ["رقم الجلوس", "الاسم", "عربي", "رياضيات"]
+    assert len(df) == 500 and df["رقم الجلوس"].iloc[0] == "101000"
+
+    students, errors = build_student_documents(df, MAPPING, "s1", None, row_offset=1000)
+    expected, _ = build_student_documents(
+        pd.read_csv(source).iloc[1000:], MAPPING, "s1", None, row_offset=1000
+    )
+    assert errors == []
+    assert [(s["student_id"], s["name"], s["total_score"]) for s in students] == [
+        (s["student_id"], s["name"], s["total_score"]) for s in expected
+    ]
+
+
+def test_excel_rows_with_trailing_blank_cells_are_staged(tmp_path):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in [["seat", "name", "score"], [1, "منى", 90], [2, "علي"]]:
+        sheet.append(row)
+    source = tmp_path / "short.xlsx"
+    workbook.save(source)
+    data_path = tmp_path / "short.parquet"
+    stage_excel_upload(str(source), "xlsx", str(data_path))
+
+    df = read_upload_data(data_path.read_bytes())
+    assert df["score"].tolist()[0] == "90" and pd.isna(df["score"].iloc[1])
+
+
+def test_blank_seat_cell_is_missing_data_and_other_seats_keep_their_text(tmp_path):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in [["رقم الجلوس", "الاسم", "عربي"], [1001, "منى", 90], [None, "علي", 80], [1003.0, "سارة", 70.5]]:
+        sheet.append(row)
+    source = tmp_path / "blank_seat.xlsx"
+    workbook.save(source)
+    data_path = tmp_path / "blank_seat.parquet"
+    stage_excel_upload(str(source), "xlsx", str(data_path))
+
+    mapping = ColumnMapping(student_id_column="رقم الجلوس", name_column="الاسم", subject_columns=["عربي"])
+    students, errors = build_import_documents(read_upload_data(data_path.read_bytes()), mapping, "s1", None)
+    assert [s["student_id"] for s in students] == ["1001", "1003"]
+    assert errors == ["الصف 2: بيانات ناقصة"]
+    assert students[1]["subjects"][0]["score"] == 70.5
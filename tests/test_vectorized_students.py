@@ -0,0 +1,55 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from server import ColumnMapping, build_student_documents, build_students_from_rows, round_like_python
+
+VOLATILE_FIELDS = ("id", "created_at", "updated_at")
+
+
+def random_frame(rows: int, seed: int) -> pd.DataFrame:
+    rng = random.Random(seed)
+    score_values = [0, 100, 59.995, 89.995, 33.335, 12.5, -3, 101, "٨٥", " 77 ", "غائب", None, float("nan"), True, 66.666]
+    text_values = ["الفصل الأول", "", None, "x" * 120, "a<b>;c", "  مسافات  "]
+    records = []
+    for i in range(rows):
+        records.append({
+            "seat": rng.choice([str(1000 + i), f"١٢{i}", f" {i} 5 ", "", None, 2000 + i, "9" * 60]),
+            "name": rng.choice([f"طالب {i}", "", None, "أحمد \"علي\"", "n" * 210]),
+            "عربي": rng.choice(score_values),
+            "رياضيات": rng.choice(score_values),
+            "علوم": rng.uniform(0, 100),
+            "total": rng.choice([None, 250, -5, "٣٠٠", "bad", 180.5]),
+            "class": rng.choice(text_values),
+            "school": rng.choice(text_values),
+        })
+    return pd.DataFrame(records)
+
+
+def comparable(documents):
+    return [{key: value for key, value in document.items() if key not in VOLATILE_FIELDS} for document in documents]
+
+
+@pytest.mark.parametrize("with_total", [False, True])
+def test_vectorized_documents_match_the_model_path(with_total):
+    df = random_frame(400, seed=7 + with_total)
+    mapping = ColumnMapping(
+        student_id_column="seat",
+        name_column="name",
+        subject_columns=["عربي", "رياضيات", "علوم", "<>"],
+        total_column="total" if with_total else None,
+        class_column="class",
+        school_column="school",
+    )
+    expected_students, expected_errors = build_students_from_rows(df, mapping, "stage-1", "القاهرة", row_offset=2000)
+    documents, errors = build_student_documents(df, mapping, "stage-1", "القاهرة", row_offset=2000)
+
+    assert comparable(documents) == comparable([student.dict() for student in expected_students])
+    assert errors == expected_errors
+
+
+def test_rounding_matches_python_round_near_ties():
+    values = np.array([0.125, 2.675, 1.005, 89.995, 59.994999, 33.335, 100.0, 1 / 3])
+    assert round_like_python(values).tolist() == [round(value, 2) for value in values.tolist()]